@@ -0,0 +1,138 @@
+"""
+Micro-benchmark of the docdata parser.
+
+Compares parseDocdata() against the parser of the first release, copied
+below as is, on a synthetic docdata with a given number of rows:
+
+    python benchmarks/bench_parse.py [ROWS]
+"""
+import functools
+import re
+import sys
+import timeit
+
+import click
+
+from fixtures import make_docdata
+from nokdoc.nokdoc import parseDocdata
+
+
+class LegacyContext(object):
+    obj = {'LOGGED_IN': True}
+
+
+def pass_context(f):
+    """
+    Stands in for click.pass_context, the legacy parser reads the login
+    state from the click context
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        return f(LegacyContext(), *args, **kwargs)
+    return wrapper
+
+
+# filled by the permissions pass of the legacy parser
+docs_permissions = {}
+
+
+# parseDocdata(), parse_td() and parse_td_links() of the first release,
+# only the decorators are swapped and the comments trimmed
+@pass_context
+def legacy_parseDocdata(ctx, rawDoc, check_permissions=False):
+    doc_list = []
+    td_contents_patt = re.compile(r'<td.+?>(.+?)</td>')
+
+    raw_doc_entries = rawDoc.replace('<tr ', '\n <tr ').split('\n')
+
+    show_restricted_docs_notification = True
+
+    for raw_entry in raw_doc_entries:
+        doc_data = {}  # dict to hold doc data for one particular entry
+
+        raw_entry = re.sub(r'</t\S*d>', '</td>', raw_entry)
+
+        td_contents = td_contents_patt.findall(raw_entry)
+        if td_contents:
+            if (not ctx.obj['LOGGED_IN']) and ('a login is required for access' in td_contents[1]):
+                if show_restricted_docs_notification:
+                    click.echo(
+                        '    The following documents are available to logged in users only. '
+                        'They will not be included in the documentation set...')
+                    show_restricted_docs_notification = False
+                click.echo('      ' + td_contents[0].strip())
+                continue
+            if len(td_contents) <= 1:
+                continue
+            if check_permissions:
+                docs_permissions.update(
+                    legacy_parse_td(raw_td=td_contents, check_permissions=True))
+            else:
+                doc_data.update(legacy_parse_td(raw_td=td_contents))
+
+            if doc_data not in doc_list:
+                doc_list.append(doc_data)
+    return doc_list
+
+
+@pass_context
+def legacy_parse_td(ctx, raw_td, check_permissions=False):
+    d = {}
+
+    key = re.search(r'>(.*?)<', raw_td[1]).group(1).strip()
+
+    if check_permissions:
+        if 'a login is required for access' in raw_td[1]:
+            d[key] = True
+        else:
+            d[key] = False
+
+    else:
+        d[key] = {'title': raw_td[0].strip(),
+                  'issue': raw_td[2].strip(),
+                  'issue_date': re.sub('<nobr>|</nobr>', '', raw_td[3]).strip(),
+                  'links': legacy_parse_td_links(raw_links=raw_td[4], doc_id=key),
+                  'restricted': docs_permissions.get(key, True)
+                  }
+    return d
+
+
+@pass_context
+def legacy_parse_td_links(ctx, raw_links, doc_id):
+    links = []
+    links_n_types_patt = re.compile(r"href='(.*?)'.*?title='(.*?)'")
+    for url_n_type in links_n_types_patt.findall(raw_links):
+        link = url_n_type[0]
+        l_type = None  # link type
+        if 'PDF' in url_n_type[1].upper():
+            l_type = 'PDF'
+        elif 'ZIP' in url_n_type[1].upper():
+            l_type = 'ZIP'
+        elif 'HTML' in url_n_type[1].upper():
+            l_type = 'HTML'
+        else:
+            continue
+
+        links.append((link, l_type))
+    return links
+
+
+def main(rows=10000):
+    docdata = make_docdata(rows)
+    permissions = parseDocdata(docdata, logged_in=True,
+                               check_permissions=True)
+    legacy_parseDocdata(docdata, check_permissions=True)
+
+    legacy = timeit.timeit(lambda: legacy_parseDocdata(docdata), number=1)
+    current = min(timeit.repeat(
+        lambda: parseDocdata(docdata, logged_in=True,
+                             permissions=permissions),
+        number=1, repeat=3))
+    print('docdata rows: {}, size: {} KB'.format(rows, len(docdata) // 1024))
+    print('  legacy parser:  {:8.3f} s'.format(legacy))
+    print('  current parser: {:8.3f} s'.format(current))
+    print('  speedup:        {:8.1f}x'.format(legacy / current))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,77 @@
+"""
+Generated fixtures for the benchmarks, no network access is needed.
+"""
+import json
+import os
+import random
+import zipfile
+
+
+def make_docdata(rows):
+    """
+    Builds a synthetic docdata blob resembling the documentation server
+    responses. Every 5th doc is restricted, every 10th doc is repeated
+    like it happens for combined products
+    """
+    entries = []
+    for i in range(rows):
+        n = i - 1 if i % 10 == 0 and i else i
+        lock = " <img title='a login is required for access'>" \
+            if n % 5 == 0 else ''
+        entries.append(
+            "<tr class='doc'><td class='t'> Doc title {n} </td>"
+            "<td class='id'><nobr>3HE{n:06d}AAA</nobr>{lock}</td>"
+            "<td class='i'> {issue} </td>"
+            "<td class='d'><nobr>2017-01-{day:02d}</nobr></td>"
+            "<td class='l'><a href='https://x/{n}.pdf' title='PDF doc'>P</a> "
+            "<a href='https://x/{n}/index.html' title='HTML doc'>H</a>"
+            "</td></tr>".format(n=n, lock=lock, issue=n % 9,
+                                day=n % 28 + 1))
+    return '<table>' + ''.join(entries) + '</table>'
+
+
+def make_json_body(rows, junk=True):
+    """
+    Builds a docs list response body. With `junk` the json is preceded by
+    the garbage the documentation server sometimes sends
+    """
+    body = json.dumps({'proddata': {'format': ['PDF', 'HTML'],
+                                    'release': ['1.0', '2.0'],
+                                    'docdata': make_docdata(rows)}})
+    if junk:
+        body = 'Content-type: text/html\r\n\r\n<!-- junk -->\n' + body
+    return body.encode('utf8')
+
+
+def make_nuage_zip(path, docs=20, files=30, file_size=16 * 1024, seed=1):
+    """
+    Writes a zip collection laid out like Nuage HTML docs: a DOC-ID dir
+    per doc with an index.html carrying the doc title and a bunch of
+    pages and assets
+    returns: size of the archive in bytes
+    """
+    rnd = random.Random(seed)
+    words = ('configure router bgp vprn service interface policy mpls '
+             'ldp isis ospf vsd vsc vrs domain subnet zone').split()
+
+    text = ' '.join(rnd.choice(words) for _ in range(file_size))
+
+    def page(size):
+        start = rnd.randrange(len(text) - size)
+        return '<html><body><p>{}</p></body></html>'.format(
+            text[start:start + size])
+
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for d in range(docs):
+            doc_dir = '3HE{:05d}AAA'.format(d)
+            zf.writestr(doc_dir + '/index.html',
+                        '<html><head><title>Nuage Guide {} &mdash; '
+                        'Nuage Networks</title></head>'.format(d) +
+                        page(file_size))
+            for f in range(files):
+                zf.writestr('{}/pages/{}.html'.format(doc_dir, f),
+                            page(file_size))
+            zf.writestr(doc_dir + '/_static/logo.png',
+                        os.urandom(4096),
+                        compress_type=zipfile.ZIP_STORED)
+    return os.path.getsize(path)
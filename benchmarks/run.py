@@ -0,0 +1,220 @@
+"""
+Benchmark suite of the parsing, rendering and archive handling stages.
+
+Runs offline against generated fixtures and reports time, throughput and
+peak memory of every stage. Results are compared against a stored
+baseline, the run fails if a stage got slower or hungrier than the
+baseline by more than the threshold:
+
+    python benchmarks/run.py --save-baseline    # record the baseline
+    python benchmarks/run.py                    # compare against it
+    python benchmarks/run.py -k docdata -t 0.5  # selected stages only
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+import requests
+
+from fixtures import make_docdata, make_json_body, make_nuage_zip
+from nokdoc.nokdoc import (create_doc_html, create_doc_html_lite,
+                           fix_zip_contents, get_json_resp, iter_doc_rows,
+                           parseDocdata, parse_td_links)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+SIZES = (100, 1000, 10000)
+# dependencies the CLI must not import before a command needs them
+LAZY_MODULES = ('requests', 'jinja2', 'yaml', 'tqdm', 'natsort')
+STARTUP_SCRIPT = (
+    'import sys\n'
+    'from nokdoc.nokdoc import cli\n'
+    'loaded = [m for m in {!r} if m in sys.modules]\n'
+    'if loaded:\n'
+    '    sys.exit("eagerly imported: " + ", ".join(loaded))\n'
+    'try:\n'
+    '    cli(["--help"])\n'
+    'except SystemExit:\n'
+    '    pass\n').format(LAZY_MODULES)
+
+# `run` is called with the value returned by `setup`, `units` is the
+# amount of work done by a single run in `unit`s
+Stage = namedtuple('Stage', ['name', 'setup', 'run', 'units', 'unit'])
+Result = namedtuple('Result', ['name', 'seconds', 'throughput', 'unit',
+                               'peak'])
+
+
+def docdata_stages(rows, workdir):
+    docdata = make_docdata(rows)
+    permissions = parseDocdata(docdata, logged_in=True,
+                               check_permissions=True)
+    raw_links = [td[4] for td in iter_doc_rows(docdata) if len(td) > 4]
+    docs = parseDocdata(docdata, logged_in=True, permissions=permissions)
+    body = make_json_body(rows)
+    html_path = os.path.join(workdir, 'docs_{}.html'.format(rows))
+
+    def response():
+        r = requests.Response()
+        r.status_code = 200
+        r.encoding = 'utf8'
+        r._content = body
+        return r
+
+    return [
+        Stage('parseDocdata[{}]'.format(rows), None,
+              lambda _: parseDocdata(docdata, logged_in=True,
+                                     permissions=permissions),
+              rows, 'rows'),
+        Stage('parse_td_links[{}]'.format(rows), None,
+              lambda _: [parse_td_links(raw, None) for raw in raw_links],
+              rows, 'rows'),
+        Stage('get_json_resp[{}]'.format(rows), response,
+              get_json_resp, len(body) / 1024 / 1024, 'MB'),
+        Stage('create_doc_html[{}]'.format(rows), None,
+              lambda _: create_doc_html(docs, 'bench', '1.0',
+                                        path=html_path, quiet=True),
+              rows, 'rows'),
+        Stage('create_doc_html_lite[{}]'.format(rows), None,
+              lambda _: create_doc_html_lite(docs, 'bench', '1.0',
+                                             path=html_path, quiet=True),
+              rows, 'rows'),
+    ]
+
+
+def zip_stages(docs, workdir):
+    fixture = os.path.join(workdir, 'nuage_{}.zip'.format(docs))
+    size = make_nuage_zip(fixture, docs=docs)
+    target = os.path.join(workdir, 'htmlfix_{}.zip'.format(docs))
+
+    def fresh_copy():
+        # every run renames the dirs of a pristine archive
+        shutil.copyfile(fixture, target)
+        return target
+
+    return [Stage('htmlfix_zip[{}]'.format(docs), fresh_copy,
+                  fix_zip_contents, size / 1024 / 1024, 'MB')]
+
+
+def startup_stages():
+    def startup(_):
+        proc = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT],
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE,
+                              universal_newlines=True)
+        if proc.returncode:
+            raise RuntimeError(proc.stderr.strip())
+
+    # the interpreter startup is included, runs are whole `nokdoc --help`s
+    return [Stage('cli_startup', None, startup, 1, 'runs')]
+
+
+def measure(stage, repeat):
+    """
+    Times the best of `repeat` runs, the peak memory is measured in
+    a separate traced run since tracing slows the code down
+    """
+    best = None
+    for _ in range(repeat):
+        arg = stage.setup() if stage.setup else None
+        start = time.perf_counter()
+        stage.run(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    arg = stage.setup() if stage.setup else None
+    tracemalloc.start()
+    stage.run(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return Result(stage.name, best, stage.units / best, stage.unit, peak)
+
+
+def compare(result, baseline, threshold):
+    """
+    returns: tuple (comparison note, True if the stage regressed)
+    """
+    base = baseline.get(result.name)
+    if not base:
+        return 'new', False
+    time_ratio = result.seconds / base['seconds']
+    peak_ratio = result.peak / base['peak'] if base['peak'] else 1
+    regressed = time_ratio > 1 + threshold or peak_ratio > 1 + threshold
+    note = 'time {:+.0%}, mem {:+.0%}'.format(time_ratio - 1, peak_ratio - 1)
+    return note + (' REGRESSION' if regressed else ''), regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', '--select', default='',
+                        help='run only the stages containing this string')
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help='timed runs per stage, the best one counts')
+    parser.add_argument('-b', '--baseline', default=DEFAULT_BASELINE,
+                        help='baseline file to compare against')
+    parser.add_argument('-t', '--threshold', type=float, default=0.3,
+                        help='allowed slowdown or memory growth, '
+                        '0.3 stands for 30%%')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='comma separated docdata row counts')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif not args.save_baseline:
+        # baselines are machine specific, none is shipped
+        print('No baseline in {}, the comparison is skipped. Record one '
+              'with --save-baseline\n'.format(args.baseline))
+
+    workdir = tempfile.mkdtemp(prefix='nokdoc_bench_')
+    try:
+        stages = startup_stages()
+        for rows in (int(n) for n in args.sizes.split(',')):
+            stages.extend(docdata_stages(rows, workdir))
+        stages.extend(zip_stages(20, workdir))
+        stages.extend(zip_stages(100, workdir))
+
+        print('{:<26} {:>10} {:>18} {:>10}  {}'.format(
+            'stage', 'time', 'throughput', 'peak mem', 'vs baseline'))
+        results = {}
+        regressions = 0
+        for stage in stages:
+            if args.select.lower() not in stage.name.lower():
+                continue
+            result = measure(stage, args.repeat)
+            results[result.name] = {'seconds': result.seconds,
+                                    'peak': result.peak}
+            note, regressed = compare(result, baseline, args.threshold)
+            regressions += regressed
+            print('{:<26} {:>8.2f}ms {:>12.1f} {:<5} {:>7.0f}KB  {}'.format(
+                result.name, result.seconds * 1000, result.throughput,
+                result.unit + '/s', result.peak / 1024,
+                note if baseline else ''))
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.save_baseline:
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                results = dict(json.load(f), **results)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('\nBaseline saved to {}'.format(args.baseline))
+    if regressions:
+        print('\n{} stages regressed by more than {:.0%}'.format(
+            regressions, args.threshold))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
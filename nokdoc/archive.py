@@ -0,0 +1,385 @@
+"""
+Deduplicating store of the downloaded collection zips.
+
+Zips are ingested by streaming through them once. The compressed data of
+every member is stored once as a blob keyed by the CRC, sizes and
+compression method recorded in the central directory, members already
+in the store are not written again. Everything else in a zip (local
+headers, data descriptors, the central directory) is kept as a
+compressed skeleton, so the original zip is rebuilt byte for byte out of
+its skeleton and blobs. Single members are extracted without rebuilding
+the zip.
+
+Every blob is stored with the SHA256 digest of its data. A member whose
+key matches a stored blob is hashed and compared with it, different data
+sharing CRC32, sizes and compression method goes into a blob whose key
+is qualified with the digest. So a zip is fully verified once it is
+added. SHA256 digests of every zip and of the data of every member are
+recorded too, restore and extraction check what they write against them.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+import zlib
+
+from nokdoc import ziputil
+from nokdoc.download import hash_file, read_checksum
+
+
+class ArchiveError(Exception):
+    """
+    Raised when a zip can not be ingested, rebuilt or found in the store
+    """
+
+
+def member_key(info):
+    """
+    returns: blob key of a zip member described by ZipInfo `info`
+    """
+    return '{:08x}-{}-{}-{}'.format(info.CRC, info.compress_type,
+                                    info.compress_size, info.file_size)
+
+
+def parse_key(key):
+    """
+    returns: tuple (CRC, compression method, compressed size, size) out of
+    a blob key, qualified or not
+    """
+    crc, compress_type, compress_size, file_size = key.split('-')[:4]
+    return (int(crc, 16), int(compress_type), int(compress_size),
+            int(file_size))
+
+
+def copy_bytes(src, dst, size, *hashers):
+    """
+    Copies `size` bytes between file objects, feeding them into `hashers`.
+    The bytes are only read and hashed if `dst` is None
+    """
+    while size:
+        chunk = src.read(min(ziputil.COPY_BUFFER, size))
+        if not chunk:
+            raise ArchiveError('Unexpected end of data')
+        if dst is not None:
+            dst.write(chunk)
+        for hasher in hashers:
+            hasher.update(chunk)
+        size -= len(chunk)
+
+
+class ZipArchive(object):
+    """
+    Store of the zips in the `root` dir: blobs/ dir with the members data
+    and an SQLite database with the skeletons and members of the zips
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.blobs_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, 'archive.sqlite'))
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS zips (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE,
+                size INTEGER,
+                sha256 TEXT,
+                ingested REAL,
+                new_bytes INTEGER,
+                skeleton BLOB);
+            CREATE TABLE IF NOT EXISTS members (
+                zip_id INTEGER,
+                position INTEGER,
+                filename TEXT,
+                data_offset INTEGER,
+                blob TEXT,
+                date_time TEXT,
+                flag_bits INTEGER,
+                external_attr INTEGER,
+                sha256 TEXT,
+                PRIMARY KEY (zip_id, position));
+            CREATE INDEX IF NOT EXISTS members_blob ON members (blob);
+            CREATE TABLE IF NOT EXISTS blobs (
+                key TEXT PRIMARY KEY,
+                size INTEGER,
+                sha256 TEXT);
+        ''')
+        # stores created before the digests were recorded
+        for table in ('members', 'blobs'):
+            if 'sha256' not in [column[1] for column in self._db.execute(
+                    'PRAGMA table_info({})'.format(table))]:
+                self._db.execute('ALTER TABLE {} ADD COLUMN sha256 '
+                                 'TEXT'.format(table))
+        self._db.commit()
+
+    def blob_path(self, key):
+        return os.path.join(self.blobs_dir, key[:2], key)
+
+    def blob_digest(self, key):
+        """
+        returns: SHA256 digest of a stored blob or None if there is no
+        such blob
+        """
+        row = self._db.execute('SELECT sha256 FROM blobs WHERE key = ?',
+                               (key,)).fetchone()
+        if row is None:
+            return None
+        if row[0] is None:
+            # blob stored before the digests were recorded
+            digest = hash_file(self.blob_path(key)).hexdigest()
+            self._db.execute('UPDATE blobs SET sha256 = ? WHERE key = ?',
+                             (digest, key))
+            return digest
+        return row[0]
+
+    def add(self, path, name=None):
+        """
+        Ingests a zip under `name`, the file name by default, replacing a
+        zip stored under the same name. The zip is checked against the
+        checksum stored next to it, if any, and every member is checked
+        against the blob it is stored in, so the zip is safe to remove
+        once this returns.
+        returns: tuple (number of new members, bytes of new members)
+        """
+        if name is None:
+            name = os.path.basename(path)
+        size = os.path.getsize(path)
+        zip_hasher = hashlib.sha256()
+        skeleton = zlib.compressobj()
+        skeleton_parts = []
+        members = []
+        new_members = new_bytes = 0
+        try:
+            with open(path, 'rb') as fp, zipfile.ZipFile(fp) as zf:
+                infos = sorted(enumerate(zf.infolist()),
+                               key=lambda i: i[1].header_offset)
+                pos = 0
+                for position, info in infos:
+                    offset = ziputil.data_offset(fp, info)
+                    if offset < pos:
+                        raise ArchiveError('Overlapping members in {}'.format(
+                            path))
+                    fp.seek(pos)
+                    gap = fp.read(offset - pos)
+                    zip_hasher.update(gap)
+                    skeleton_parts.append(skeleton.compress(gap))
+                    key = member_key(info)
+                    # blobs written by this zip are already visible
+                    stored = self.blob_digest(key)
+                    if stored is None:
+                        digest = self._write_blob(fp, key, info.compress_size,
+                                                  zip_hasher)
+                        new_members += 1
+                        new_bytes += info.compress_size
+                    else:
+                        member_hasher = hashlib.sha256()
+                        copy_bytes(fp, None, info.compress_size, zip_hasher,
+                                   member_hasher)
+                        digest = member_hasher.hexdigest()
+                    if stored is not None and digest != stored:
+                        # different data sharing the key
+                        key = '{}-{}'.format(key, digest)
+                        if self.blob_digest(key) is None:
+                            fp.seek(offset)
+                            self._write_blob(fp, key, info.compress_size)
+                            new_members += 1
+                            new_bytes += info.compress_size
+                    pos = offset + info.compress_size
+                    members.append((position, info.filename, offset, key,
+                                    '{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}'
+                                    .format(*info.date_time),
+                                    info.flag_bits, info.external_attr,
+                                    digest))
+                fp.seek(pos)
+                tail = fp.read()
+                zip_hasher.update(tail)
+                skeleton_parts.append(skeleton.compress(tail))
+                skeleton_parts.append(skeleton.flush())
+            checksum = read_checksum(path)
+            if checksum and checksum != zip_hasher.hexdigest():
+                raise ArchiveError('{} does not match its checksum'.format(
+                    path))
+        except ArchiveError:
+            self._db.rollback()
+            raise
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, ValueError) as e:
+            self._db.rollback()
+            raise ArchiveError('{} is not a valid zip: {}'.format(path, e))
+
+        replaced = self._delete(name)
+        cur = self._db.execute(
+            'INSERT INTO zips (name, size, sha256, ingested, new_bytes, '
+            'skeleton) VALUES (?, ?, ?, ?, ?, ?)',
+            (name, size, zip_hasher.hexdigest(), time.time(), new_bytes,
+             b''.join(skeleton_parts)))
+        self._db.executemany(
+            'INSERT INTO members VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((cur.lastrowid,) + member for member in members))
+        self._db.commit()
+        if replaced:
+            # blobs used by the replaced zip only
+            self.prune()
+        return new_members, new_bytes
+
+    def _write_blob(self, fp, key, size, *hashers):
+        """
+        returns: SHA256 digest of the written blob
+        """
+        path = self.blob_path(key)
+        hasher = hashlib.sha256()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            copy_bytes(fp, f, size, hasher, *hashers)
+        os.replace(path + '.tmp', path)
+        self._db.execute('INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)',
+                         (key, size, hasher.hexdigest()))
+        return hasher.hexdigest()
+
+    def _zip_row(self, name):
+        row = self._db.execute(
+            'SELECT id, size, sha256, skeleton FROM zips WHERE name = ?',
+            (name,)).fetchone()
+        if row is None:
+            raise ArchiveError('There is no {} in the archive'.format(name))
+        return row
+
+    def restore(self, name, path):
+        """
+        Rebuilds a zip stored under `name` into `path`, the result is
+        checked against the size and digest of the ingested zip.
+        returns: SHA256 digest of the rebuilt zip
+        """
+        zip_id, size, sha256, skeleton = self._zip_row(name)
+        skeleton = zlib.decompress(skeleton)
+        hasher = hashlib.sha256()
+        skeleton_pos = pos = 0
+        with open(path + '.tmp', 'wb') as f:
+            for offset, key in self._db.execute(
+                    'SELECT data_offset, blob FROM members WHERE zip_id = ? '
+                    'ORDER BY data_offset', (zip_id,)):
+                gap = skeleton[skeleton_pos:skeleton_pos + offset - pos]
+                f.write(gap)
+                hasher.update(gap)
+                skeleton_pos += len(gap)
+                blob_size = os.path.getsize(self.blob_path(key))
+                with open(self.blob_path(key), 'rb') as blob:
+                    copy_bytes(blob, f, blob_size, hasher)
+                pos = offset + blob_size
+            f.write(skeleton[skeleton_pos:])
+            hasher.update(skeleton[skeleton_pos:])
+            written = f.tell()
+        if written != size or (sha256 and hasher.hexdigest() != sha256):
+            os.remove(path + '.tmp')
+            raise ArchiveError('Rebuilt {} does not match the ingested '
+                               'zip'.format(name))
+        os.replace(path + '.tmp', path)
+        return hasher.hexdigest()
+
+    def extract(self, name, member, path):
+        """
+        Extracts a single member of a zip stored under `name` into `path`.
+        The member data is wrapped into a one member zip on the way, so
+        zipfile takes care of the decompression and CRC check
+        """
+        zip_id = self._zip_row(name)[0]
+        row = self._db.execute(
+            'SELECT blob, date_time, flag_bits, external_attr, sha256 '
+            'FROM members WHERE zip_id = ? AND filename = ?',
+            (zip_id, member)).fetchone()
+        if row is None:
+            raise ArchiveError('There is no {} in {}'.format(member, name))
+        key, date_time, flag_bits, external_attr, sha256 = row
+        if sha256 and hash_file(self.blob_path(key)).hexdigest() != sha256:
+            raise ArchiveError('Stored data of {} does not match the '
+                               'ingested member'.format(member))
+        info = zipfile.ZipInfo(member, tuple(
+            int(n) for n in date_time.replace('-', ' ').replace(':', ' ')
+            .split()))
+        (info.CRC, info.compress_type, info.compress_size,
+         info.file_size) = parse_key(key)
+        info.flag_bits = flag_bits
+        info.external_attr = external_attr
+
+        with tempfile.TemporaryFile() as tmp:
+            writer = ziputil.RawZipWriter(tmp)
+            with open(self.blob_path(key), 'rb') as blob:
+                writer.write_raw(info, blob, 'member')
+            writer.close()
+            tmp.seek(0)
+            with zipfile.ZipFile(tmp) as zf, zf.open('member') as src, \
+                    open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, ziputil.COPY_BUFFER)
+
+    def members(self, name):
+        """
+        returns: list of tuples (file name, size) of a stored zip
+        """
+        zip_id = self._zip_row(name)[0]
+        return [(filename, parse_key(key)[3])
+                for filename, key in self._db.execute(
+                    'SELECT filename, blob FROM members WHERE zip_id = ? '
+                    'ORDER BY position', (zip_id,))]
+
+    def zips(self):
+        """
+        returns: list of tuples (name, size, members, bytes added to the
+        store by the zip, ingestion time)
+        """
+        return self._db.execute(
+            'SELECT name, size, (SELECT COUNT(*) FROM members m '
+            'WHERE m.zip_id = z.id), new_bytes, ingested FROM zips z '
+            'ORDER BY name').fetchall()
+
+    def _delete(self, name):
+        """
+        returns: True if there was a zip stored under `name`
+        """
+        row = self._db.execute('SELECT id FROM zips WHERE name = ?',
+                               (name,)).fetchone()
+        if row is not None:
+            self._db.execute('DELETE FROM members WHERE zip_id = ?', row)
+            self._db.execute('DELETE FROM zips WHERE id = ?', row)
+        return row is not None
+
+    def remove(self, name):
+        """
+        Removes a zip from the store along with the blobs no other zip
+        refers to
+        returns: number of removed blobs
+        """
+        self._zip_row(name)
+        self._delete(name)
+        return self.prune()
+
+    def prune(self):
+        """
+        Removes the blobs no zip refers to
+        returns: number of removed blobs
+        """
+        orphans = [key for key, in self._db.execute(
+            'SELECT key FROM blobs WHERE key NOT IN '
+            '(SELECT blob FROM members)')]
+        for key in orphans:
+            if os.path.isfile(self.blob_path(key)):
+                os.remove(self.blob_path(key))
+            self._db.execute('DELETE FROM blobs WHERE key = ?', (key,))
+        self._db.commit()
+        return len(orphans)
+
+    def stats(self):
+        """
+        returns: tuple (number of zips, their total size, number of blobs,
+        size of the store)
+        """
+        zips, zips_size, skeletons = self._db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), '
+            'COALESCE(SUM(LENGTH(skeleton)), 0) FROM zips').fetchone()
+        blobs, blobs_size = self._db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+        return zips, zips_size, blobs, blobs_size + skeletons
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,139 @@
+"""
+On-disk cache for the json responses of the documentation server.
+
+Responses are stored already decoded and cleaned by get_json_resp()
+in a SQLite database keyed by the request URL, params and user.
+Entries expire after `ttl` seconds, least recently used entries are
+evicted once the total size of the cache exceeds `max_size` bytes.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ResponseCache(object):
+    """
+    Thread-safe persistent cache for decoded json responses.
+
+    `namespace` separates responses received by different users since the
+    documentation server replies differently to guests and logged in users.
+    With `refresh` enabled lookups always miss, but fresh responses are
+    still stored.
+    """
+
+    def __init__(self, path, ttl=86400, max_size=256 * 1024 * 1024,
+                 namespace='', refresh=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.namespace = namespace
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, '
+                         'url TEXT, '
+                         'created REAL, '
+                         'accessed REAL, '
+                         'size INTEGER, '
+                         'body BLOB)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                         'ON responses (accessed)')
+        self._db.commit()
+
+    def key(self, url, params):
+        """
+        Builds a cache key out of the request properties
+        """
+        raw = json.dumps([self.namespace, url, params or {}], sort_keys=True)
+        return hashlib.sha1(raw.encode('utf8')).hexdigest()
+
+    def get(self, url, params):
+        """
+        Returns a cached response or None if there is no fresh one
+        """
+        if self.refresh:
+            self.misses += 1
+            return None
+        key = self.key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT created, body FROM responses WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or now - row[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._db.execute('UPDATE responses SET accessed = ? '
+                             'WHERE key = ?', (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[1]).decode('utf8'))
+
+    def set(self, url, params, resp):
+        """
+        Stores a response and evicts least recently used entries
+        if the cache has grown beyond its size limit
+        """
+        body = zlib.compress(json.dumps(resp).encode('utf8'))
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO responses '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (self.key(url, params), url, now, now,
+                              len(body), body))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_size:
+            return
+        for key, size in self._db.execute(
+                'SELECT key, size FROM responses '
+                'ORDER BY accessed').fetchall():
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def stats(self):
+        """
+        Returns a dict with the cache usage figures
+        """
+        now = time.time()
+        with self._lock:
+            entries, size, oldest = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created) '
+                'FROM responses').fetchone()
+            expired = self._db.execute(
+                'SELECT COUNT(*) FROM responses WHERE created < ?',
+                (now - self.ttl,)).fetchone()[0]
+        return {'path': self.path,
+                'entries': entries,
+                'expired': expired,
+                'size': size,
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'oldest': oldest}
+
+    def clear(self):
+        """
+        Removes all the entries, returns the number of removed entries
+        """
+        with self._lock:
+            removed = self._db.execute('DELETE FROM responses').rowcount
+            self._db.commit()
+            self._db.execute('VACUUM')
+        return removed
@@ -0,0 +1,66 @@
+"""
+Bounded in-memory capture of the raw documentation server responses.
+
+The last responses are kept in a ring buffer along with their sizes and
+timings. They are written to a file only when a response can not be
+decoded or when asked to, so regular runs do not pay for diagnostics:
+adding a response only stores references to it, the body is neither
+copied nor formatted.
+"""
+import time
+from collections import deque, namedtuple
+
+CapturedResponse = namedtuple('CapturedResponse', [
+    'received', 'method', 'url', 'status', 'elapsed', 'size', 'body'])
+
+
+class ResponseCapture(object):
+    """
+    Ring buffer of the last `size` responses, dumped into `path`
+    unless told otherwise
+    """
+
+    def __init__(self, size=16, path='nokdoc_responses.log'):
+        self.size = size
+        self.path = path
+        self._responses = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._responses)
+
+    def add(self, r):
+        """
+        Captures a requests response
+        """
+        request = getattr(r, 'request', None)
+        elapsed = getattr(r, 'elapsed', None)
+        body = r.content or b''
+        # deque appends are atomic, no lock is needed for the worker threads
+        self._responses.append(CapturedResponse(
+            received=time.time(),
+            method=getattr(request, 'method', 'GET'),
+            url=getattr(r, 'url', ''),
+            status=r.status_code,
+            elapsed=elapsed.total_seconds() if elapsed else None,
+            size=len(body),
+            body=body))
+
+    def dump(self, path=None):
+        """
+        Writes the captured responses to `path` oldest first, every body
+        is preceded by a header line with the request and its figures
+        returns: path of the written file
+        """
+        if path is None:
+            path = self.path
+        with open(path, 'w', encoding='utf8') as f:
+            for resp in list(self._responses):
+                f.write('### {} {} {} -> {}, {} bytes{}\n'.format(
+                    time.strftime('%Y/%m/%d %H:%M:%S',
+                                  time.localtime(resp.received)),
+                    resp.method, resp.url, resp.status, resp.size,
+                    '' if resp.elapsed is None
+                    else ' in {:.3f}s'.format(resp.elapsed)))
+                f.write(resp.body.decode('utf8', 'replace'))
+                f.write('\n\n')
+        return path
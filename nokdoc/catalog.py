@@ -0,0 +1,147 @@
+"""
+Offline catalog of the documentation server metadata.
+
+Release lists and parsed docs lists of every product are stored in a
+SQLite database by the sync command, so that releases and docs can be
+looked up without querying the documentation server. Every synced
+release keeps a digest of the raw responses it was built from, a release
+is only rewritten when the digest changes.
+"""
+import json
+import os
+import sqlite3
+import time
+
+
+class Catalog(object):
+    """
+    Products, releases and docs stored in a SQLite database.
+    Docs are returned as tuples ordered like DocEntry fields:
+    (doc_id, title, issue, issue_date, links, restricted)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        catalog_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(catalog_dir):
+            os.makedirs(catalog_dir)
+        self._db = sqlite3.connect(path)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS releases (
+                product TEXT,
+                release TEXT,
+                digest TEXT,
+                synced REAL,
+                PRIMARY KEY (product, release));
+            CREATE TABLE IF NOT EXISTS docs (
+                product TEXT,
+                release TEXT,
+                position INTEGER,
+                doc_id TEXT,
+                title TEXT,
+                issue TEXT,
+                issue_date TEXT,
+                links TEXT,
+                restricted INTEGER);
+            CREATE INDEX IF NOT EXISTS docs_product ON docs (product);
+            CREATE INDEX IF NOT EXISTS docs_release ON docs (release);
+            CREATE INDEX IF NOT EXISTS docs_doc_id ON docs (doc_id);
+            CREATE INDEX IF NOT EXISTS docs_issue_date ON docs (issue_date);
+        ''')
+        self._db.commit()
+
+    def releases(self, product):
+        """
+        returns: list of the synced releases of a product, releases whose
+        docs could not be fetched yet are left out
+        """
+        return [r for r, in self._db.execute(
+            'SELECT release FROM releases WHERE product = ? AND '
+            'digest IS NOT NULL', (product,))]
+
+    def digests(self, product):
+        """
+        returns: dict {release: digest of the responses it was built from}
+        """
+        return dict(self._db.execute(
+            'SELECT release, digest FROM releases WHERE product = ?',
+            (product,)))
+
+    def set_releases(self, product, releases):
+        """
+        Removes the releases of a product which are no longer available
+        along with their docs. Releases are added by store() once their
+        docs are fetched
+        """
+        releases = set(releases)
+        stored = set(r for r, in self._db.execute(
+            'SELECT release FROM releases WHERE product = ?', (product,)))
+        for release in stored - releases:
+            self._db.execute('DELETE FROM releases WHERE product = ? AND '
+                             'release = ?', (product, release))
+            self._db.execute('DELETE FROM docs WHERE product = ? AND '
+                             'release = ?', (product, release))
+        self._db.commit()
+
+    def store(self, product, release, docs, digest):
+        """
+        Replaces the docs of a product release
+        """
+        self._db.execute('DELETE FROM docs WHERE product = ? AND '
+                         'release = ?', (product, release))
+        self._db.executemany(
+            'INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((product, release, i, doc_id, title, issue, issue_date,
+              json.dumps(links), restricted)
+             for i, (doc_id, title, issue, issue_date, links, restricted)
+             in enumerate(docs)))
+        self._db.execute('INSERT OR REPLACE INTO releases VALUES '
+                         '(?, ?, ?, ?)', (product, release, digest,
+                                          time.time()))
+        self._db.commit()
+
+    def docs(self, product, release='', link_type=None, sort='title'):
+        """
+        Yields docs of a product release, or of all its releases if
+        `release` is empty. With `link_type` (PDF, HTML, ZIP) only the
+        docs having such links are returned, with such links only
+        """
+        sql = 'SELECT doc_id, title, issue, issue_date, links, ' \
+              'restricted FROM docs WHERE product = ?'
+        params = [product]
+        if release:
+            sql += ' AND release = ? COLLATE NOCASE'
+            params.append(release)
+        if sort == 'issue_date':
+            sql += ' ORDER BY issue_date DESC, position'
+        else:
+            # docs are synced sorted by title by the server, its order
+            # is kept so the offline output matches the online one
+            sql += ' ORDER BY release, position'
+
+        seen_doc_ids = set()
+        for doc_id, title, issue, issue_date, links, restricted in \
+                self._db.execute(sql, params):
+            # the same doc is listed in several releases
+            if doc_id in seen_doc_ids:
+                continue
+            seen_doc_ids.add(doc_id)
+            links = tuple(tuple(link) for link in json.loads(links))
+            if link_type:
+                links = tuple(l for l in links if l[1] == link_type)
+                if not links:
+                    continue
+            yield doc_id, title, issue, issue_date, links, bool(restricted)
+
+    def stats(self):
+        """
+        returns: list of tuples (product, releases, docs, last sync time)
+        """
+        return self._db.execute(
+            'SELECT r.product, COUNT(*), '
+            '(SELECT COUNT(*) FROM docs d WHERE d.product = r.product), '
+            'MAX(r.synced) FROM releases r WHERE r.digest IS NOT NULL '
+            'GROUP BY r.product ORDER BY r.product').fetchall()
+
+    def close(self):
+        self._db.close()
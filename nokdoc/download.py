@@ -0,0 +1,325 @@
+"""
+Resumable download of large files over HTTP.
+
+A file is downloaded into a `.part` file next to the target path and is
+moved into place only once complete, so an interrupted download is resumed
+with an HTTP Range request on the next run. When the server supports
+ranges, a download can be split into several ranges fetched in parallel.
+The layout of the download (size of the file and number of ranges) is
+kept next to the parts, parts of a download split differently or of a
+different file are discarded rather than resumed.
+A SHA256 checksum of the file is computed along the way.
+"""
+import glob
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# size of the chunks read from the network
+CHUNK_SIZE = 256 * 1024
+# size of the buffer of the files being written
+WRITE_BUFFER = 4 * 1024 * 1024
+CONTENT_RANGE = re.compile(r'bytes (?:(\d+)-\d+|\*)/(\d+)$')
+
+
+class DownloadError(Exception):
+    """
+    Raised when a file can not be downloaded
+    """
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting the total bandwidth of the downloads sharing it.
+    `rate` is in bytes per second
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._allowance = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        """
+        Blocks the calling thread until `nbytes` fit into the rate limit
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance +
+                                  (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= nbytes
+            wait = -self._allowance / self.rate
+            if wait > 0:
+                # the bucket is refilled while sleeping, sleeping under
+                # the lock makes other threads queue up behind
+                time.sleep(wait)
+
+
+def part_path(path):
+    return path + '.part'
+
+
+def layout_path(path):
+    return part_path(path) + '.layout'
+
+
+def remove_parts(path):
+    """
+    Removes the parts and the layout left by a download of `path`
+    """
+    for leftover in [part_path(path)] + glob.glob(
+            glob.escape(part_path(path)) + '.*'):
+        if os.path.isfile(leftover):
+            os.remove(leftover)
+
+
+def check_layout(path, size, connections):
+    """
+    Keeps the parts left by an interrupted download of `path` only if
+    they were downloaded for a file of the same `size` split into the
+    same number of `connections`, starts the download over otherwise
+    """
+    layout = '{} {}'.format(size, connections)
+    try:
+        with open(layout_path(path)) as f:
+            previous = f.read().strip()
+    except IOError:
+        previous = None
+    if previous != layout:
+        remove_parts(path)
+        with open(layout_path(path), 'w') as f:
+            f.write(layout + '\n')
+
+
+def content_range(r):
+    """
+    returns: tuple (first byte or None, total size) from the Content-Range
+    header of a response, (None, None) if it has none
+    """
+    m = CONTENT_RANGE.match(r.headers.get('Content-Range', ''))
+    if not m:
+        return None, None
+    return (None if m.group(1) is None else int(m.group(1)),
+            int(m.group(2)))
+
+
+def probe(s, url):
+    """
+    Checks if the server supports range requests for a given URL.
+    returns: tuple (size of the file or None, ranges supported as bool)
+    """
+    r = s.get(url, headers={'Range': 'bytes=0-0'}, stream=True)
+    try:
+        if r.status_code == 206:
+            total = content_range(r)[1]
+            if total is not None:
+                return total, True
+        if r.status_code == 200 and r.headers.get('Content-Length'):
+            return int(r.headers['Content-Length']), False
+        return None, False
+    finally:
+        r.close()
+
+
+def hash_file(path, hasher=None):
+    """
+    Feeds contents of a file into a hasher, sha256 by default
+    """
+    if hasher is None:
+        hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(WRITE_BUFFER), b''):
+            hasher.update(chunk)
+    return hasher
+
+
+def fetch_range(s, url, path, start=0, end=None, hasher=None, progress=None,
+                limiter=None, total=None):
+    """
+    Downloads bytes `start`-`end` (inclusive, up to the end of the file if
+    `end` is None) of a given URL into `path`.
+    Bytes already present in `path` are not downloaded again, provided the
+    server sends the expected range of a file of `total` bytes (if known).
+    A whole file download whose bytes turn out to be of another file is
+    started over.
+    The written data is fed into `hasher` if one is given.
+    Bandwidth is capped by a shared RateLimiter `limiter` if one is given.
+    returns: the hasher, a new one if the download had to start over
+    """
+    done = 0
+    if os.path.isfile(path):
+        done = os.path.getsize(path)
+    if end is not None and start + done > end:
+        return hasher
+    if hasher is not None and done:
+        hash_file(path, hasher)
+
+    headers = {}
+    if start + done or end is not None:
+        headers['Range'] = 'bytes={}-{}'.format(
+            start + done, '' if end is None else end)
+
+    def start_over():
+        os.remove(path)
+        return fetch_range(s, url, path, start, end,
+                           None if hasher is None else hashlib.sha256(),
+                           progress, limiter, total)
+
+    r = s.get(url, headers=headers, stream=True)
+    try:
+        whole_file = start == 0 and end is None
+        if r.status_code == 416 and end is None:
+            size = content_range(r)[1] or total
+            if size is None or size == start + done:
+                # nothing left to download
+                return hasher
+            # the part is longer than the file, it is of another file
+            if whole_file and done:
+                r.close()
+                return start_over()
+            raise DownloadError('Server responded with the code 416')
+        if r.status_code == 206 and headers:
+            first, size = content_range(r)
+            if first != start + done or (total is not None and
+                                         size != total):
+                if whole_file and done:
+                    r.close()
+                    return start_over()
+                raise DownloadError(
+                    'Server sent {} instead of bytes {}-{} of {}'.format(
+                        r.headers.get('Content-Range'), start + done,
+                        '' if end is None else end, total or 'the file'))
+        elif headers and r.status_code == 200:
+            # server ignored the range, start over
+            if start:
+                raise DownloadError('Server does not support range requests')
+            done = 0
+            if hasher is not None:
+                hasher = hashlib.sha256()
+        elif r.status_code not in (200, 206):
+            raise DownloadError('Server responded with the code {}'.format(
+                r.status_code))
+
+        mode = 'ab' if done else 'wb'
+        with open(path, mode, buffering=WRITE_BUFFER) as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                if limiter is not None:
+                    limiter.consume(len(chunk))
+                if progress is not None:
+                    progress(len(chunk))
+    finally:
+        r.close()
+    return hasher
+
+
+def fetch(s, url, path, size=None, connections=1, progress=None,
+          limiter=None):
+    """
+    Downloads a given URL into `path` resuming a previously interrupted
+    download if any.
+    With `connections` > 1 the file is split into that many ranges fetched
+    in parallel, provided the server supports range requests.
+
+    `progress` is called with the number of bytes received, including the
+    bytes downloaded by the previous attempts.
+    returns: SHA256 hexdigest of the downloaded file
+    """
+    if connections > 1:
+        size, ranges_supported = probe(s, url)
+        if not ranges_supported or not size:
+            connections = 1
+    check_layout(path, size, connections)
+    if connections == 1:
+        return _fetch_single(s, url, path, size, progress, limiter)
+    return _fetch_ranges(s, url, path, size, connections, progress, limiter)
+
+
+def _fetch_single(s, url, path, size, progress, limiter):
+    part = part_path(path)
+    hasher = hashlib.sha256()
+    if progress is not None and os.path.isfile(part):
+        progress(os.path.getsize(part))
+    hasher = fetch_range(s, url, part, hasher=hasher, progress=progress,
+                         limiter=limiter, total=size)
+    if size and os.path.getsize(part) != size:
+        downloaded = os.path.getsize(part)
+        # the next run starts over rather than resuming a bad part
+        remove_parts(path)
+        raise DownloadError('Downloaded {} bytes out of {}'.format(
+            downloaded, size))
+    os.replace(part, path)
+    remove_parts(path)
+    return hasher.hexdigest()
+
+
+def _fetch_ranges(s, url, path, size, connections, progress, limiter):
+    part = part_path(path)
+    lock = threading.Lock()
+
+    def locked_progress(nbytes):
+        with lock:
+            progress(nbytes)
+
+    range_size = -(-size // connections)
+    ranges = []
+    for i in range(connections):
+        start = i * range_size
+        end = min(start + range_size, size) - 1
+        ranges.append(('{}.{}'.format(part, i), start, end))
+        if progress is not None and os.path.isfile(ranges[-1][0]):
+            progress(os.path.getsize(ranges[-1][0]))
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(fetch_range, s, url, range_part, start,
+                                   end, None,
+                                   progress and locked_progress, limiter,
+                                   size)
+                   for range_part, start, end in ranges]
+        for future in futures:
+            future.result()
+
+    for range_part, start, end in ranges:
+        if os.path.getsize(range_part) != end - start + 1:
+            if os.path.getsize(range_part) > end - start + 1:
+                os.remove(range_part)
+            raise DownloadError('Range {}-{} is incomplete'.format(start, end))
+
+    # reassemble the ranges computing the checksum on the way
+    hasher = hashlib.sha256()
+    with open(part, 'wb', buffering=WRITE_BUFFER) as f:
+        for range_part, _, _ in ranges:
+            with open(range_part, 'rb') as rf:
+                for chunk in iter(lambda: rf.read(WRITE_BUFFER), b''):
+                    f.write(chunk)
+                    hasher.update(chunk)
+    os.replace(part, path)
+    remove_parts(path)
+    return hasher.hexdigest()
+
+
+def read_checksum(path):
+    """
+    Reads the checksum stored next to a file by write_checksum()
+    returns: hexdigest or None if there is no stored checksum
+    """
+    try:
+        with open(path + '.sha256') as f:
+            return f.read().split()[0]
+    except (IOError, IndexError):
+        return None
+
+
+def write_checksum(path, digest):
+    """
+    Stores the checksum of a file next to it in a sha256sum compatible format
+    """
+    with open(path + '.sha256', 'w') as f:
+        f.write('{}  {}\n'.format(digest, os.path.basename(path)))
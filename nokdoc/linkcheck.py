@@ -0,0 +1,193 @@
+"""
+Concurrent validation of the links to the docs.
+
+Links are checked with HEAD requests issued by a bounded pool of threads
+sharing a session, so connections to a host are reused. Requests to a
+host are spaced out by a per-host rate limit to stay polite with the
+documentation server. Results are kept in a SQLite database for `ttl`
+seconds, repeated runs only check the links whose results went stale.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+# `status` is None when the server could not be reached, the reason is
+# then in `error`. `latency` is in seconds
+LinkResult = namedtuple('LinkResult', ['url', 'status', 'latency', 'error',
+                                       'checked'])
+
+# results are committed in batches of that many
+COMMIT_EVERY = 100
+# servers answering these to HEAD requests are asked with GET
+HEAD_NOT_ALLOWED = (403, 405, 501)
+
+
+def is_broken(result):
+    return result.status is None or result.status >= 400
+
+
+class HostRateLimiter(object):
+    """
+    Spaces out the requests to every host to `rate` requests per second
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """
+        Blocks the calling thread until a request to the host of `url`
+        fits into the rate limit
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        # slots are reserved under the lock, threads waiting for
+        # other hosts are not held up
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LinkCache(object):
+    """
+    Thread-safe persistent store of the link check results.
+    With `refresh` enabled lookups always miss, but fresh results are
+    still stored.
+    """
+
+    def __init__(self, path, ttl=86400, refresh=False):
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS links ('
+                         'url TEXT PRIMARY KEY, '
+                         'status INTEGER, '
+                         'latency REAL, '
+                         'error TEXT, '
+                         'checked REAL)')
+        self._db.commit()
+
+    def get_many(self, urls):
+        """
+        returns: dict {url: LinkResult} of the fresh results among `urls`
+        """
+        if self.refresh:
+            return {}
+        urls = list(urls)
+        results = {}
+        with self._lock:
+            # stay below the SQLite limit of variables in a statement
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i + 500]
+                for row in self._db.execute(
+                        'SELECT url, status, latency, error, checked '
+                        'FROM links WHERE checked > ? AND url IN ({})'.format(
+                            ','.join('?' * len(chunk))),
+                        [time.time() - self.ttl] + chunk):
+                    results[row[0]] = LinkResult(*row)
+        return results
+
+    def set(self, result):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO links '
+                             'VALUES (?, ?, ?, ?, ?)', result)
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+def check_link(s, url, timeout=10):
+    """
+    Checks a link with a HEAD request, servers refusing HEAD requests are
+    asked with a GET request whose body is not read.
+    returns: LinkResult
+    """
+    start = time.monotonic()
+    try:
+        r = s.head(url, allow_redirects=True, timeout=timeout)
+        if r.status_code in HEAD_NOT_ALLOWED:
+            r = s.get(url, allow_redirects=True, timeout=timeout,
+                      stream=True)
+            r.close()
+    except Exception as e:
+        return LinkResult(url, None, time.monotonic() - start,
+                          '{}: {}'.format(type(e).__name__, e), time.time())
+    return LinkResult(url, r.status_code, time.monotonic() - start, None,
+                      time.time())
+
+
+def check_links(s, urls, workers=8, rate=5.0, timeout=10, cache=None,
+                progress=None):
+    """
+    Checks the links concurrently, links with fresh results in the `cache`
+    are not checked again. `progress` is called with every new result.
+    Results of the links which could not be reached are not cached since
+    the failure might be on our side.
+    returns: tuple (dict {url: LinkResult}, list of the results checked
+    by this call)
+    """
+    urls = list(dict.fromkeys(urls))
+    results = cache.get_many(urls) if cache is not None else {}
+    checked = []
+    limiter = HostRateLimiter(rate)
+
+    def check(url):
+        limiter.wait(url)
+        return check_link(s, url, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(check, url) for url in urls
+                   if url not in results]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.url] = result
+            checked.append(result)
+            if cache is not None and result.status is not None:
+                cache.set(result)
+            if progress is not None:
+                progress(result)
+    return results, checked
+
+
+def latency_stats(results):
+    """
+    returns: dict {host: (checks, median, 95th percentile, max latency)}
+    of the checked links, an empty host stands for all of them
+    """
+    latencies = {'': []}
+    for result in results:
+        latencies.setdefault(urlsplit(result.url).netloc, []).append(
+            result.latency)
+        latencies[''].append(result.latency)
+
+    stats = {}
+    for host, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        stats[host] = (len(values), values[len(values) // 2],
+                       values[min(len(values) - 1,
+                                  int(len(values) * 0.95))],
+                       values[-1])
+    return stats
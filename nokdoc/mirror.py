@@ -0,0 +1,117 @@
+"""
+Content-addressed store of the individual documents.
+
+Every downloaded file is stored once under its SHA256 digest, an index
+maps the URL and version of a document to the digest of its contents.
+Documents shared between releases are fetched once and identical files
+behind different URLs are stored once. Per-release directories are
+views made of hardlinks to the stored files, they take no extra space.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from nokdoc import download
+
+
+class DocStore(object):
+    """
+    Thread-safe store of the documents kept in the `root` dir
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite'),
+                                   check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS urls ('
+                         'url TEXT, '
+                         'version TEXT, '
+                         'digest TEXT, '
+                         'size INTEGER, '
+                         'fetched REAL, '
+                         'PRIMARY KEY (url, version))')
+        self._db.commit()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def lookup(self, url, version=''):
+        """
+        returns: digest of the stored contents of a document or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT digest FROM urls WHERE url = ? AND version = ?',
+                (url, version)).fetchone()
+        if row is None or not os.path.isfile(self.object_path(row[0])):
+            return None
+        return row[0]
+
+    def fetch(self, s, url, version='', progress=None):
+        """
+        Downloads a document unless its version is already in the store.
+        Interrupted downloads are resumed by the next call.
+        returns: tuple (digest, number of downloaded bytes)
+        raises download.DownloadError if the document can not be fetched
+        """
+        digest = self.lookup(url, version)
+        if digest is not None:
+            return digest, 0
+
+        # the contents, thus the digest, are unknown until downloaded
+        tmp_path = os.path.join(self.tmp_dir, hashlib.sha1(
+            '{}\0{}'.format(url, version).encode('utf8')).hexdigest())
+        digest = download.fetch(s, url, tmp_path, progress=progress)
+        size = os.path.getsize(tmp_path)
+        path = self.object_path(digest)
+        if os.path.isfile(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO urls '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (url, version, digest, size, time.time()))
+            self._db.commit()
+        return digest, size
+
+    def link(self, digest, path):
+        """
+        Makes `path` a hardlink to the stored file, the file is copied
+        if the filesystem does not support hardlinks
+        """
+        obj = self.object_path(digest)
+        if os.path.isfile(path) and os.path.samefile(obj, path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.nokdoc-tmp'
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(obj, tmp_path)
+        except OSError:
+            shutil.copyfile(obj, tmp_path)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        """
+        returns: tuple (number of stored files, their size in bytes)
+        """
+        files = size = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                files += 1
+                size += os.path.getsize(os.path.join(dirpath, filename))
+        return files, size
+
+    def close(self):
+        self._db.close()
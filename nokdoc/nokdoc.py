@@ -1,27 +1,34 @@
+import csv
+import hashlib
+import itertools
 import json
 import logging
 import os
 import re
 import string
+import threading
 import time
 import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date
-from pprint import pprint, pformat
 
-import certifi
 import click
-import requests
-import tqdm
-import yaml
-from jinja2 import Environment, PackageLoader
-from natsort import natsorted, ns
+
+from nokdoc import download, linkcheck, profiling, ziputil
+from nokdoc.archive import ArchiveError, ZipArchive
+from nokdoc.cache import ResponseCache
+from nokdoc.capture import ResponseCapture
+from nokdoc.catalog import Catalog
+from nokdoc.mirror import DocStore
+from nokdoc.search import DocIndex, SearchError, HIT_START, HIT_END
 
 # disable unverified SSL certs warning
 # which occurs for infoproducts.alcatel-lucent.com server
 # requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
 
-# Log
-logging.basicConfig(filename='nokdoc_debug.log', level=logging.DEBUG)
+# heavy dependencies (requests, jinja2, yaml, tqdm, natsort) are imported
+# by the functions using them to keep the CLI startup fast
 
 # entry point for un-auth access to docs -- https://support.alcatel-lucent.com/portal/web/support
 # then go select some product and click on Manual and guides section
@@ -49,9 +56,13 @@ doc_id = {'nuage-vsp': '1-0000000000662',
           'cbis': '1-0000000001292'
           }
 
-# key: doc_ID
-# value: is_restricted (bool). True means restricted
-docs_permissions = {}
+# key: product entry_id
+# value: list of releases available for the product
+releases_memo = {}
+# per entry_id locks, so that parallel workers fetch a release list once
+# while different products are still fetched in parallel
+releases_locks = {}
+releases_locks_lock = threading.Lock()
 
 # correlation between short names of formats as they passed in cli
 # and their longer names as they go into HTTP requests.
@@ -74,6 +85,24 @@ proxies = {'https': ''}
 get_doc_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/au_get_doc_list.pl'
 get_doc_permissions_url = 'https://infoproducts.alcatel-lucent.com/cgi-bin/get_doc_list.pl'
 
+# ring buffer of the last raw responses for diagnostics,
+# dumped into a file when a response can not be decoded
+responses_capture = ResponseCapture(16)
+
+# guards the lazy opening of the responses cache by get_cache()
+cache_lock = threading.Lock()
+
+# jinja environment shared by all the renders of a run, templates are
+# compiled once and kept by the environment. Compiled templates are also
+# cached in `template_cache_dir` across runs if it is set
+template_env = None
+template_env_lock = threading.Lock()
+template_cache_dir = None
+
+# names of the requests to the API endpoints in the profile
+request_phases = {get_doc_url: 'docs list request',
+                  get_doc_permissions_url: 'permissions list request'}
+
 
 def user_auth(s, login, pwd):
     """
@@ -88,7 +117,8 @@ def user_auth(s, login, pwd):
          'Login': 'Log in',
          'TARGET': 'https://market.alcatel-lucent.com/release/employee/SPEmployeeLoginRedirectSvlt?SP_PAGE_ID=0&FINAL_TARGET=https%3A%2F%2Fsupport.alcatel-lucent.com%2Fportal%2Fweb%2Fsupport',
          'USER': login}
-    r = s.post(login_url, params=p)
+    with profiling.phase('login'):
+        r = s.post(login_url, params=p)
     if 'function checkUserName' in r.text:
         click.echo('  Login failed. Check login/password combination.')
         os.sys.exit()
@@ -97,18 +127,78 @@ def user_auth(s, login, pwd):
         return s
 
 
-def id_generator(size=3, chars=string.ascii_uppercase + string.digits):
-    import random
-    return ''.join(random.sample(chars, size))
+# A single parsed doc entry. `links` is a tuple of (url, type) tuples,
+# `restricted` tells if a doc requires a login for access
+DocEntry = namedtuple('DocEntry', ['doc_id', 'title', 'issue', 'issue_date',
+                                   'links', 'restricted'])
+
+# marker of the docs restricted to logged in users
+restricted_marker = 'a login is required for access'
+
+# tokens of a raw docdata: either a beginning of a new <tr> row or
+# contents of a single <td> element of the current row.
+# example: https://regex101.com/r/NhwnOp/1
+# this mysterious additional symbols in responce data appeared again
+# now they messed with </td> tag in responce for nuage-vsp rel 4.0.r5
+# refer to this output https://regex101.com/r/1KdJHJ/2
+# and look for matched result
+# when requesting data from browser I cant see any bogus symbols
+# same issue was the reason to create get_json_resp() function
+# TODO: this is not 100% reproducible. Analyze later and create an issue
+# as a workaround closing </td> tag is matched loosely
+docdata_token_patt = re.compile(r'<tr |<td.+?>(.+?)</t\S*?d>')
+doc_id_patt = re.compile(r'>(.*?)<')
+nobr_patt = re.compile('<nobr>|</nobr>')
+# https://regex101.com/r/7iAqds/1
+links_n_types_patt = re.compile(r"href='(.*?)'.*?title='(.*?)'")
+
+
+def iter_doc_rows(rawDoc):
+    """
+    Tokenizes a raw docdata in a single pass.
+    Yields a list of <td> contents for every <tr> element
+    """
+    row = []
+    for token in docdata_token_patt.finditer(rawDoc):
+        td = token.group(1)
+        if td is None:
+            # a new <tr> element begins
+            if row:
+                yield row
+            row = []
+        else:
+            row.append(td)
+    if row:
+        yield row
 
 
-@click.pass_context
-def parseDocdata(ctx, rawDoc, check_permissions=False):
+def parseDocdata(rawDoc, logged_in=False, permissions=None,
+                 check_permissions=False, restricted=None):
     """
     Parses a raw HTML document which comes as a reply from a GET request
     towards the documentation server.
-    Returns a list with dicts where each dict represents a single doc
+    Returns a list of DocEntry tuples where each one represents a single doc
     entry with its properties
+
+    if `check_permissions` == True, then returned value is a dict
+    {doc_id: is_restricted} collected from every doc entry.
+
+    `permissions` is a dict produced by a call with `check_permissions`,
+    docs missing in it are considered restricted.
+    Titles of the docs skipped since they require a login are appended to
+    `restricted` list if one is passed.
+    """
+    if check_permissions:
+        return parse_permissions([rawDoc], logged_in=logged_in,
+                                 restricted=restricted)
+    return list(iter_docs([rawDoc], logged_in=logged_in,
+                          permissions=permissions, restricted=restricted))
+
+
+def iter_valid_rows(docdata_chunks, logged_in=False, restricted=None):
+    """
+    Yields <td> contents of every doc entry row of the given raw docdata
+    chunks skipping the rows which are not accessible for a user
     """
 
     # using this link no login required to get the list of nuage docs
@@ -120,496 +210,819 @@ def parseDocdata(ctx, rawDoc, check_permissions=False):
     # but it requires login and have no info about restricted status of docs
     # https://infoproducts.alcatel-lucent.com/aces/cgi-bin/au_get_doc_list.pl?&entry_id=1-0000000000662&srch_how=Full%20Text&srch_str=&release=4.0.R6.1
 
-    doc_list = []
-    td_contents_patt = re.compile(r'<td.+?>(.+?)</td>')
-
-    # raw doc comes as html in a string without newlines
-    # to parse doc data which is in each <tr> I am inserting newlines
-    raw_doc_entries = rawDoc.replace('<tr ', '\n <tr ').split('\n')
-
-    # switch to show notification about restriced documents
-    show_restricted_docs_notification = True
-
-    for raw_entry in raw_doc_entries:
-        doc_data = {}  # dict to hold doc data for one particular entry
-
-        # this mysterious additional symbols in responce data appeared again
-        # now they messed with </td> tag in responce for nuage-vsp rel 4.0.r5
-        # refer to this output https://regex101.com/r/1KdJHJ/2
-        # and look for matched result
-        # when requesting data from browser I cant see any bogus symbols
-        # same issue was the reason to create get_json_resp() function
-        # TODO: this is not 100% reproducible. Analyze later and create an issue
-        # as a workaround I will validate every </td>
-        raw_entry = re.sub(r'</t\S*d>', '</td>', raw_entry)
-
-        # example: https://regex101.com/r/NhwnOp/1
-        td_contents = td_contents_patt.findall(raw_entry)
-        if td_contents:
-            if (not ctx.obj['LOGGED_IN']) and ('a login is required for access' in td_contents[1]):
-                if show_restricted_docs_notification:
-                    click.echo(
-                        '    The following documents are available to logged in users only. '
-                        'They will not be included in the documentation set...')
-                    show_restricted_docs_notification = False
-                click.echo('      ' + td_contents[0].strip())
-                continue
+    for rawDoc in docdata_chunks:
+        for td_contents in iter_doc_rows(rawDoc):
             if len(td_contents) <= 1:
                 continue
-            # click.echo('Adding doc {}'.format(td_contents[0]))
-            if check_permissions:
-                docs_permissions.update(
-                    parse_td(raw_td=td_contents, check_permissions=True))
-            else:
-                doc_data.update(parse_td(raw_td=td_contents))
-
-            # when dealing with combined product some docs might be in
-            # both sections. Append only unique docs.
-            if doc_data not in doc_list:
-                doc_list.append(doc_data)
-    # pprint(doc_list)
-    # os.sys.exit()
-    return doc_list
+            if (not logged_in) and (restricted_marker in td_contents[1]):
+                if restricted is not None:
+                    restricted.append(td_contents[0].strip())
+                continue
+            yield td_contents
 
 
-@click.pass_context
-def parse_td(ctx, raw_td, check_permissions=False):
+def parse_permissions(docdata_chunks, logged_in=False, restricted=None):
     """
-    Dissects given <td> elements from a singe <tr> element. A single <tr>
-    element represents a single document and its properties.
-    Returns a dict with key as doc_id and value as a dict with doc properties
+    Collects info if a doc is restricted to later show lock icon in HTML
+    for those docs which are with a restricted access.
+    returns: dict {doc_id: is_restricted}
+    """
+    return {parse_doc_id(td_contents): restricted_marker in td_contents[1]
+            for td_contents in iter_valid_rows(docdata_chunks, logged_in,
+                                               restricted)}
+
 
-    if `check_permissions` == True, then returned value is a dict {doc_id:is_restricted}
+def iter_docs(docdata_chunks, logged_in=False, permissions=None,
+              restricted=None):
     """
-    d = {}
+    Lazily parses the given raw docdata chunks.
+    Yields DocEntry tuples in the order of appearance
+    """
+    if permissions is None:
+        permissions = {}
+
+    # when dealing with combined product some docs might be in
+    # both sections. Keep only unique docs.
+    seen_doc_ids = set()
 
+    for td_contents in iter_valid_rows(docdata_chunks, logged_in, restricted):
+        doc = parse_td(raw_td=td_contents, permissions=permissions)
+        if doc.doc_id not in seen_doc_ids:
+            seen_doc_ids.add(doc.doc_id)
+            yield doc
+
+
+def parse_doc_id(raw_td):
+    """
+    Extracts doc_id from the <td> elements of a single doc entry
+    """
     # remove html elements from doc_id field
-    # key = re.sub('<nobr>|</nobr>', '', raw_td[1]).strip()
-    # key is doc_id
-    key = re.search(r'>(.*?)<', raw_td[1]).group(1).strip()
+    return doc_id_patt.search(raw_td[1]).group(1).strip()
 
-    if check_permissions:
-        # collect info if a doc is restricted to later show lock icon in HTML
-        # for those docs which are with a restricted access
-        if 'a login is required for access' in raw_td[1]:
-            d[key] = True
-        else:
-            d[key] = False
 
-    else:
-        d[key] = {'title': raw_td[0].strip(),
-                  'issue': raw_td[2].strip(),
-                  'issue_date': re.sub('<nobr>|</nobr>', '', raw_td[3]).strip(),
-                  'links': parse_td_links(raw_links=raw_td[4], doc_id=key),
-                  'restricted': docs_permissions.get(key, True)
-                  }
-    return d
+def parse_td(raw_td, permissions=None):
+    """
+    Dissects given <td> elements from a singe <tr> element. A single <tr>
+    element represents a single document and its properties.
+    Returns a DocEntry with doc properties
+    """
+    if permissions is None:
+        permissions = {}
 
+    key = parse_doc_id(raw_td)
+    return DocEntry(doc_id=key,
+                    title=raw_td[0].strip(),
+                    issue=raw_td[2].strip(),
+                    issue_date=nobr_patt.sub('', raw_td[3]).strip(),
+                    links=parse_td_links(raw_links=raw_td[4], doc_id=key),
+                    restricted=permissions.get(key, True))
 
-@click.pass_context
-def parse_td_links(ctx, raw_links, doc_id):
+
+def parse_td_links(raw_links, doc_id):
     """
     Parsing links contained in the last <td> elements.
-    returns: list of tuples
-    i.e. [(url, type), (url, type)]
+    returns: tuple of tuples
+    i.e. ((url, type), (url, type))
     """
     links = []
-    # https://regex101.com/r/7iAqds/1
-    links_n_types_patt = re.compile(r"href='(.*?)'.*?title='(.*?)'")
-    for url_n_type in links_n_types_patt.findall(raw_links):
-        link = url_n_type[0]
-        l_type = None  # link type
-        if 'PDF' in url_n_type[1].upper():
+    for link, title in links_n_types_patt.findall(raw_links):
+        title = title.upper()
+        if 'PDF' in title:
             l_type = 'PDF'
-        elif 'ZIP' in url_n_type[1].upper():
+        elif 'ZIP' in title:
             l_type = 'ZIP'
-        elif 'HTML' in url_n_type[1].upper():
+        elif 'HTML' in title:
             l_type = 'HTML'
         else:
             continue
 
         links.append((link, l_type))
-    return links
+    return tuple(links)
+
 
+def echo_restricted_docs(restricted):
+    """
+    Notifies a user about the documents which were skipped
+    since they are available to logged in users only
+    """
+    if not restricted:
+        return
+    click.echo(
+        '    The following documents are available to logged in users only. '
+        'They will not be included in the documentation set...')
+    for title in restricted:
+        click.echo('      ' + title)
 
-def create_doc_html(docs_list, product, release):
-    click.echo('\n  Building HTML with the docs you requested...')
 
-    # gluing filename
+def docs_fname(product, release, output_format='html'):
+    """
+    Glues the name of the docs file for a given product/release
+    """
     fname = 'nokdoc__{}'.format(product.upper())
     if release:
         fname += '__{}'.format(release.upper().replace(' ', '_'))
     # Is it of any good to put generation date in filename?
     # fname += '__{}'.format(date.today().strftime("%Y_%m_%d"))
-    fname += '.html'
-
-    env = Environment(loader=PackageLoader('nokdoc', 'template'),
-                      trim_blocks=True,
-                      lstrip_blocks=True)
-    template = env.get_template('nokdoc_docset.html')
-    with open(fname, 'w') as f:
-        html = template.render(docs_list=docs_list, product=product,
-                               release=release,
-                               gen_date=date.today().strftime("%Y/%m/%d"))
-        f.write(html)
-    click.echo('  Done! File created:\n   ->{}'
-               .format(os.path.join(os.path.abspath(os.path.curdir),
-                                    fname)))
-
-
-def get_rels(s, product_id):
-    '''
-    returns a list of available releases for a given product
-    '''
-    params = {'entry_id': product_id}
-    return requests.get(get_doc_permissions_url, params=params).json()['proddata']['release']
+    fname += '.' + output_extensions.get(output_format, output_format)
+    return fname
 
 
-def get_common_rels(s, product_ids):
+def template_digest():
     """
-    When working with combined product (like 'nuage' which consits of nuage-vsp
-    and nuage-vns products) it is necessary to define which releases are common
-    for every component.
+    returns: hexdigest of the templates shipped with the package, pages
+    are re-rendered when it changes
     """
-    common_rels = {}
-    for i, product_id in enumerate(product_ids):
-        if i == 0:
-            common_rels = set(get_rels(s, product_id))
-        common_rels.intersection_update(set(get_rels(s, product_id)))
-    return sorted(common_rels)
+    template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'template')
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(template_dir)):
+        with open(os.path.join(template_dir, name), 'rb') as f:
+            digest.update(name.encode('utf8') + b'\0' + f.read())
+    return digest.hexdigest()
 
 
-def download_doc(s, dwnld_doc_url, remote_fname, username, local_fname):
+def get_template(name):
     """
-    Downloads a collection zip file and stores it in the same dir
-    where nokdoc script was executed.
+    Loads a template from the shared environment, the environment is
+    created on the first call
     """
-    i = 1
-    while i != 30:
-        click.echo(
-            '  Waiting for the documentation server to prepare the archive. Attempt #{}'.format(i))
-        r = s.get(dwnld_doc_url, stream=True)
-        if r.status_code != requests.codes.ok:
-            click.echo('  !! Server encountered an error'
-                       ' with the code {}. Aborting'. format(r.status_code))
-            os.sys.exit()
-        if r.headers['Content-type'] != 'archive/zip':
-            time.sleep(5)
-            i += 1
-        else:
-            total_dwnld_size = int(get_coll_size(
-                s, remote_fname, username)) // 1024
-            with open(local_fname, 'wb') as f:
-                for data in tqdm.tqdm(r.iter_content(chunk_size=1024),
-                                      unit='K', total=total_dwnld_size):
-                    f.write(data)
-                click.echo('\n  File has been downloaded successfully '
-                           'to the following location\n'
-                           '    -> {}'.format(os.path.join(
-                               os.path.abspath(os.path.curdir), local_fname)))
-            break
+    global template_env
+    with template_env_lock:
+        if template_env is None:
+            from jinja2 import (Environment, FileSystemBytecodeCache,
+                                PackageLoader)
+
+            bytecode_cache = None
+            if template_cache_dir:
+                os.makedirs(template_cache_dir, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(template_cache_dir)
+            # templates are shipped with the package, there is no need
+            # to check them for changes on every render
+            template_env = Environment(
+                loader=PackageLoader('nokdoc', 'template'),
+                trim_blocks=True,
+                lstrip_blocks=True,
+                auto_reload=False,
+                bytecode_cache=bytecode_cache)
+    return template_env.get_template(name)
+
+
+def page_fname(path, page):
+    """
+    Name of a page of the docs set rendered into `path`
+    """
+    root, ext = os.path.splitext(path)
+    return '{}-{}{}'.format(root, page, ext)
 
 
-def get_coll_size(s, fname, username):
+def remove_pages(path, first_page=1):
     """
-    Determines a size of downloadable collection.
-    Needed for progress bar.
+    Removes the pages of the docs set rendered into `path` starting from
+    `first_page`, they are left by a previous render of more docs
     """
-    chk_size_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/chk_col_done.pl'
-    params = {'remote_user': username,
-              'col_name': fname}
-    resp = s.get(chk_size_url, params=params).json()
-    fsize = resp['filesize']
-    # fsize is smth like (56,950,085 bytes)
-    # stripping everything except digits
-    fsize_parsed = re.sub('[^\d]', '', fsize)
-    return fsize_parsed
+    page = first_page
+    while os.path.isfile(page_fname(path, page)):
+        os.remove(page_fname(path, page))
+        page += 1
 
 
-def is_empty_list(in_list):
+def iter_pages(docs, page_size):
     """
-    https://stackoverflow.com/questions/1593564/python-how-to-check-if-a-nested-list-is-essentially-empty
-    Recursively iterate through values in nested lists and return boolean
-    reflecting if the list and its nested elements are empty.
+    Splits an iterable of docs into lists of `page_size` docs.
+    Yields tuples (docs of a page, True if it is the last page)
     """
-    for item in in_list:
-        if not isinstance(item, list) or not is_empty_list(item):
-            return False
-    return True
+    docs = iter(docs)
+    page = list(itertools.islice(docs, page_size))
+    while page:
+        next_page = list(itertools.islice(docs, page_size))
+        yield page, not next_page
+        page = next_page
 
 
-def get_json_resp(responce):
-    '''
-    Sometimes documentation server returns junk data before
-    json responce. This will raise decode exception.
-    Strip this data if any
-    for example this one gives trouble if using .json() instead
-    nokdoc -l rdodin getlinks -p nuage-vns -r 4.0.r6
-    '''
-    try:
-        logging.debug(pformat(responce.text))
-        json_resp = responce.json()
-        return json_resp
-    except json.decoder.JSONDecodeError:
-        json_str = re.search(r'{.*}', responce.text, flags=re.DOTALL).group()
-        json_str = json_str.replace('\n', '').replace('\r', '')
-        json_resp = json.loads(json_str)
-    return json_resp
+def create_doc_html(docs, product, release, path=None, quiet=False,
+                    page_size=None):
+    """
+    Renders HTML file with the docs.
+    The file is created by the `path` if given, otherwise it goes to the
+    current dir under the name glued by docs_fname()
+
+    `docs` might be any iterable, rendered HTML is streamed straight into
+    the file as the docs are consumed.
+    With `page_size` the docs are split into pages rendered next to the
+    file, the file itself becomes an index of the pages.
+    returns: number of docs rendered
+    """
+    if not quiet:
+        click.echo('\n  Building HTML with the docs you requested...')
 
+    if path is None:
+        path = docs_fname(product, release)
 
-def validate_product(ctx, param, value):
-    # global get_doc_url
-    if 'nuage' in value:
-        # # nuage API endpoint for fetching links differs from others
-        # get_doc_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/au_get_doc_list.pl'
+    gen_date = date.today().strftime("%Y/%m/%d")
+    if page_size:
+        docs_num = write_doc_pages(docs, product, release, path, page_size,
+                                   gen_date)
+    else:
+        docs_num = 0
+
+        def count_docs(docs):
+            nonlocal docs_num
+            for doc in docs:
+                docs_num += 1
+                yield doc
+
+        template = get_template('nokdoc_docset.html')
+        with open(path, 'w') as f:
+            f.writelines(template.generate(
+                docs_list=count_docs(docs), start=0, product=product,
+                release=release, gen_date=gen_date))
+        remove_pages(path)
+    if os.path.isfile(index_fname(path)):
+        # left by the lightweight page rendered into the same file
+        os.remove(index_fname(path))
+    if not quiet:
+        click.echo('  Done! File created:\n   ->{}'
+                   .format(os.path.abspath(path)))
+    return docs_num
+
+
+def write_doc_pages(docs, product, release, path, page_size, gen_date):
+    """
+    Renders the docs into pages of `page_size` docs named by page_fname()
+    and their index into `path`. Pages left by a previous render of a
+    bigger docs set are removed.
+    returns: number of docs rendered
+    """
+    template = get_template('nokdoc_docset.html')
+    pages = []
+    docs_num = 0
+    for page, (page_docs, last) in enumerate(iter_pages(docs, page_size), 1):
+        page_path = page_fname(path, page)
+        pager = {'page': page,
+                 'index': os.path.basename(path),
+                 'prev': page > 1 and os.path.basename(
+                     page_fname(path, page - 1)),
+                 'next': not last and os.path.basename(
+                     page_fname(path, page + 1))}
+        with open(page_path, 'w') as f:
+            f.writelines(template.generate(
+                docs_list=page_docs, start=docs_num, pager=pager,
+                product=product, release=release, gen_date=gen_date))
+        pages.append({'href': os.path.basename(page_path),
+                      'first': docs_num + 1,
+                      'last': docs_num + len(page_docs),
+                      'first_title': page_docs[0].title,
+                      'last_title': page_docs[-1].title})
+        docs_num += len(page_docs)
+
+    remove_pages(path, len(pages) + 1)
+
+    with open(path, 'w') as f:
+        f.writelines(get_template('nokdoc_docset_index.html').generate(
+            pages=pages, docs_num=docs_num, product=product,
+            release=release, gen_date=gen_date))
+    return docs_num
+
+
+def index_fname(path):
+    """
+    Name of the docs index loaded by the lightweight page in `path`
+    """
+    return os.path.splitext(path)[0] + '.index.js'
 
-        # quit if no login was passed for Nuage docs
-        if not ctx.obj['LOGGED_IN']:
-            click.echo('  Nuage Networks documentation can be accessed by authorized users only!\n'
-                       '  Pass your login as "-l your_login" if you have one.\n'
-                       '  Aborting...')
-            os.sys.exit()
-    return value
 
+def doc_tokens(doc):
+    """
+    Lowercased search tokens of a doc matched by the lightweight page
+    filter: title words, doc ID, issue date and link types
+    """
+    tokens = re.findall(r'\w+', doc.title.lower())
+    tokens.append(doc.doc_id.lower())
+    tokens.append(doc.issue_date)
+    tokens.extend(l_type.lower() for _, l_type in doc.links)
+    return ' '.join(token for token in dict.fromkeys(tokens) if token)
 
-@click.group()
-@click.pass_context
-# @click.command()
-@click.option('-l', '--login', help='Put in your login to get access to the'
-              'documentation requiring authorization')
-@click.option('-p', '--proxy', default='')
-def cli(ctx, proxy, login):
+
+def write_docs_index(docs, f, product, release):
     """
-    NokDoc CLI Tool is exposing a set of commands to interact with
-    Nokia documentation portal.
-    It offers CLI experience for tasks like
-    - getting links to the docs aggregated into HTML file
-    - downloading docs collections automatically
+    Streams the docs into a compact JSON index assigned to the
+    `nokdocIndex` global, so that a page opened from the file system can
+    load it with a <script> tag. Docs are stored as arrays ordered like
+    the `fields` of the index.
+    returns: number of docs written
+    """
+    f.write('window.nokdocIndex = {')
+    f.write('"product": {}, "release": {}, "fields": {}, "docs": ['.format(
+        json.dumps(product), json.dumps(release), json.dumps(
+            ['doc_id', 'title', 'issue', 'issue_date', 'restricted',
+             'links', 'tokens'])))
+    docs_num = 0
+    for doc in docs:
+        if docs_num:
+            f.write(',')
+        f.write('\n' + json.dumps(
+            [doc.doc_id, doc.title, doc.issue, doc.issue_date,
+             int(doc.restricted), [[l_type, url] for url, l_type in doc.links],
+             doc_tokens(doc)], separators=(',', ':')))
+        docs_num += 1
+    f.write('\n]};\n')
+    return docs_num
+
+
+def create_doc_html_lite(docs, product, release, path=None, quiet=False):
+    """
+    Renders a lightweight HTML page with the docs.
+    Docs go into a compact index file next to the page, the page renders
+    only the rows scrolled into view and filters them client side, so it
+    stays responsive for docs sets of any size.
+    returns: number of docs rendered
+    """
+    if not quiet:
+        click.echo('\n  Building HTML with the docs you requested...')
+
+    if path is None:
+        path = docs_fname(product, release, 'html-lite')
+
+    with open(index_fname(path), 'w') as f:
+        docs_num = write_docs_index(docs, f, product, release)
+    with open(path, 'w') as f:
+        f.writelines(get_template('nokdoc_docset_lite.html').generate(
+            index_src=os.path.basename(index_fname(path)),
+            product=product, release=release,
+            gen_date=date.today().strftime("%Y/%m/%d")))
+    remove_pages(path)
+    if not quiet:
+        click.echo('  Done! Files created:\n   ->{}\n   ->{}'
+                   .format(os.path.abspath(path),
+                           os.path.abspath(index_fname(path))))
+    return docs_num
+
+
+def doc_record(doc, product, release):
+    """
+    Flattens DocEntry into a dict for the machine-readable exports
+    """
+    return {'product': product,
+            'release': release,
+            'doc_id': doc.doc_id,
+            'title': doc.title,
+            'issue': doc.issue,
+            'issue_date': doc.issue_date,
+            'restricted': doc.restricted,
+            'links': [{'url': url, 'type': l_type}
+                      for url, l_type in doc.links]}
+
+
+def write_docs_json(docs, f, product, release):
+    """
+    Streams the docs into a file as a JSON array of records.
+    returns: number of docs written
+    """
+    docs_num = 0
+    f.write('[')
+    for doc in docs:
+        if docs_num:
+            f.write(',')
+        f.write('\n' + json.dumps(doc_record(doc, product, release)))
+        docs_num += 1
+    f.write('\n]\n')
+    return docs_num
+
+
+def write_docs_ndjson(docs, f, product, release):
+    """
+    Streams the docs into a file as newline delimited JSON records.
+    Every record is written by a single write() call, so records of
+    several writers sharing a file do not get mixed.
+    returns: number of docs written
+    """
+    docs_num = 0
+    for doc in docs:
+        f.write(json.dumps(doc_record(doc, product, release)) + '\n')
+        docs_num += 1
+    return docs_num
 
-    It works for authorized users and guests.
+
+def write_docs_csv(docs, f, product, release):
+    """
+    Streams the docs into a file as CSV rows.
+    Links are grouped into a column per link type.
+    returns: number of docs written
     """
+    link_types = ['PDF', 'HTML', 'ZIP']
+    writer = csv.writer(f)
+    writer.writerow(['product', 'release', 'doc_id', 'title', 'issue',
+                     'issue_date', 'restricted'] +
+                    [l_type.lower() for l_type in link_types])
+    docs_num = 0
+    for doc in docs:
+        writer.writerow([product, release, doc.doc_id, doc.title, doc.issue,
+                         doc.issue_date, doc.restricted] +
+                        [' '.join(url for url, t in doc.links if t == l_type)
+                         for l_type in link_types])
+        docs_num += 1
+    return docs_num
 
-    ctx.obj = {'LOGGED_IN': False}
-    # defining a proxy
-    if proxy:
-        proxies['https'] = proxy
-    # creating requests session object
-    s = requests.session()
-    s.proxies.update(proxies)
-    s.verify = certifi.where()
-    # buiding a context object to pass session object
 
-    # log in and get cookies to get "protected" docs
-    if login:
-        click.echo('\n  ####### LOGIN #######')
-        pwd = click.prompt(
-            '  Please enter your password for a "{}" user'.format(login), hide_input=True)
-        s = user_auth(s, login, pwd)
-        ctx.obj['LOGGED_IN'] = True
-        ctx.obj['USERNAME'] = login
+# writers of the machine-readable output formats
+exporters = {'json': write_docs_json,
+             'ndjson': write_docs_ndjson,
+             'csv': write_docs_csv}
 
-    ctx.obj['SESSION'] = s
+output_formats = ['html', 'html-lite'] + sorted(exporters.keys())
 
+# file extensions of the output formats not named after them
+output_extensions = {'html-lite': 'html'}
 
-@cli.command()
-@click.pass_context
-# https://github.com/pallets/click/issues/514 required=True
-@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
-              required=True, callback=validate_product)
-@click.option('-r', '--release',
-              default='',
-              help='Release version, use "showrels" command to list them')
-@click.option('-f', '--format', help='Specify documentation format to fetch.'
-              'If unspecified -> all types will be collected.',
-              type=click.Choice(['pdf', 'html', 'zip']))
-@click.option('-s', '--sort', default='title',
-              type=click.Choice(['title', 'issue_date']),
-              help='Choose sorting key. Defaults to "title"')
-def getlinks(ctx, product, release, format, sort):
-    '''
-    Gets a single HTML file with links to the documetation elements for a given
-    product.
-    '''
-    click.echo('\n  ####### GET LINKS #######')
 
-    # import logging
+class LockedFile(object):
+    """
+    File wrapper serializing writes of several threads sharing a file
+    """
 
-    # logging.basicConfig(level=logging.DEBUG)
+    def __init__(self, f):
+        self._f = f
+        self._lock = threading.Lock()
+        self.name = f.name
 
-    global doc_id
-    global get_doc_url
+    def write(self, data):
+        with self._lock:
+            self._f.write(data)
 
-    # mapping of cli options for sotring and values for API calls
-    sort_opts = {'title': 'Title, A-Z',
-                 'issue_date': 'Issue Date'}
+    def close(self):
+        self._f.close()
 
-    # used to map cli short_format notation to long_format which is passed to
-    # request
-    long_format = ''
-    # if format option is specified, rewrite acting format value
-    if format:
-        long_format = formats[format]
 
-    # if `all` is passed as a release filter or release was not specified,
-    # fetch all releases and sort them by issue date
-    if release.upper() in ('ALL', ''):
-        sort = 'issue_date'
-        release = ""
+def export_docs(docs, product, release, path=None, output_format='html',
+                quiet=False, f=None, page_size=None):
+    """
+    Writes the docs in a given output format.
+    The file is created by the `path` if given, otherwise it goes to the
+    current dir under the name glued by docs_fname().
+    Machine-readable formats might be written into an already opened
+    file `f` instead. HTML might be split into pages of `page_size` docs.
+    returns: number of docs written
+    """
+    with profiling.phase('write {}'.format(output_format)):
+        if output_format == 'html':
+            return create_doc_html(docs, product, release, path=path,
+                                   quiet=quiet, page_size=page_size)
+        if output_format == 'html-lite':
+            return create_doc_html_lite(docs, product, release, path=path,
+                                        quiet=quiet)
+
+        if f is not None:
+            return exporters[output_format](docs, f, product, release)
+
+        if path is None:
+            path = docs_fname(product, release, output_format)
+        with open(path, 'w', newline='') as f:
+            docs_num = exporters[output_format](docs, f, product, release)
+    if not quiet:
+        click.echo('\n  Done! File created:\n   ->{}'
+                   .format(os.path.abspath(path)))
+    return docs_num
+
+
+# Differences between two snapshots of a docs set.
+# `added`, `removed` and `reissued` are lists of snapshot doc dicts,
+# `changed` tells if the docs set differs at all
+DocsDiff = namedtuple('DocsDiff', ['added', 'removed', 'reissued', 'changed'])
+
+
+def snapshot_path(path):
+    """
+    Snapshot of the docs rendered into `path` lives in the hidden .nokdoc
+    dir next to it
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), '.nokdoc',
+                        os.path.basename(path) + '.json')
 
-    # for nuage family 'get_doc_url' URL differs from 7750
-        # get_doc_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/au_get_doc_list.pl'
 
-    click.echo('  Querying the documentation server '
-               'for {} release {}...'.format(product, release))
+def load_snapshot(path):
+    """
+    Loads the snapshot of the docs rendered into `path`.
+    returns: snapshot dict or None if there is no snapshot yet
+    """
+    try:
+        with open(snapshot_path(path)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
 
-    # list with requests responces
-    responces = []
 
-    # list with responces for permissions data
-    perm_responces = []
+def make_snapshot(docs, product, release, output_format='html',
+                  page_size=None):
+    """
+    Builds a snapshot dict out of the DocEntry tuples.
+    Content hash covers every doc property, the order of docs and the
+    output the docs are rendered into: the format (html and html-lite
+    share the file name), the page size and the templates
+    """
+    snapshot_docs = [doc._asdict() for doc in docs]
+    for doc in snapshot_docs:
+        doc['links'] = [list(link) for link in doc['links']]
+    content = json.dumps({'output_format': output_format,
+                          'page_size': page_size,
+                          'templates': template_digest()
+                          if output_format in ('html', 'html-lite') else None,
+                          'docs': snapshot_docs}, sort_keys=True)
+    return {'product': product,
+            'release': release,
+            'output_format': output_format,
+            'hash': hashlib.sha256(content.encode('utf8')).hexdigest(),
+            'docs': snapshot_docs}
+
+
+def diff_snapshots(old, new):
+    """
+    Computes the docs diff between two snapshots keyed by doc_id.
+    A doc is considered reissued if its issue or issue date changed
+    """
+    old_docs = {doc['doc_id']: doc for doc in (old or {}).get('docs', [])}
+    new_docs = {doc['doc_id']: doc for doc in new['docs']}
+    added = [doc for doc_id, doc in new_docs.items()
+             if doc_id not in old_docs]
+    removed = [doc for doc_id, doc in old_docs.items()
+               if doc_id not in new_docs]
+    reissued = [doc for doc_id, doc in new_docs.items()
+                if doc_id in old_docs and
+                (doc['issue'], doc['issue_date']) !=
+                (old_docs[doc_id]['issue'], old_docs[doc_id]['issue_date'])]
+    changed = old is None or old.get('hash') != new['hash']
+    return DocsDiff(added, removed, reissued, changed)
+
+
+def update_docs_file(docs, product, release, path=None, output_format='html',
+                     quiet=False, page_size=None):
+    """
+    Incremental version of export_docs().
+    The docs are compared against the snapshot of the previous run, the file
+    is rewritten only if the docs set has changed or the file is missing.
+    returns: tuple (number of docs, DocsDiff)
+    """
+    if path is None:
+        path = docs_fname(product, release, output_format)
 
-    params = {'entry_id': doc_id[product],
-              'release': release,
-              'format': long_format,
-              #   'how': 'all_prod',
-              'sortby': sort_opts[sort]
-              }
+    docs = list(docs)
+    with profiling.phase('snapshot diff'):
+        snapshot = make_snapshot(docs, product, release, output_format,
+                                 page_size)
+        diff = diff_snapshots(load_snapshot(path), snapshot)
 
-    # if we are dealing with composed doc section (like 'nuage')
-    # go through every enclosed doc_id and populate a list with responces
-    if type(doc_id[product]) is list:
-        for entry_id in doc_id[product]:
-            # redefine entry_id
-            params.update({'entry_id': entry_id})
-            # pprint(params)
-
-            for i in range(5):
-                try:
-                    # getting doc data just to tell later if
-                    # the docID is open or restricted
-                    resp1 = ctx.obj['SESSION'].get(
-                        get_doc_permissions_url, params=params)
-                    resp1.raise_for_status()
-                    perm_responces.append(get_json_resp(resp1))
-
-                    # getting doc data with authorized URL to get actual links
-                    resp2 = ctx.obj['SESSION'].get(get_doc_url, params=params)
-                    resp2.raise_for_status()
-                    responces.append(get_json_resp(resp2))
-                    break
-                except requests.exceptions.HTTPError:
-                    time.sleep(1)
-                    continue
-    else:
-        for i in range(5):
-            try:
-                resp1 = ctx.obj['SESSION'].get(
-                    get_doc_permissions_url, params=params)
-                resp1.raise_for_status()
-                perm_responces.append(get_json_resp(resp1))
-
-                resp2 = ctx.obj['SESSION'].get(get_doc_url, params=params)
-                resp2.raise_for_status()
-                responces.append(get_json_resp(resp2))
-                break
-            except requests.exceptions.HTTPError:
-                time.sleep(1)
-                continue
+    if not diff.changed and os.path.isfile(path):
+        if not quiet:
+            click.echo('\n  Docs have not changed since the last run, '
+                       'file is up to date:\n   ->{}'
+                       .format(os.path.abspath(path)))
+        return len(docs), diff
 
-    # if no results were found format section will be empty
-    if is_empty_list([i['proddata']['format']
-                      for i in responces]):
-        click.echo(
-            '  No documents were found with the specified criteria. Exiting...')
-        os.sys.exit()
+    export_docs(docs, product, release, path=path,
+                output_format=output_format, quiet=quiet,
+                page_size=page_size)
 
-    # num_docs_found_patt = re.compile(r"'>(\d+.+)</td")
-    # num_docs_found = num_docs_found_patt.search(r['proddata']['doc_summary']).group(1)
-    # click.echo('    ' + num_docs_found)
+    os.makedirs(os.path.dirname(snapshot_path(path)), exist_ok=True)
+    with open(snapshot_path(path), 'w') as f:
+        json.dump(snapshot, f)
+    return len(docs), diff
 
-    docdata = ''
-    for i in responces:
-        docdata += i['proddata']['docdata']
 
-    temp_data = ''
-    for p in perm_responces:
-        temp_data += p['proddata']['docdata']
+def echo_docs_diff(diff):
+    """
+    Prints a compact report of added/removed/reissued docs
+    """
+    click.echo('  Changes since the last run: {} added, {} removed, '
+               '{} reissued'.format(len(diff.added), len(diff.removed),
+                                    len(diff.reissued)))
+    for sign, docs in (('+', diff.added), ('-', diff.removed),
+                       ('~', diff.reissued)):
+        for doc in docs:
+            click.echo('    {} {} {} (issue {} / {})'.format(
+                sign, doc['doc_id'], doc['title'], doc['issue'],
+                doc['issue_date']))
+
+
+def get_json(s, url, params, cache=None):
+    '''
+    GETs a given URL and returns its decoded json body.
+    Retries up to 5 times on HTTP errors, returns None if all attempts failed
 
-    click.echo('\n  Checking documentation access rights...')
+    If `cache` is given, a fresh cached response is returned without
+    querying the server, received responses are stored in the cache.
+    '''
+    import requests
 
-    # invoke parseDocdata with check_permissions
-    # to populate the global dict that holds is_restricted property
-    # for each document ID
-    parseDocdata(temp_data, check_permissions=True)
+    if cache is not None:
+        json_resp = cache.get(url, params)
+        if json_resp is not None:
+            return json_resp
 
-    ctx.obj['PRODUCT'] = product
-    docs_list = parseDocdata(docdata)
-    # pprint(docs_list)
-    # os.sys.exit()
+    for i in range(5):
+        try:
+            with profiling.phase(request_phases.get(url, 'request')):
+                r = s.get(url, params=params)
+                r.raise_for_status()
+            with profiling.phase('json decode'):
+                json_resp = get_json_resp(r)
+            if cache is not None:
+                cache.set(url, params, json_resp)
+            return json_resp
+        except requests.exceptions.HTTPError:
+            profiling.count('http retries')
+            time.sleep(1)
+            continue
 
-    # if doc_list is empty --> abort
-    if not docs_list:
-        click.echo('  Either all of the docs are for authorized users only\n'
-                   '  or your search request returned no valid results.\n'
-                   '  Execution aborted.')
-        os.sys.exit(1)
 
-    create_doc_html(docs_list, product, release)
+def get_doc_lists(s, entry_ids, params, concurrency=4, cache=None):
+    '''
+    Queries the documentation server for the docs lists of every entry_id.
+    For each entry_id two independent lists are fetched:
+    - permissions list (get_doc_permissions_url) to tell later
+      if the docID is open or restricted
+    - authorized list (get_doc_url) to get actual links
+    All the requests are issued concurrently over the session pool.
+
+    returns: tuple of lists (responces, perm_responces) ordered as entry_ids
+    '''
+    jobs = []
+    for entry_id in entry_ids:
+        entry_params = dict(params, entry_id=entry_id)
+        jobs.append((get_doc_permissions_url, entry_params))
+        jobs.append((get_doc_url, entry_params))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda job: get_json(s, *job, cache=cache), jobs))
+
+    # when all attempts to get a list failed the entry_id is skipped
+    # completely to stay consistent with both lists
+    responces = []
+    perm_responces = []
+    for perm_resp, resp in zip(results[::2], results[1::2]):
+        if perm_resp is None or resp is None:
+            continue
+        perm_responces.append(perm_resp)
+        responces.append(resp)
+    return responces, perm_responces
 
-# root = html.fromstring(r.json()['proddata']['docdata'])
-# tmpList = root.xpath('//td//text()|//a/@href')
-# # slicing list of xpathed data to "list per document"
-# # 6 is the number of elements per doc entry
-# # refer to docdata html chunck, i.e.https://infoproducts.alcatel-lucent.com/cgi-bin/get_doc_list.pl?entry_id=1-0000000002238&srch_how=Title&srch_str=&release=14.0
-# # beautify it with http://www.cleancss.com/html-beautify/ and count <td> elements in each <tr>
-# # https://stackoverflow.com/questions/312443/how-do-you-split-a-list-into-evenly-sized-chunks
-# docList = [tmp[i:i + 6] for i in range(0, len(tmp), 6)]
 
+def get_rels(s, product_id, cache=None):
+    '''
+    returns a list of available releases for a given product
 
-@cli.command()
-@click.pass_context
-@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
-              required=True)
-def showrels(ctx, product):
+    Release lists are memoized per process in `releases_memo` and
+    stored in the responses `cache` if one is given
+    '''
+    with releases_locks_lock:
+        lock = releases_locks.setdefault(product_id, threading.Lock())
+    with lock:
+        if product_id not in releases_memo:
+            params = {'entry_id': product_id}
+            resp = get_json(s, get_doc_permissions_url, params, cache=cache)
+            if resp is None:
+                raise NokdocError('Failed to get the list of releases '
+                                  'for entry {}'.format(product_id))
+            releases_memo[product_id] = resp['proddata']['release']
+    return releases_memo[product_id]
+
+
+def get_all_rels(s, product_ids, concurrency=4, cache=None):
     """
-    Lists all available releases for a given product
+    Fetches release lists for every given product_id concurrently.
+    returns: dict {product_id: list of releases}
     """
+    product_ids = sorted(set(product_ids))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        rels = executor.map(lambda product_id: get_rels(s, product_id, cache),
+                            product_ids)
+        return dict(zip(product_ids, rels))
 
-    click.echo('\n  ####### SHOW RELEASES #######')
 
-    click.echo('  Checking available releases...')
+def get_common_rels(s, product_ids, concurrency=4, cache=None):
+    """
+    When working with combined product (like 'nuage' which consits of nuage-vsp
+    and nuage-vns products) it is necessary to define which releases are common
+    for every component.
+    """
+    all_rels = get_all_rels(s, product_ids, concurrency=concurrency,
+                            cache=cache)
+    common_rels = set.intersection(*(set(rels) for rels in all_rels.values()))
+    return sorted(common_rels)
+
 
+def get_product_rels(s, product, concurrency=4, cache=None):
+    """
+    returns a list of available releases for a given product name,
+    for combined products only the common releases are returned
+    """
     if type(doc_id[product]) is list:
-        rels = get_common_rels(ctx.obj['SESSION'], doc_id[product])
-    else:
-        rels = get_rels(ctx.obj['SESSION'], doc_id[product])
-    click.echo('  Available releases for {} family: '.format(product) +
-               ', '.join(natsorted(rels, alg=ns.IGNORECASE)))
+        return get_common_rels(s, doc_id[product], concurrency=concurrency,
+                               cache=cache)
+    return get_rels(s, doc_id[product], cache=cache)
 
 
-@cli.command()
-@click.pass_context
-@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
-              required=True, callback=validate_product)
-@click.option('-r', '--release',
-              default='',
-              help='Release version, use "showrels" command to list them')
-@click.option('-f', '--format', help='Specify documentation format to fetch.'
-              'If unspecified -> all types will be collected.',
-              type=click.Choice(['pdf', 'html', 'zip']))
-def getdocs(ctx, product, release, format):
-    '''
-    Downloads documentation collection for a given product family.
-    Optionally specify release version to fetch
-    Optionally specify format of the docs to fetch
+def download_doc(s, dwnld_doc_url, local_fname, size=None, connections=1,
+                 position=None, limiter=None):
+    """
+    Downloads a collection zip file and stores it by the `local_fname` path.
+    Interrupted downloads are resumed from the .part file left by them,
+    the archive might be fetched in several parallel ranges.
+    `position` is the line of the progress bar when several collections
+    are downloaded at once, `limiter` caps the bandwidth.
+    returns: SHA256 checksum of the archive
+
+    raises NokdocError if download fails
+    """
+    import requests
+    import tqdm
 
-    Currently supported products: nuage, nuage-vsp, nuage-vns
-    '''
+    with tqdm.tqdm(unit='B', unit_scale=True, total=size, position=position,
+                   desc=os.path.basename(local_fname)) as pbar, \
+            profiling.phase('download collection'):
+        try:
+            checksum = download.fetch(s, dwnld_doc_url, local_fname,
+                                      size=size, connections=connections,
+                                      progress=pbar.update, limiter=limiter)
+        except (download.DownloadError,
+                requests.exceptions.RequestException) as e:
+            raise NokdocError('Download of {} failed: {}\n'
+                              '  Run the same command again to resume '
+                              'the download'.format(local_fname, e))
+    download.write_checksum(local_fname, checksum)
+    return checksum
 
-    click.echo('\n  ####### DOWNLOAD DOCS #######')
-    global doc_id
 
-    dwnld_doc_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/create_col.pl'
+def get_coll_size(s, fname, username):
+    """
+    Determines a size of downloadable collection by querying
+    lightweight chk_col_done.pl status endpoint.
+    returns: size in bytes or None if the collection is not ready yet
+    raises ResponseDecodeError if the response is not a json, the captured
+    responses are not dumped since polling goes on
+    """
+    chk_size_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/chk_col_done.pl'
+    params = {'remote_user': username,
+              'col_name': fname}
+    resp = get_json_resp(s.get(chk_size_url, params=params), dump=False)
+    fsize = resp.get('filesize') or ''
+    # fsize is smth like (56,950,085 bytes)
+    # stripping everything except digits
+    fsize_parsed = re.sub(r'[^\d]', '', fsize)
+    if not fsize_parsed or not int(fsize_parsed):
+        return None
+    return int(fsize_parsed)
+
+
+def wait_for_collection(s, remote_fname, username, timeout=900):
+    """
+    Polls the documentation server until a collection is prepared.
+    Delay between the attempts grows exponentially with a random jitter
+    to not hammer the server when many collections are being prepared.
+    returns: size of the collection in bytes
+
+    raises NokdocError if the collection is not ready within `timeout` seconds
+    """
+    import random
+
+    import requests
+
+    delay = 2
+    deadline = time.time() + timeout
+    while True:
+        decode_error = None
+        try:
+            with profiling.phase('collection status request'):
+                size = get_coll_size(s, remote_fname, username)
+        except ResponseDecodeError as e:
+            decode_error = e
+            size = None
+        except (ValueError, AttributeError,
+                requests.exceptions.RequestException):
+            size = None
+        if size:
+            return size
+        if time.time() > deadline:
+            message = ('Collection {} has not been prepared within '
+                       '{} seconds'.format(remote_fname, timeout))
+            if decode_error is not None:
+                message += ('\n  The last {} responses were saved to '
+                            '{}'.format(len(responses_capture),
+                                        os.path.abspath(
+                                            responses_capture.dump())))
+            raise NokdocError(message)
+        with profiling.phase('wait for collection'):
+            time.sleep(delay * random.uniform(0.5, 1.5))
+        delay = min(delay * 2, 60)
+
+
+def create_collection(s, product, release, format):
+    """
+    Requests the documentation server to prepare a collection.
+    returns: tuple (download URL, remote collection name)
+
+    raises NokdocError if the server has not provided a download link
+    """
+    create_col_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/create_col.pl'
 
     # used to map cli short_format notation to long_format which is passed to
     # request
@@ -623,12 +1036,8 @@ def getdocs(ctx, product, release, format):
             'format': long_format,
             'create_col_flg': '1'}
 
-    r = ctx.obj['SESSION'].post(dwnld_doc_url, data=data)
-
-    # with open('test.html', 'w') as f:
-    #     print(r.text, file=f)
-
-    doc_dwnld_url = ''
+    with profiling.phase('create collection request'):
+        r = s.post(create_col_url, data=data)
 
     # slicing last 100 lines where download link should be
     for line in r.text.splitlines()[-100:]:
@@ -639,12 +1048,16 @@ def getdocs(ctx, product, release, format):
             # get file name without .zip extension to query for coll. dwnld
             # size
             remote_fname = doc_dwnld_url.rsplit('=')[1][:-4]
+            return doc_dwnld_url, remote_fname
+    raise NokdocError('Documentation server has not provided a download '
+                      'link for {} {} {}'.format(product, release,
+                                                 format or 'all formats'))
 
-            click.echo('  Collection will be available for download '
-                       'by this URL for the next 48hrs \n   -> {}\n'.format(doc_dwnld_url))
-            break
 
-    # gluing filename
+def collection_fname(product, release, format):
+    """
+    Glues the name of the collection zip file
+    """
     local_fname = 'nokdoc__{}'.format(product.upper())
     if release:
         local_fname += '__{}'.format(release.upper().replace(' ', '_'))
@@ -653,155 +1066,2056 @@ def getdocs(ctx, product, release, format):
     else:
         local_fname += '__ALL'
     local_fname += '__{}.zip'.format(date.today().strftime("%Y_%m_%d"))
+    return local_fname
+
 
-    download_doc(ctx.obj['SESSION'], doc_dwnld_url, remote_fname, ctx.obj['USERNAME'],
-                 local_fname)
+def find_local_collection(out_dir, product, release, format, size):
+    """
+    Looks for an already downloaded archive of a collection of a given size.
+    If a checksum of the archive was stored, the archive must match it too.
+    returns: path to the archive or None
+    """
+    # archive names differ by the download date only
+    prefix = collection_fname(product, release, format).rsplit('__', 1)[0]
+    for fname in sorted(os.listdir(out_dir), reverse=True):
+        if not (fname.startswith(prefix + '__') and fname.endswith('.zip')):
+            continue
+        path = os.path.join(out_dir, fname)
+        if os.path.getsize(path) != size:
+            continue
+        checksum = download.read_checksum(path)
+        if checksum and download.hash_file(path).hexdigest() != checksum:
+            continue
+        return path
+    return None
 
 
-@cli.command()
-@click.pass_context
-@click.argument('finput')
-def batchgetlinks(ctx, finput):
+def submit_collections(s, collections):
+    """
+    Requests the documentation server to prepare every given
+    (product, release, format) collection, so the server prepares them
+    simultaneously.
+    returns: tuple (list of (product, release, format, download URL,
+             remote collection name) tuples, list of failed collections)
+    """
+    requested = []
+    failed = []
+    for collection in collections:
+        try:
+            dwnld_doc_url, remote_fname = create_collection(s, *collection)
+        except NokdocError as e:
+            click.echo('  !! {}'.format(e))
+            failed.append(collection)
+            continue
+        requested.append(collection + (dwnld_doc_url, remote_fname))
+        click.echo('  Collection will be available for download '
+                   'by this URL for the next 48hrs \n   -> {}\n'.format(dwnld_doc_url))
+    return requested, failed
+
+
+def get_collection(s, requested, username, out_dir='.', connections=1,
+                   timeout=900, limiter=None, position=None,
+                   skip_existing=False):
+    """
+    Waits for a requested collection and downloads it into `out_dir`.
+    With `skip_existing` the download is skipped if a matching archive is
+    already present.
+    `requested` is a tuple as returned by submit_collections()
+    returns: dict with the collection stats
+    """
+    product, release, format, dwnld_doc_url, remote_fname = requested
+    stats = {'product': product,
+             'release': release,
+             'format': format or 'all',
+             'status': 'downloaded'}
+
+    started = time.time()
+    size = wait_for_collection(s, remote_fname, username, timeout=timeout)
+    stats['size'] = size
+    stats['wait_time'] = time.time() - started
+
+    local_fname = None
+    if skip_existing:
+        local_fname = find_local_collection(out_dir, product, release,
+                                            format, size)
+    started = time.time()
+    if local_fname:
+        stats['status'] = 'skipped'
+        stats['checksum'] = download.read_checksum(local_fname)
+    else:
+        local_fname = os.path.join(out_dir,
+                                   collection_fname(product, release, format))
+        stats['checksum'] = download_doc(s, dwnld_doc_url, local_fname,
+                                         size=size, connections=connections,
+                                         position=position, limiter=limiter)
+    stats['path'] = local_fname
+    stats['download_time'] = time.time() - started
+    stats['throughput'] = 0
+    if stats['status'] == 'downloaded' and stats['download_time']:
+        stats['throughput'] = size / stats['download_time']
+    return stats
+
+
+def size_session_pool(s, size):
+    """
+    Mounts the adapters with the connection pool of a given size
+    to let concurrent requests reuse connections
+    """
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=size,
+                          pool_maxsize=size)
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+
+
+def is_empty_list(in_list):
+    """
+    https://stackoverflow.com/questions/1593564/python-how-to-check-if-a-nested-list-is-essentially-empty
+    Recursively iterate through values in nested lists and return boolean
+    reflecting if the list and its nested elements are empty.
+    """
+    for item in in_list:
+        if not isinstance(item, list) or not is_empty_list(item):
+            return False
+    return True
+
+
+def get_json_resp(responce, dump=True):
     '''
-    Invokes getlinks command for a list of products/releases defined in
-    a YAML file passed as argument
+    Sometimes documentation server returns junk data before
+    json responce. This will raise decode exception.
+    Strip this data if any
+    for example this one gives trouble if using .json() instead
+    nokdoc -l rdodin getlinks -p nuage-vns -r 4.0.r6
+
+    Responses are captured into `responses_capture`, which is dumped
+    into a file if a response can not be decoded, unless `dump` is off
+    for the callers expecting such responses.
+    raises ResponseDecodeError if the response is not a json at all
     '''
-    click.echo('\n  ####### BATCH GET LINKS #######')
+    responses_capture.add(responce)
+    logging.debug('%s -> %s, %d bytes', responce.url, responce.status_code,
+                  len(responce.content or b''))
+    try:
+        json_resp = responce.json()
+        return json_resp
+    except json.decoder.JSONDecodeError:
+        pass
+    try:
+        json_str = re.search(r'{.*}', responce.text, flags=re.DOTALL).group()
+        json_str = json_str.replace('\n', '').replace('\r', '')
+        json_resp = json.loads(json_str)
+    except (AttributeError, ValueError):
+        if not dump:
+            raise ResponseDecodeError('Could not decode the response of '
+                                      '{}'.format(responce.url))
+        path = responses_capture.dump()
+        raise ResponseDecodeError(
+            'Could not decode the response of {}\n  The last {} responses '
+            'were saved to {}'.format(responce.url, len(responses_capture),
+                                      os.path.abspath(path)))
+    return json_resp
 
-    with click.open_file(finput, 'r') as f:
-        products = yaml.load(f)   # load getlinks product/rels file
 
-    # create a 'docs' dir which will hold enclosed dirs with docs per product
-    if not os.path.isdir('docs'):
-        os.mkdir('docs')
-    os.chdir('docs')
+class NokdocError(Exception):
+    """
+    Raised when a task can not be completed.
+    `exit_code` is the code CLI commands exit with upon this error
+    """
 
-    for product in products:
-        if not os.path.isdir(product):
-            os.mkdir(product)
-        os.chdir(product)
-        # pprint(os.getcwd())
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
 
-        for release in products[product]['releases']:
-            ctx.obj['PRODUCT'] = product
-            # pprint(product + " " + release)
-            if release is None:
-                release = ''
-            ctx.invoke(getlinks, product=product, release=release)
-        os.chdir('..')
+
+class ResponseDecodeError(NokdocError, ValueError):
+    """
+    Raised when a server response is not a valid json
+    """
 
 
-def filename_formatter(s):
-    valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
-    filename = ''.join(c for c in s if c in valid_chars)
-    filename = filename.replace(' ', '_')
-    return filename
+# mapping of cli options for sotring and values for API calls
+sort_opts = {'title': 'Title, A-Z',
+             'issue_date': 'Issue Date'}
 
 
-@cli.command()
-@click.pass_context
-@click.option('-p', '--path', default='.',
-              help='Path to the zip archive or to directory with unzipped Nuage docs folders')
-def htmlfix(ctx, path):
+def product_entry_ids(product):
+    """
+    returns: list of doc_id entries of a product, combined products
+    (like 'nuage') consist of several entries
+    """
+    if type(doc_id[product]) is list:
+        return doc_id[product]
+    return [doc_id[product]]
+
+
+def get_docdata(s, product, release='', format=None, sort='title',
+                concurrency=4, cache=None, strict=False):
     '''
-    Renames Nuage documentation directories from DOC-ID to TITLE
+    Queries the documentation server for the docs lists of a given
+    product/release.
+    returns: tuple of lists (docdata_chunks, perm_chunks) with the raw
+    docdata of every entry of the product whose lists were received
+
+    With `strict` NokdocError is raised if the lists of any entry
+    could not be received
     '''
+    # used to map cli short_format notation to long_format which is passed to
+    # request
+    long_format = ''
+    # if format option is specified, rewrite acting format value
+    if format:
+        long_format = formats[format]
 
-    import shutil
-    # import zlib
-
-    orig_cwd = os.path.abspath(os.path.curdir)
-    path_dir = os.path.abspath(os.path.dirname(path))
-
-    def fix_contents(dir_path):
-        """
-        Renaming docs dirs function
-        """
-        # regexp to match human readable doc name
-        re_html_title = re.compile(r'<title>(.+)&mdash')
-
-        # move to the temp dir
-        os.chdir(dir_path)
-
-        for doc_section_dir in os.listdir(os.curdir):
-            if os.path.isdir(doc_section_dir):
-                content = open(os.path.join(
-                    os.curdir, doc_section_dir, "index.html"), encoding="utf8").read()
-                try:
-                    new_dirname = filename_formatter(
-                        re_html_title.search(content).group(1).strip())
-                except AttributeError:
-                    break
-                os.renames(os.path.join(os.curdir, doc_section_dir),
-                           os.path.join(os.curdir, new_dirname))
-
-    def get_all_file_paths(directory):
-        """
-        Recursively walk the directory and get paths
-        to the files inside
-        """
-        # initializing empty file paths list
-        file_paths = []
-        click.echo(directory)
-        # crawling through directory and subdirectories
-        for root, _, files in os.walk(directory):
-            for filename in files:
-                filepath = os.path.join(root, filename)
-                file_paths.append(filepath)
-        # returning all file paths
-        return file_paths
+    params = {'entry_id': doc_id[product],
+              'release': release,
+              'format': long_format,
+              #   'how': 'all_prod',
+              'sortby': sort_opts[sort]
+              }
 
-    click.echo('\n  ####### HTML DOC FIX #######')
+    # if we are dealing with composed doc section (like 'nuage')
+    # every enclosed doc_id is queried along with the others
+    entry_ids = product_entry_ids(product)
+    responces, perm_responces = get_doc_lists(s, entry_ids, params,
+                                              concurrency=concurrency,
+                                              cache=cache)
+    if strict and len(responces) != len(entry_ids):
+        raise NokdocError('Failed to get the docs lists of {} '
+                          'release {}'.format(product, release or 'all'))
 
-    if zipfile.is_zipfile(path):
-        click.echo('\n  Processing a zip archive "{}"...'.format(path))
+    # if no results were found format section will be empty
+    if is_empty_list([i['proddata']['format']
+                      for i in responces]):
+        return [], []
 
-        os.chdir(path_dir)
+    # num_docs_found_patt = re.compile(r"'>(\d+.+)</td")
+    # num_docs_found = num_docs_found_patt.search(r['proddata']['doc_summary']).group(1)
+    # click.echo('    ' + num_docs_found)
 
-        # creating a temp dir to store unarchived data
-        tmp_dir_name = 'tmp_nokdoc_docs_{}'.format(id_generator())
-        os.mkdir(tmp_dir_name)
-        tmpdir_abspath = os.path.abspath(tmp_dir_name)
+    # only raw docdata chunks are kept, they are parsed lazily
+    return ([i['proddata']['docdata'] for i in responces],
+            [p['proddata']['docdata'] for p in perm_responces])
 
-        with zipfile.ZipFile(path, "r") as zf:
-            try:
-                zf.extractall(tmpdir_abspath)
-                click.echo('  Successfully unzipped documentation archive...')
-            except:
-                print('Could not unarchive the zip file')
 
-        # fix dir names
-        time.sleep(2)
-        fix_contents(tmpdir_abspath)
+def get_docs(s, product, release='', format=None, sort='title',
+             logged_in=False, concurrency=4, cache=None, quiet=False):
+    '''
+    Queries the documentation server for the docs of a given product/release
+    and returns an iterator over the parsed DocEntry tuples.
+    Docs are parsed lazily out of the responses as the iterator is consumed.
+    Every call keeps its own state so it is safe to run several of them
+    in parallel threads.
 
-        new_arch_fname = path
-        new_arch_abspath = os.path.join(path_dir, new_arch_fname)
+    raises NokdocError if no docs were found
+    '''
+    # if `all` is passed as a release filter or release was not specified,
+    # fetch all releases and sort them by issue date
+    if release.upper() in ('ALL', ''):
+        sort = 'issue_date'
+        release = ""
 
-        with zipfile.ZipFile(new_arch_abspath, "w", compression=zipfile.ZIP_DEFLATED) as zfw:
-            try:
-                click.echo('  Archiving renamed documents...')
-                [zfw.write(x) for x in get_all_file_paths(os.curdir)]
-            except:
-                click.echo('  Failed to archive the zip file')
+    if not quiet:
+        click.echo('  Querying the documentation server '
+                   'for {} release {}...'.format(product, release))
+
+    docdata_chunks, perm_chunks = get_docdata(s, product, release, format,
+                                              sort, concurrency, cache)
+    if not docdata_chunks:
+        raise NokdocError(
+            'No documents were found with the specified criteria.',
+            exit_code=0)
+
+    if not quiet:
+        click.echo('\n  Checking documentation access rights...')
+
+    # get the dict that holds is_restricted property for each document ID
+    restricted = []
+    with profiling.phase('parse permissions'):
+        permissions = parse_permissions(perm_chunks, logged_in=logged_in,
+                                        restricted=restricted)
+    if not quiet:
+        echo_restricted_docs(restricted)
+
+    # docs are parsed while being written, the parsing is profiled apart
+    docs = profiling.timed_iter('parse docs', iter_docs(
+        docdata_chunks, logged_in=logged_in, permissions=permissions))
+
+    # if there is no docs at all --> abort
+    first_doc = next(docs, None)
+    if first_doc is None:
+        raise NokdocError('Either all of the docs are for authorized users only\n'
+                          '  or your search request returned no valid results.')
+    return itertools.chain([first_doc], docs)
+
+
+def get_catalog_docs(catalog, product, release='', format=None, sort='title'):
+    """
+    Looks up the docs of a given product/release in the offline catalog
+    filled by the sync command.
+    returns: iterator over the DocEntry tuples
+    raises NokdocError if the catalog has no such docs
+    """
+    if release.upper() in ('ALL', ''):
+        sort = 'issue_date'
+        release = ''
+    docs = (DocEntry(*doc) for doc in catalog.docs(
+        product, release, link_type=format and format.upper(), sort=sort))
+    first_doc = next(docs, None)
+    if first_doc is None:
+        raise NokdocError('No docs of {} release {} in the offline catalog.\n'
+                          '  Run "nokdoc sync" to fill it.'.format(
+                              product, release or 'all'))
+    return itertools.chain([first_doc], docs)
+
+
+def docdata_digest(docdata_chunks, perm_chunks, logged_in=False):
+    """
+    returns: hexdigest of the raw docs lists of a release
+    """
+    raw = json.dumps([logged_in, docdata_chunks, perm_chunks])
+    return hashlib.sha256(raw.encode('utf8')).hexdigest()
 
-        # deleting temp directory and files
-        click.echo('  Removing temporary files...')
 
-        # return to the original working directory
-        # and delete the temp dir
-        os.chdir(path_dir)
-        try:
-            shutil.rmtree(tmpdir_abspath)
-        except PermissionError:
-            click.echo('  Unable to remove temp directory')
+def sync_release(s, product, release, logged_in=False, digest=None,
+                 cache=None):
+    """
+    Fetches the docs lists of a product release for the offline catalog.
+    Responses matching the `digest` of the previous sync are not parsed.
+    returns: tuple (digest, list of DocEntry or None if unchanged)
+    raises NokdocError if the lists could not be fetched
+    """
+    docdata_chunks, perm_chunks = get_docdata(
+        s, product, release, concurrency=2 * len(product_entry_ids(product)),
+        cache=cache, strict=True)
+    new_digest = docdata_digest(docdata_chunks, perm_chunks, logged_in)
+    if new_digest == digest:
+        return new_digest, None
+    with profiling.phase('parse docs'):
+        permissions = parse_permissions(perm_chunks, logged_in=logged_in)
+        return new_digest, list(iter_docs(docdata_chunks, logged_in=logged_in,
+                                          permissions=permissions))
 
-        click.echo('  Successfully created archive with renamed documents!'
-                   '\n    --> {}'.format(new_arch_abspath))
 
-    # option2: process directory with docs
-    if os.path.isdir(path):
-        click.echo(
-            '\n  Processing a directory "{}" with docs inside...'.format(path))
-        fix_contents(os.path.abspath(path))
-        click.echo('  Renamed doc dirs in the "{}" directory...'.format(
-            os.path.abspath(path)))
+def validate_product(ctx, param, value):
+    # global get_doc_url
+    # value is a tuple for options accepting multiple products
+    if isinstance(value, str):
+        products = [value]
+    else:
+        products = value
+    if any('nuage' in product for product in products):
+        # # nuage API endpoint for fetching links differs from others
+        # get_doc_url = 'https://infoproducts.alcatel-lucent.com/aces/cgi-bin/au_get_doc_list.pl'
+
+        # quit if no login was passed for Nuage docs,
+        # the offline catalog is available without a login
+        if not ctx.obj['LOGGED_IN'] and not ctx.params.get('offline'):
+            click.echo('  Nuage Networks documentation can be accessed by authorized users only!\n'
+                       '  Pass your login as "-l your_login" if you have one.\n'
+                       '  Aborting...')
+            os.sys.exit()
+    return value
+
+
+def get_cache(ctx):
+    """
+    returns: responses cache shared by the commands or None if caching is
+    disabled. It is opened on the first use so the commands not talking
+    to the documentation server never touch it
+    """
+    with cache_lock:
+        if ctx.obj['CACHE'] is None and ctx.obj['CACHE_OPTIONS'] is not None:
+            ctx.obj['CACHE'] = ResponseCache(ctx.obj['CACHE_PATH'],
+                                             **ctx.obj['CACHE_OPTIONS'])
+    return ctx.obj['CACHE']
+
+
+def get_session(ctx):
+    """
+    returns: requests session shared by the commands, it is created on
+    the first use so the commands working offline never load requests
+    """
+    if ctx.obj['SESSION'] is None:
+        import certifi
+        import requests
+
+        s = requests.session()
+        size_session_pool(s, ctx.obj['CONCURRENCY'])
+        s.proxies.update(proxies)
+        s.verify = certifi.where()
+        if profiling.active is not None:
+            s.hooks['response'].append(profiling.active.response_hook)
+        ctx.obj['SESSION'] = s
+    return ctx.obj['SESSION']
+
+
+def report_profile(profiler, cache=None, path=None):
+    """
+    Prints the profile of the run and writes it to `path` if given
+    """
+    if cache is not None:
+        profiler.count('cache hits', cache.hits)
+        profiler.count('cache misses', cache.misses)
+    click.echo('\n  ####### PROFILE #######')
+    for line in profiler.summary():
+        click.echo('  ' + line)
+    if path:
+        profiler.dump(path)
+        click.echo('\n  Profile written to {}'.format(os.path.abspath(path)))
+
+
+def validate_links(ctx, docs, workers=8, rate=5.0, timeout=10, ttl=86400,
+                   report=None, link_type=None):
+    """
+    Checks the links of the docs and prints the broken ones along with
+    the latency figures. With `link_type` (pdf, html, zip) only the links
+    of that type are checked. Results are cached in the links database
+    unless the responses cache is disabled. A JSON report of the broken
+    links is written into an opened file `report` if given.
+    returns: number of broken links
+    """
+    import tqdm
+
+    click.echo('\n  ####### LINK CHECK #######')
+    links = {}
+    for doc in docs:
+        for url, l_type in doc.links:
+            # the server filters docs by format, not the links of a doc
+            if link_type and l_type != link_type.upper():
+                continue
+            links.setdefault(url, []).append((doc, l_type))
+
+    cache = None
+    cache_options = ctx.obj['CACHE_OPTIONS']
+    if cache_options is not None:
+        cache = linkcheck.LinkCache(ctx.obj['LINKS_PATH'], ttl=ttl,
+                                    refresh=cache_options['refresh'])
+    s = get_session(ctx)
+    size_session_pool(s, workers)
+    with tqdm.tqdm(total=len(links), unit='link', leave=False) as bar:
+        with profiling.phase('link check'):
+            results, checked = linkcheck.check_links(
+                s, links, workers=workers, rate=rate, timeout=timeout,
+                cache=cache, progress=lambda _: bar.update())
+    if cache is not None:
+        cache.close()
+
+    broken = sorted((r for r in results.values() if linkcheck.is_broken(r)),
+                    key=lambda r: (r.status or 0, r.url))
+    click.echo('  Checked {} links ({} results cached): {} ok, {} broken'
+               .format(len(results), len(results) - len(checked),
+                       len(results) - len(broken), len(broken)))
+    if broken:
+        click.echo('\n  Broken links:')
+    for result in broken:
+        for doc, l_type in links[result.url]:
+            click.echo('    {:<4} {} {:<4} {}'.format(
+                result.status or '---', doc.doc_id, l_type, doc.title))
+        click.echo('         {}'.format(result.url))
+        if result.error:
+            click.echo('         {}'.format(result.error))
+
+    stats = linkcheck.latency_stats(checked)
+    if stats:
+        click.echo('\n  {:<44} {:>7} {:>8} {:>8} {:>8}'.format(
+            'latency, s', 'links', 'median', 'p95', 'max'))
+        for host, (checks, median, p95, longest) in sorted(stats.items()):
+            click.echo('  {:<44} {:>7} {:>8.3f} {:>8.3f} {:>8.3f}'.format(
+                host or 'all hosts', checks, median, p95, longest))
+
+    if report is not None:
+        json.dump([{'url': r.url,
+                    'status': r.status,
+                    'error': r.error,
+                    'latency': r.latency,
+                    'docs': [{'doc_id': doc.doc_id,
+                              'title': doc.title,
+                              'type': l_type}
+                             for doc, l_type in links[r.url]]}
+                   for r in broken], report, indent=2)
+    return len(broken)
+
+
+@click.group()
+@click.pass_context
+# @click.command()
+@click.option('-l', '--login', help='Put in your login to get access to the'
+              'documentation requiring authorization')
+@click.option('-p', '--proxy', default='')
+@click.option('-c', '--concurrency', default=4, type=click.IntRange(1, 32),
+              help='Max number of parallel requests towards the '
+              'documentation server. Defaults to 4')
+@click.option('--no-cache', is_flag=True,
+              help='Do not use the local caches of server responses and '
+              'compiled templates')
+@click.option('--refresh', is_flag=True,
+              help='Ignore cached responses and refresh them from the server')
+@click.option('--cache-ttl', default=86400, type=click.IntRange(0),
+              help='Seconds cached responses stay valid. Defaults to 86400')
+@click.option('--cache-size', default=256, type=click.IntRange(1),
+              help='Max size of the responses cache in MB. Defaults to 256')
+@click.option('--profile', is_flag=True,
+              help='Print time spent in every phase of the run along with '
+              'HTTP requests figures when the command completes')
+@click.option('--profile-output', type=click.Path(dir_okay=False),
+              help='Write the profile to a file, in the Prometheus textfile '
+              'format if the name ends with .prom, as json otherwise. '
+              'Implies --profile')
+@click.option('--debug', is_flag=True,
+              help='Write debug logs to the nokdoc_debug.log file')
+@click.option('--dump-responses', type=click.Path(dir_okay=False),
+              help='Write the last {} raw server responses to a file when '
+              'the command completes'.format(responses_capture.size))
+def cli(ctx, proxy, login, concurrency, no_cache, refresh, cache_ttl,
+        cache_size, profile, profile_output, debug, dump_responses):
+    """
+    NokDoc CLI Tool is exposing a set of commands to interact with
+    Nokia documentation portal.
+    It offers CLI experience for tasks like
+    - getting links to the docs aggregated into HTML file
+    - downloading docs collections automatically
+
+    It works for authorized users and guests.
+    """
+
+    global template_cache_dir
+    if debug:
+        logging.basicConfig(filename='nokdoc_debug.log', level=logging.DEBUG)
+    if dump_responses:
+        # responses are dumped there on decoding errors as well
+        responses_capture.path = dump_responses
+        ctx.call_on_close(responses_capture.dump)
+
+    # buiding a context object to pass session object,
+    # the session itself is created by the first command using it
+    ctx.obj = {'LOGGED_IN': False,
+               'CONCURRENCY': concurrency,
+               'SESSION': None}
+    # defining a proxy
+    if proxy:
+        proxies['https'] = proxy
+
+    if profile or profile_output:
+        profiler = profiling.enable(ctx.invoked_subcommand)
+        ctx.call_on_close(lambda: report_profile(profiler, ctx.obj['CACHE'],
+                                                 profile_output))
+
+    # log in and get cookies to get "protected" docs
+    if login:
+        click.echo('\n  ####### LOGIN #######')
+        pwd = click.prompt(
+            '  Please enter your password for a "{}" user'.format(login), hide_input=True)
+        ctx.obj['SESSION'] = user_auth(get_session(ctx), login, pwd)
+        ctx.obj['LOGGED_IN'] = True
+        ctx.obj['USERNAME'] = login
+
+    # responses cache, namespaced per user since guests and logged in
+    # users receive different docs lists
+    ctx.obj['CACHE_PATH'] = os.path.join(click.get_app_dir('nokdoc'),
+                                         'responses.sqlite')
+    ctx.obj['CATALOG_PATH'] = os.path.join(click.get_app_dir('nokdoc'),
+                                           'catalog.sqlite')
+    ctx.obj['INDEX_PATH'] = os.path.join(click.get_app_dir('nokdoc'),
+                                         'search.sqlite')
+    ctx.obj['LINKS_PATH'] = os.path.join(click.get_app_dir('nokdoc'),
+                                         'links.sqlite')
+    # the cache is opened by the first command using it, see get_cache()
+    ctx.obj['CACHE'] = None
+    ctx.obj['CACHE_OPTIONS'] = None
+    if not no_cache:
+        template_cache_dir = os.path.join(click.get_app_dir('nokdoc'),
+                                          'templates')
+        ctx.obj['CACHE_OPTIONS'] = {'ttl': cache_ttl,
+                                    'max_size': cache_size * 1024 * 1024,
+                                    'namespace': login or '',
+                                    'refresh': refresh}
+
+
+@cli.command()
+@click.pass_context
+# https://github.com/pallets/click/issues/514 required=True
+@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
+              required=True, callback=validate_product)
+@click.option('-r', '--release',
+              default='',
+              help='Release version, use "showrels" command to list them')
+@click.option('-f', '--format', help='Specify documentation format to fetch.'
+              'If unspecified -> all types will be collected.',
+              type=click.Choice(['pdf', 'html', 'zip']))
+@click.option('-s', '--sort', default='title',
+              type=click.Choice(['title', 'issue_date']),
+              help='Choose sorting key. Defaults to "title"')
+@click.option('-i', '--incremental', is_flag=True,
+              help='Compare the docs with the snapshot of the previous run '
+              'and rewrite the file only if they have changed')
+@click.option('--output-format', default='html',
+              type=click.Choice(output_formats),
+              help='Format of the output file. Defaults to "html"')
+@click.option('--offline', is_flag=True, is_eager=True,
+              help='Take the docs from the offline catalog filled by '
+              'the "sync" command instead of the documentation server')
+@click.option('--page-size', type=click.IntRange(1),
+              help='Split HTML output into pages of that many docs, '
+              'the output file gets an index of the pages')
+@click.option('--validate', is_flag=True,
+              help='Check the links of the docs and report the broken ones, '
+              'see the "checklinks" command')
+def getlinks(ctx, product, release, format, sort, incremental,
+             output_format, offline, page_size, validate):
+    '''
+    Gets a single HTML file with links to the documetation elements for a given
+    product.
+    '''
+    click.echo('\n  ####### GET LINKS #######')
+
+    try:
+        if offline:
+            docs = get_catalog_docs(Catalog(ctx.obj['CATALOG_PATH']),
+                                    product, release, format=format,
+                                    sort=sort)
+        else:
+            docs = get_docs(get_session(ctx), product, release,
+                            format=format, sort=sort,
+                            logged_in=ctx.obj['LOGGED_IN'],
+                            concurrency=ctx.obj['CONCURRENCY'],
+                            cache=get_cache(ctx))
+    except NokdocError as e:
+        if e.exit_code:
+            click.echo('  {}\n  Execution aborted.'.format(e))
+        else:
+            click.echo('  {} Exiting...'.format(e))
+        os.sys.exit(e.exit_code)
+
+    if release.upper() == 'ALL':
+        release = ''
+    if validate:
+        docs = list(docs)
+    if incremental:
+        _, diff = update_docs_file(docs, product, release,
+                                   output_format=output_format,
+                                   page_size=page_size)
+        echo_docs_diff(diff)
+    else:
+        export_docs(docs, product, release, output_format=output_format,
+                    page_size=page_size)
+    if validate and validate_links(ctx, docs,
+                                   workers=2 * ctx.obj['CONCURRENCY'],
+                                   link_type=format):
+        os.sys.exit(1)
+
+
+@cli.command()
+@click.pass_context
+@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
+              required=True, callback=validate_product)
+@click.option('-r', '--release',
+              default='',
+              help='Release version, use "showrels" command to list them')
+@click.option('-f', '--format', help='Check the links of this format only',
+              type=click.Choice(['pdf', 'html', 'zip']))
+@click.option('-w', '--workers', default=8, type=click.IntRange(1, 64),
+              help='Number of links checked in parallel. Defaults to 8')
+@click.option('--rate', default=5.0, type=click.FloatRange(0.1),
+              help='Max number of requests per second to a single host. '
+              'Defaults to 5')
+@click.option('--timeout', default=10, type=click.IntRange(1),
+              help='Seconds to wait for a server reply. Defaults to 10')
+@click.option('--ttl', default=86400, type=click.IntRange(0),
+              help='Seconds check results stay valid, links are checked '
+              'again once their results expire. Defaults to 86400')
+@click.option('--report', type=click.File('w'),
+              help='Write JSON report of the broken links into a file')
+@click.option('--offline', is_flag=True, is_eager=True,
+              help='Take the docs from the offline catalog filled by '
+              'the "sync" command instead of the documentation server')
+def checklinks(ctx, product, release, format, workers, rate, timeout, ttl,
+               report, offline):
+    """
+    Checks the links to the docs of a given product and reports the
+    broken ones. Exits with a non-zero code if any link is broken
+    """
+    click.echo('\n  ####### CHECK LINKS #######')
+
+    try:
+        if offline:
+            docs = get_catalog_docs(Catalog(ctx.obj['CATALOG_PATH']),
+                                    product, release, format=format)
+        else:
+            docs = get_docs(get_session(ctx), product, release,
+                            format=format, logged_in=ctx.obj['LOGGED_IN'],
+                            concurrency=ctx.obj['CONCURRENCY'],
+                            cache=get_cache(ctx))
+    except NokdocError as e:
+        if e.exit_code:
+            click.echo('  {}\n  Execution aborted.'.format(e))
+        else:
+            click.echo('  {} Exiting...'.format(e))
+        os.sys.exit(e.exit_code)
+
+    if validate_links(ctx, list(docs), workers=workers, rate=rate,
+                      timeout=timeout, ttl=ttl, report=report,
+                      link_type=format):
+        os.sys.exit(1)
+
+# root = html.fromstring(r.json()['proddata']['docdata'])
+# tmpList = root.xpath('//td//text()|//a/@href')
+# # slicing list of xpathed data to "list per document"
+# # 6 is the number of elements per doc entry
+# # refer to docdata html chunck, i.e.https://infoproducts.alcatel-lucent.com/cgi-bin/get_doc_list.pl?entry_id=1-0000000002238&srch_how=Title&srch_str=&release=14.0
+# # beautify it with http://www.cleancss.com/html-beautify/ and count <td> elements in each <tr>
+# # https://stackoverflow.com/questions/312443/how-do-you-split-a-list-into-evenly-sized-chunks
+# docList = [tmp[i:i + 6] for i in range(0, len(tmp), 6)]
+
+
+@cli.command()
+@click.pass_context
+@click.option('-p', '--product',
+              type=click.Choice(sorted(doc_id.keys()) + ['all']),
+              required=True)
+@click.option('--offline', is_flag=True,
+              help='Take the releases from the offline catalog filled by '
+              'the "sync" command instead of the documentation server')
+def showrels(ctx, product, offline):
+    """
+    Lists all available releases for a given product.
+    Pass "all" as a product to list releases for every product
+    """
+
+    from natsort import natsorted, ns
+
+    click.echo('\n  ####### SHOW RELEASES #######')
+
+    products = [product]
+    if product == 'all':
+        products = sorted(doc_id.keys())
+
+    if offline:
+        catalog = Catalog(ctx.obj['CATALOG_PATH'])
+        rels = {p: catalog.releases(p) for p in products}
+        if not any(rels.values()):
+            click.echo('  No releases for {} in the offline catalog.\n'
+                       '  Run "nokdoc sync" to fill it.'.format(product))
+            os.sys.exit(1)
+        for p in products:
+            if rels[p]:
+                click.echo('  Available releases for {} family: '.format(p) +
+                           ', '.join(natsorted(rels[p], alg=ns.IGNORECASE)))
+        return
+
+    click.echo('  Checking available releases...')
+
+    # fetch release lists of every involved entry in a single parallel sweep,
+    # then products are served from the memo
+    entry_ids = []
+    for p in products:
+        entry_ids.extend(product_entry_ids(p))
+    try:
+        get_all_rels(get_session(ctx), entry_ids,
+                     concurrency=ctx.obj['CONCURRENCY'],
+                     cache=get_cache(ctx))
+    except NokdocError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(e.exit_code)
+
+    for p in products:
+        rels = get_product_rels(get_session(ctx), p, cache=get_cache(ctx))
+        click.echo('  Available releases for {} family: '.format(p) +
+                   ', '.join(natsorted(rels, alg=ns.IGNORECASE)))
+
+
+@cli.command()
+@click.pass_context
+@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
+              multiple=True, callback=validate_product,
+              help='Product to sync, might be repeated. '
+              'All products are synced by default')
+def sync(ctx, product):
+    """
+    Fills the offline catalog with the releases and docs of every product
+    """
+    import tqdm
+
+    click.echo('\n  ####### SYNC #######')
+    s = get_session(ctx)
+    logged_in = ctx.obj['LOGGED_IN']
+    products = product or sorted(doc_id.keys())
+    if not logged_in:
+        skipped = [p for p in products if 'nuage' in p]
+        if skipped:
+            click.echo('  Skipping {} docs available to authorized users '
+                       'only'.format(', '.join(skipped)))
+        products = [p for p in products if 'nuage' not in p]
+
+    start = time.monotonic()
+    click.echo('  Checking available releases...')
+    entry_ids = []
+    for p in products:
+        entry_ids.extend(product_entry_ids(p))
+    try:
+        get_all_rels(s, entry_ids, concurrency=ctx.obj['CONCURRENCY'],
+                     cache=get_cache(ctx))
+    except NokdocError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(e.exit_code)
+
+    catalog = Catalog(ctx.obj['CATALOG_PATH'])
+    jobs = []
+    for p in products:
+        rels = get_product_rels(s, p, cache=get_cache(ctx))
+        catalog.set_releases(p, rels)
+        digests = catalog.digests(p)
+        jobs.extend((p, r, digests.get(r)) for r in rels)
+
+    click.echo('  Syncing {} releases of {} products...'.format(
+        len(jobs), len(products)))
+    updated = unchanged = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=ctx.obj['CONCURRENCY']) as executor:
+        futures = {executor.submit(sync_release, s, p, r, logged_in, digest,
+                                   get_cache(ctx)): (p, r)
+                   for p, r, digest in jobs}
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures),
+                                unit='release', leave=False):
+            p, r = futures[future]
+            try:
+                digest, docs = future.result()
+            except NokdocError:
+                failed.append((p, r))
+                continue
+            if docs is None:
+                unchanged += 1
+                continue
+            with profiling.phase('catalog write'):
+                catalog.store(p, r, docs, digest)
+            updated += 1
+
+    click.echo('  Synced in {:.1f}s: {} releases updated, {} unchanged, '
+               '{} failed'.format(time.monotonic() - start, updated,
+                                  unchanged, len(failed)))
+    for p, r in sorted(failed):
+        click.echo('    failed: {} release {}'.format(p, r))
+    click.echo('\n  Offline catalog contents:')
+    for p, n_rels, n_docs, _ in catalog.stats():
+        click.echo('    {:<14} {:>4} releases {:>7} docs'.format(
+            p, n_rels, n_docs))
+    catalog.close()
+    if failed:
+        os.sys.exit(1)
+
+
+@cli.group()
+@click.pass_context
+def cache(ctx):
+    """
+    Manages the local cache of documentation server responses
+    """
+    # managed even if caching is disabled for the run
+    if get_cache(ctx) is None:
+        ctx.obj['CACHE'] = ResponseCache(ctx.obj['CACHE_PATH'])
+
+
+@cache.command()
+@click.pass_context
+def stats(ctx):
+    """
+    Shows the cache usage statistics
+    """
+    click.echo('\n  ####### CACHE STATS #######')
+    cache_stats = ctx.obj['CACHE'].stats()
+    click.echo('  Location: {}'.format(cache_stats['path']))
+    click.echo('  Entries: {} ({} expired)'.format(cache_stats['entries'],
+                                                   cache_stats['expired']))
+    click.echo('  Size: {:.1f} of {:.1f} MB'.format(
+        cache_stats['size'] / 1024 / 1024,
+        cache_stats['max_size'] / 1024 / 1024))
+    click.echo('  TTL: {} seconds'.format(cache_stats['ttl']))
+    if cache_stats['oldest']:
+        click.echo('  Oldest entry: {}'.format(time.strftime(
+            '%Y/%m/%d %H:%M:%S', time.localtime(cache_stats['oldest']))))
+
+
+@cache.command()
+@click.pass_context
+def clear(ctx):
+    """
+    Removes all cached responses
+    """
+    click.echo('\n  ####### CACHE CLEAR #######')
+    removed = ctx.obj['CACHE'].clear()
+    click.echo('  Removed {} cached responses'.format(removed))
+
+
+@cli.command()
+@click.pass_context
+@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
+              required=True, multiple=True, callback=validate_product,
+              help='Product to fetch the docs for, might be repeated')
+@click.option('-r', '--release', multiple=True,
+              help='Release version, use "showrels" command to list them. '
+              'Might be repeated')
+@click.option('-f', '--format', help='Specify documentation format to fetch.'
+              'If unspecified -> all types will be collected. '
+              'Might be repeated',
+              type=click.Choice(['pdf', 'html', 'zip']), multiple=True)
+@click.option('-n', '--connections', default=1, type=click.IntRange(1, 16),
+              help='Number of parallel connections to download the '
+              'collection with. Defaults to 1')
+@click.option('-t', '--timeout', default=900, type=click.IntRange(1),
+              help='Seconds to wait for the server to prepare a collection. '
+              'Defaults to 900')
+def getdocs(ctx, product, release, format, connections, timeout):
+    '''
+    Downloads documentation collection for a given product family.
+    Optionally specify release version to fetch
+    Optionally specify format of the docs to fetch
+
+    Several products, releases and formats might be passed at once,
+    a collection is prepared for every combination of them. Collections are
+    requested up front and every one is downloaded as soon as it is ready.
+
+    Currently supported products: nuage, nuage-vsp, nuage-vns
+    '''
+
+    click.echo('\n  ####### DOWNLOAD DOCS #######')
+    s = get_session(ctx)
+    username = ctx.obj['USERNAME']
+
+    collections = list(itertools.product(product, release or [''],
+                                         format or [None]))
+
+    # submit all the collections first to let the server prepare them
+    # simultaneously
+    requested, failed = submit_collections(s, collections)
+
+    click.echo('  Waiting for the documentation server to prepare '
+               '{} collection(s)...'.format(len(requested)))
+    size_session_pool(s, max(len(requested), 1) * connections)
+    with ThreadPoolExecutor(max_workers=max(len(requested), 1)) as executor:
+        futures = {}
+        for position, collection in enumerate(requested):
+            future = executor.submit(get_collection, s, collection, username,
+                                     connections=connections,
+                                     timeout=timeout, position=position)
+            futures[future] = collection
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except NokdocError as e:
+                click.echo('\n  !! {}'.format(e))
+                failed.append(futures[future][:3])
+                continue
+            click.echo('\n  File has been downloaded successfully '
+                       'to the following location\n'
+                       '    -> {}\n'
+                       '  SHA256: {}'.format(os.path.abspath(stats['path']),
+                                            stats['checksum']))
+
+    if failed:
+        click.echo('  Failed to download {} collection(s). Aborting'.format(
+            len(failed)))
+        os.sys.exit(1)
+
+
+def mirror_fname(doc, url, l_type):
+    """
+    Name of a doc file in a release view of the mirror
+    """
+    ext = os.path.splitext(url.split('?')[0])[1].lower() or \
+        '.' + l_type.lower()
+    return '{}__{}{}'.format(doc.doc_id, filename_formatter(doc.title), ext)
+
+
+def plan_mirror(docs_per_view, link_types):
+    """
+    Groups the files of all the views by the document version they are
+    made of, so every version is fetched once.
+    `docs_per_view` is a dict {view dir: docs}
+    returns: dict {(url, version): list of file paths in the views}
+    """
+    plan = {}
+    for view_dir, docs in docs_per_view.items():
+        for doc in docs:
+            for url, l_type in doc.links:
+                if l_type not in link_types:
+                    continue
+                version = '{} {}'.format(doc.issue, doc.issue_date)
+                plan.setdefault((url, version), []).append(os.path.join(
+                    view_dir, mirror_fname(doc, url, l_type)))
+    return plan
+
+
+def prune_views(view_dirs, paths):
+    """
+    Removes the files of the views which are not in `paths` anymore,
+    the stored files stay in the store
+    returns: number of removed files
+    """
+    removed = 0
+    for view_dir in view_dirs:
+        if not os.path.isdir(view_dir):
+            continue
+        for name in os.listdir(view_dir):
+            path = os.path.join(view_dir, name)
+            if path not in paths and os.path.isfile(path):
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+@cli.command()
+@click.pass_context
+@click.option('-p', '--product', type=click.Choice(sorted(doc_id.keys())),
+              required=True, callback=validate_product)
+@click.option('-r', '--release', multiple=True,
+              help='Release version, use "showrels" command to list them. '
+              'Might be repeated')
+@click.option('-f', '--format', type=click.Choice(['pdf', 'html', 'zip']),
+              multiple=True,
+              help='Format of the docs to mirror. Might be repeated. '
+              'Defaults to pdf')
+@click.option('-o', '--output-dir', default='mirror',
+              help='Directory to put the release views into. '
+              'Defaults to "mirror"')
+@click.option('--store', type=click.Path(file_okay=False),
+              help='Directory of the documents store, it has to be on the '
+              'same filesystem as the views. Defaults to .store in the '
+              'output dir')
+@click.option('-w', '--workers', default=4, type=click.IntRange(1, 32),
+              help='Number of docs downloaded in parallel. Defaults to 4')
+@click.option('--offline', is_flag=True, is_eager=True,
+              help='Take the docs lists from the offline catalog filled by '
+              'the "sync" command instead of the documentation server')
+def mirror(ctx, product, release, format, output_dir, store, workers,
+           offline):
+    """
+    Downloads the individual docs of a given product into a directory
+    per release. Every document is fetched and stored once, releases
+    sharing it get hardlinks to the same file
+    """
+    import requests
+    import tqdm
+
+    click.echo('\n  ####### MIRROR #######')
+    link_types = {f.upper() for f in format or ['pdf']}
+    docs_per_view = {}
+    try:
+        for rel in release or ['']:
+            if offline:
+                docs = get_catalog_docs(Catalog(ctx.obj['CATALOG_PATH']),
+                                        product, rel)
+            else:
+                docs = get_docs(get_session(ctx), product, rel,
+                                logged_in=ctx.obj['LOGGED_IN'],
+                                concurrency=ctx.obj['CONCURRENCY'],
+                                cache=get_cache(ctx), quiet=True)
+            view_dir = os.path.join(output_dir, product,
+                                    rel.upper().replace(' ', '_') or 'ALL')
+            docs_per_view[view_dir] = list(docs)
+    except NokdocError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(e.exit_code or 1)
+
+    plan = plan_mirror(docs_per_view, link_types)
+    files = sum(len(paths) for paths in plan.values())
+    click.echo('  {} files in {} releases, {} distinct documents'.format(
+        files, len(docs_per_view), len(plan)))
+
+    doc_store = DocStore(store or os.path.join(output_dir, '.store'))
+    s = get_session(ctx)
+    size_session_pool(s, workers)
+    downloaded = received = 0
+    failed = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            tqdm.tqdm(total=len(plan), unit='doc', leave=False) as bar:
+        futures = {executor.submit(doc_store.fetch, s, url, version):
+                   (url, version) for url, version in plan}
+        for future in as_completed(futures):
+            bar.update()
+            url, version = futures[future]
+            try:
+                digest, size = future.result()
+            except (download.DownloadError,
+                    requests.exceptions.RequestException) as e:
+                failed[url, version] = e
+                continue
+            if size:
+                downloaded += 1
+                received += size
+            for path in plan[url, version]:
+                doc_store.link(digest, path)
+
+    # files of the docs which failed to download are kept as they are
+    removed = prune_views(docs_per_view, {path for paths in plan.values()
+                                          for path in paths})
+    stored_files, stored_size = doc_store.stats()
+    doc_store.close()
+
+    click.echo('  Downloaded {} docs ({:.1f} MB), {} were already in the '
+               'store, {} failed. {} outdated files removed from the views'
+               .format(downloaded, received / 1024 / 1024,
+                       len(plan) - downloaded - len(failed), len(failed),
+                       removed))
+    for (url, _), e in sorted(failed.items()):
+        click.echo('    failed: {}\n      {}'.format(url, e))
+    click.echo('  The store holds {} files, {:.1f} MB\n   ->{}'.format(
+        stored_files, stored_size / 1024 / 1024,
+        os.path.abspath(output_dir)))
+    if failed:
+        os.sys.exit(1)
+
+
+def load_batch_jobs(finput):
+    """
+    Loads a YAML file with products/releases and returns a list of
+    (product, release) tuples. An empty release stands for all releases
+    """
+    import yaml
+
+    with click.open_file(finput, 'r') as f:
+        products = yaml.safe_load(f)   # load getlinks product/rels file
+
+    jobs = []
+    for product in products:
+        for release in products[product]['releases']:
+            if release is None:
+                release = ''
+            jobs.append((product, str(release)))
+    return jobs
+
+
+def run_getlinks_job(s, product, release, out_dir, logged_in=False,
+                     concurrency=4, cache=None, incremental=False,
+                     output_format='html', f=None, page_size=None):
+    """
+    Builds docs file for a single product/release batch job under the
+    `out_dir` directory. Machine-readable formats are written into an
+    already opened shared file `f` if one is given.
+    Returns a tuple (path to the created file, number of docs, DocsDiff)
+    DocsDiff is None unless `incremental` is set
+    """
+    if product not in doc_id:
+        raise NokdocError('Unknown product "{}"'.format(product))
+    if 'nuage' in product and not logged_in:
+        raise NokdocError('Nuage Networks documentation can be accessed '
+                          'by authorized users only')
+
+    docs = get_docs(s, product, release, logged_in=logged_in,
+                    concurrency=concurrency, cache=cache, quiet=True)
+    if release.upper() == 'ALL':
+        release = ''
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir,
+                        docs_fname(product, release, output_format))
+    if f is not None:
+        docs_num = export_docs(docs, product, release,
+                               output_format=output_format, f=f)
+        return f.name, docs_num, None
+    if incremental:
+        return (path,) + update_docs_file(docs, product, release, path=path,
+                                          output_format=output_format,
+                                          quiet=True, page_size=page_size)
+    docs_num = export_docs(docs, product, release, path=path,
+                           output_format=output_format, quiet=True,
+                           page_size=page_size)
+    return path, docs_num, None
+
+
+@cli.command()
+@click.pass_context
+@click.argument('finput')
+@click.option('-w', '--workers', default=4, type=click.IntRange(1, 32),
+              help='Number of product/release jobs processed in parallel. '
+              'Defaults to 4')
+@click.option('-o', '--output-dir', default='docs',
+              help='Directory to put the docs dirs per product into. '
+              'Defaults to "docs"')
+@click.option('-i', '--incremental', is_flag=True,
+              help='Rewrite only the files whose docs have changed '
+              'since the previous run')
+@click.option('--report', type=click.File('w'),
+              help='Write JSON report of added/removed/reissued docs '
+              'per job into a file. Requires --incremental')
+@click.option('--output-format', default='html',
+              type=click.Choice(output_formats),
+              help='Format of the output files. Defaults to "html". '
+              'With "ndjson" docs of all jobs are appended to a single '
+              'nokdoc.ndjson file in the output dir')
+@click.option('--page-size', type=click.IntRange(1),
+              help='Split HTML files into pages of that many docs, '
+              'every file gets an index of its pages')
+def batchgetlinks(ctx, finput, workers, output_dir, incremental, report,
+                  output_format, page_size):
+    '''
+    Invokes getlinks command for a list of products/releases defined in
+    a YAML file passed as argument
+    '''
+    click.echo('\n  ####### BATCH GET LINKS #######')
+
+    if report and not incremental:
+        raise click.UsageError('--report requires --incremental')
+    jobs = load_batch_jobs(finput)
+
+    # every job issues up to `concurrency` requests by itself
+    concurrency = ctx.obj['CONCURRENCY']
+    size_session_pool(get_session(ctx), workers * concurrency)
+
+    # docs of all jobs are appended to a single ndjson file as they are
+    # parsed, so it can be bulk loaded at once
+    shared_f = None
+    if output_format == 'ndjson':
+        if incremental:
+            raise click.UsageError('--incremental can not be used with '
+                                   'the "ndjson" output format')
+        os.makedirs(output_dir, exist_ok=True)
+        shared_f = LockedFile(open(os.path.join(output_dir, 'nokdoc.ndjson'),
+                                   'w'))
+        ctx.call_on_close(shared_f.close)
+
+    click.echo('  Processing {} jobs with {} workers...'.format(len(jobs),
+                                                                workers))
+    failed = []
+    changes = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for product, release in jobs:
+            # every product gets its own dir with docs inside `output_dir`
+            future = executor.submit(run_getlinks_job, get_session(ctx),
+                                     product, release,
+                                     os.path.join(output_dir, product),
+                                     logged_in=ctx.obj['LOGGED_IN'],
+                                     concurrency=concurrency,
+                                     cache=get_cache(ctx),
+                                     incremental=incremental,
+                                     output_format=output_format,
+                                     f=shared_f, page_size=page_size)
+            futures[future] = (product, release)
+
+        for future in as_completed(futures):
+            product, release = futures[future]
+            try:
+                path, docs_num, diff = future.result()
+            except Exception as e:
+                failed.append((product, release))
+                click.echo('    [FAILED] {} {}: {}'.format(
+                    product, release or 'all releases', e))
+                continue
+            if diff is None:
+                click.echo('    [OK] {} {}: {} docs -> {}'.format(
+                    product, release or 'all releases', docs_num, path))
+                continue
+            changes.append({'product': product,
+                            'release': release,
+                            'path': path,
+                            'changed': diff.changed,
+                            'added': diff.added,
+                            'removed': diff.removed,
+                            'reissued': diff.reissued})
+            if diff.changed:
+                status = 'UPDATED'
+            else:
+                status = 'UNCHANGED'
+            click.echo('    [{}] {} {}: {} docs (+{} -{} ~{}) -> {}'.format(
+                status, product, release or 'all releases', docs_num,
+                len(diff.added), len(diff.removed), len(diff.reissued),
+                path))
+
+    if report:
+        json.dump(changes, report, indent=2)
+
+    click.echo('\n  Done! {} jobs succeeded, {} jobs failed.'.format(
+        len(jobs) - len(failed), len(failed)))
+    if failed:
+        os.sys.exit(1)
+
+
+# manifest of the pages rendered by the site command, kept in the site dir
+SITE_MANIFEST = '.nokdoc-site.json'
+
+
+def load_site_manifest(out_dir):
+    """
+    returns: dict {page path relative to `out_dir`: page record} of the
+    pages rendered by the previous site run
+    """
+    try:
+        with open(os.path.join(out_dir, SITE_MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_site_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, SITE_MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def page_digest(*contents):
+    """
+    returns: hexdigest of everything a page is rendered from
+    """
+    raw = json.dumps(contents, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf8')).hexdigest()
+
+
+def build_site_release(docs, product, release, out_dir, manifest,
+                       templates, page_size=None):
+    """
+    Renders the docs page of a product release unless the page recorded
+    in the `manifest` was rendered out of the same docs and templates.
+    returns: tuple (page path relative to `out_dir`, page record,
+    True if the page was rendered)
+    """
+    docs = list(docs)
+    rel_path = os.path.join(product, docs_fname(product, release))
+    digest = page_digest(templates, page_size,
+                         make_snapshot(docs, product, release)['hash'])
+    record = {'digest': digest, 'product': product, 'release': release,
+              'docs': len(docs)}
+    path = os.path.join(out_dir, rel_path)
+    if manifest.get(rel_path) == record and os.path.isfile(path):
+        return rel_path, record, False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    export_docs(docs, product, release, path=path, quiet=True,
+                page_size=page_size)
+    return rel_path, record, True
+
+
+def build_site_index(entries, heading, entry_name, rel_path, out_dir,
+                     manifest, templates, up=None):
+    """
+    Renders a landing page listing `entries`, dicts with href, name,
+    docs and note keys, unless the page has not changed.
+    returns: tuple (page path relative to `out_dir`, page record,
+    True if the page was rendered)
+    """
+    record = {'digest': page_digest(templates, entries, heading, up)}
+    path = os.path.join(out_dir, rel_path)
+    if manifest.get(rel_path) == record and os.path.isfile(path):
+        return rel_path, record, False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.writelines(get_template('nokdoc_site_index.html').generate(
+            entries=entries, heading=heading, entry_name=entry_name, up=up,
+            gen_date=date.today().strftime("%Y/%m/%d")))
+    return rel_path, record, True
+
+
+def remove_site_page(out_dir, rel_path):
+    """
+    Removes a page of the site along with its pages, the product dir
+    is removed once it gets empty
+    """
+    path = os.path.join(out_dir, rel_path)
+    if os.path.isfile(path):
+        os.remove(path)
+    remove_pages(path)
+    if os.path.dirname(rel_path) and not os.listdir(os.path.dirname(path)):
+        os.rmdir(os.path.dirname(path))
+
+
+@cli.command()
+@click.pass_context
+@click.argument('finput')
+@click.option('-o', '--output-dir', default='site',
+              help='Directory to render the site into. Defaults to "site"')
+@click.option('-w', '--workers', default=4, type=click.IntRange(1, 32),
+              help='Number of releases fetched and rendered in parallel. '
+              'Defaults to 4')
+@click.option('--page-size', type=click.IntRange(1),
+              help='Split release pages into pages of that many docs')
+@click.option('--offline', is_flag=True,
+              help='Take the docs from the offline catalog filled by '
+              'the "sync" command instead of the documentation server')
+@click.option('--force', is_flag=True,
+              help='Render all the pages even if they have not changed')
+def site(ctx, finput, output_dir, workers, page_size, offline, force):
+    """
+    Renders a static site with the docs of products/releases defined in
+    a YAML file: a page per release, a landing page per product and the
+    site index. Only the pages whose contents changed are rewritten
+    """
+    from natsort import natsorted, ns
+
+    click.echo('\n  ####### SITE #######')
+
+    jobs = load_batch_jobs(finput)
+    logged_in = ctx.obj['LOGGED_IN']
+    previous = load_site_manifest(output_dir)
+    # pages missing from the manifest are always rendered
+    manifest = {} if force else previous
+    templates = template_digest()
+    concurrency = ctx.obj['CONCURRENCY']
+    if not offline:
+        size_session_pool(get_session(ctx), workers * concurrency)
+
+    def build(product, release):
+        if product not in doc_id:
+            raise NokdocError('Unknown product "{}"'.format(product))
+        if offline:
+            catalog = Catalog(ctx.obj['CATALOG_PATH'])
+            try:
+                docs = list(get_catalog_docs(catalog, product, release))
+            finally:
+                catalog.close()
+        else:
+            if 'nuage' in product and not logged_in:
+                raise NokdocError('Nuage Networks documentation can be '
+                                  'accessed by authorized users only')
+            docs = get_docs(get_session(ctx), product, release,
+                            logged_in=logged_in, concurrency=concurrency,
+                            cache=get_cache(ctx), quiet=True)
+        if release.upper() == 'ALL':
+            release = ''
+        return build_site_release(docs, product, release, output_dir,
+                                  manifest, templates, page_size=page_size)
+
+    click.echo('  Rendering {} releases with {} workers...'.format(
+        len(jobs), workers))
+    new_manifest = {}
+    rendered = unchanged = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(build, product, release):
+                   (product, release) for product, release in jobs}
+        for future in as_completed(futures):
+            product, release = futures[future]
+            try:
+                rel_path, record, changed = future.result()
+            except Exception as e:
+                failed.append((product, release))
+                click.echo('    [FAILED] {} {}: {}'.format(
+                    product, release or 'all releases', e))
+                # the page of the previous run stays on the site
+                rel_path = os.path.join(product, docs_fname(
+                    product, '' if release.upper() == 'ALL' else release))
+                if rel_path in previous:
+                    new_manifest[rel_path] = previous[rel_path]
+                continue
+            new_manifest[rel_path] = record
+            if changed:
+                rendered += 1
+                click.echo('    [UPDATED] {} {}: {} docs -> {}'.format(
+                    product, release or 'all releases', record['docs'],
+                    os.path.join(output_dir, rel_path)))
+            else:
+                unchanged += 1
+
+    # landing pages are built out of the release pages on the site
+    products = {}
+    for rel_path, record in new_manifest.items():
+        products.setdefault(record['product'], []).append(
+            (record['release'], rel_path, record['docs']))
+    landing_pages = []
+    for product, releases in sorted(products.items()):
+        entries = [{'href': os.path.basename(rel_path),
+                    'name': release or 'all releases',
+                    'docs': docs_num,
+                    'note': ''}
+                   for release, rel_path, docs_num in natsorted(
+                       releases, alg=ns.IGNORECASE, reverse=True)]
+        landing_pages.append(build_site_index(
+            entries, 'Documentation of {}'.format(product.upper()),
+            'Release', os.path.join(product, 'index.html'), output_dir,
+            manifest, templates, up='../index.html'))
+    entries = [{'href': '{}/index.html'.format(product),
+                'name': product,
+                'docs': sum(docs_num for _, _, docs_num in releases),
+                'note': '{} releases'.format(len(releases))}
+               for product, releases in sorted(products.items())]
+    landing_pages.append(build_site_index(
+        entries, 'Nokia documentation', 'Product', 'index.html', output_dir,
+        manifest, templates))
+    for rel_path, record, changed in landing_pages:
+        new_manifest[rel_path] = record
+        rendered += changed
+        unchanged += not changed
+
+    removed = 0
+    for rel_path in set(previous) - set(new_manifest):
+        remove_site_page(output_dir, rel_path)
+        removed += 1
+    save_site_manifest(output_dir, new_manifest)
+
+    click.echo('\n  Done! {} pages rendered, {} unchanged, {} removed, '
+               '{} releases failed.\n   ->{}'.format(
+                   rendered, unchanged, removed, len(failed),
+                   os.path.abspath(os.path.join(output_dir, 'index.html'))))
+    if failed:
+        os.sys.exit(1)
+
+
+def load_collections_manifest(finput):
+    """
+    Loads a YAML manifest with products/releases/formats of the collections
+    to download and returns a list of (product, release, format) tuples.
+    An empty release stands for all releases, missing formats stand for
+    a collection with all formats
+    """
+    import yaml
+
+    with click.open_file(finput, 'r') as f:
+        products = yaml.safe_load(f)
+
+    collections = []
+    for product in products:
+        for release in products[product].get('releases') or [None]:
+            if release is None:
+                release = ''
+            for format in products[product].get('formats') or [None]:
+                collections.append((product, str(release), format))
+    return collections
+
+
+@cli.command()
+@click.pass_context
+@click.argument('finput')
+@click.option('-w', '--workers', default=2, type=click.IntRange(1, 16),
+              help='Number of collections downloaded in parallel. '
+              'Defaults to 2')
+@click.option('-n', '--connections', default=1, type=click.IntRange(1, 16),
+              help='Number of parallel connections to download every '
+              'collection with. Defaults to 1')
+@click.option('-b', '--bandwidth', default=0, type=click.FloatRange(0),
+              help='Total bandwidth cap in MB/s shared by all downloads. '
+              'Unlimited by default')
+@click.option('-o', '--output-dir', default='.',
+              help='Directory to put the collections into. '
+              'Defaults to the current dir')
+@click.option('-t', '--timeout', default=900, type=click.IntRange(1),
+              help='Seconds to wait for the server to prepare a collection. '
+              'Defaults to 900')
+@click.option('--summary', type=click.File('w'),
+              help='Write JSON summary of the downloads into a file')
+def batchgetdocs(ctx, finput, workers, connections, bandwidth, output_dir,
+                 timeout, summary):
+    '''
+    Downloads documentation collections for a list of
+    products/releases/formats defined in a YAML file passed as argument.
+    Archives which are already present with a matching size and checksum
+    are not downloaded again.
+    '''
+    click.echo('\n  ####### BATCH DOWNLOAD DOCS #######')
+    s = get_session(ctx)
+
+    collections = load_collections_manifest(finput)
+    failed = [c for c in collections if c[0] not in doc_id]
+    for product, release, format in failed:
+        click.echo('  !! Unknown product "{}"'.format(product))
+    collections = [c for c in collections if c[0] in doc_id]
+    validate_product(ctx, None, [c[0] for c in collections])
+
+    os.makedirs(output_dir, exist_ok=True)
+    limiter = None
+    if bandwidth:
+        limiter = download.RateLimiter(bandwidth * 1024 * 1024)
+
+    requested, submit_failed = submit_collections(s, collections)
+    failed.extend(submit_failed)
+
+    click.echo('  Processing {} collection(s) with {} workers...'.format(
+        len(requested), workers))
+    size_session_pool(s, workers * connections)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for position, collection in enumerate(requested):
+            future = executor.submit(get_collection, s, collection,
+                                     ctx.obj['USERNAME'], out_dir=output_dir,
+                                     connections=connections,
+                                     timeout=timeout, limiter=limiter,
+                                     position=position % workers,
+                                     skip_existing=True)
+            futures[future] = collection
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except NokdocError as e:
+                click.echo('\n  !! {}'.format(e))
+                failed.append(futures[future][:3])
+
+    click.echo('\n  {:<12} {:<10} {:<6} {:<10} {:>9} {:>8} {:>8} {:>9}'.format(
+        'PRODUCT', 'RELEASE', 'FORMAT', 'STATUS', 'SIZE, MB', 'WAIT, S',
+        'TIME, S', 'MB/S'))
+    for stats in results:
+        click.echo('  {:<12} {:<10} {:<6} {:<10} {:>9.1f} {:>8.1f} {:>8.1f} '
+                   '{:>9.2f}'.format(
+                       stats['product'], stats['release'] or 'all',
+                       stats['format'], stats['status'],
+                       stats['size'] / 1024 / 1024, stats['wait_time'],
+                       stats['download_time'],
+                       stats['throughput'] / 1024 / 1024))
+    downloaded = [r for r in results if r['status'] == 'downloaded']
+    total_size = sum(r['size'] for r in downloaded)
+    total_time = sum(r['download_time'] for r in downloaded)
+    click.echo('\n  Done! {} downloaded ({:.1f} MB), {} skipped, '
+               '{} failed.'.format(len(downloaded), total_size / 1024 / 1024,
+                                   len(results) - len(downloaded),
+                                   len(failed)))
+
+    if summary:
+        json.dump({'collections': results,
+                   'failed': [{'product': p, 'release': r,
+                               'format': f or 'all'} for p, r, f in failed],
+                   'downloaded_bytes': total_size,
+                   'download_time': total_time},
+                  summary, indent=2)
+    if failed:
+        os.sys.exit(1)
+
+
+@cli.group()
+@click.pass_context
+@click.option('--store', default='nokdoc_archive',
+              type=click.Path(file_okay=False),
+              help='Directory of the archive. Defaults to "nokdoc_archive"')
+def archive(ctx, store):
+    """
+    Manages the deduplicating archive of downloaded collection zips
+    """
+    ctx.obj['ARCHIVE'] = ZipArchive(store)
+    ctx.call_on_close(ctx.obj['ARCHIVE'].close)
+
+
+@archive.command()
+@click.pass_context
+@click.argument('paths', nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--remove', is_flag=True,
+              help='Remove the zips once they are archived')
+def add(ctx, paths, remove):
+    """
+    Adds zips to the archive, zips of the same name are replaced
+    """
+    click.echo('\n  ####### ARCHIVE ADD #######')
+    store = ctx.obj['ARCHIVE']
+    failed = 0
+    for path in paths:
+        start = time.monotonic()
+        try:
+            new_members, new_bytes = store.add(path)
+        except ArchiveError as e:
+            click.echo('    [FAILED] {}'.format(e))
+            failed += 1
+            continue
+        click.echo('    [OK] {}: {:.1f} MB, {} new members, {:.1f} MB '
+                   'stored in {:.1f}s'.format(
+                       os.path.basename(path),
+                       os.path.getsize(path) / 1024 / 1024, new_members,
+                       new_bytes / 1024 / 1024, time.monotonic() - start))
+        if remove:
+            os.remove(path)
+    echo_archive_stats(store)
+    if failed:
+        os.sys.exit(1)
+
+
+def echo_archive_stats(store):
+    zips, zips_size, blobs, store_size = store.stats()
+    click.echo('\n  {} zips of {:.1f} MB kept in {} blobs, {:.1f} MB '
+               'on disk'.format(zips, zips_size / 1024 / 1024, blobs,
+                                store_size / 1024 / 1024))
+    if store_size:
+        click.echo('  Deduplication ratio: {:.1f}x'.format(
+            zips_size / store_size))
+
+
+@archive.command(name='list')
+@click.pass_context
+@click.argument('name', required=False)
+def list_zips(ctx, name):
+    """
+    Lists the archived zips, or the members of a zip if its name is given
+    """
+    store = ctx.obj['ARCHIVE']
+    if name:
+        try:
+            members = store.members(name)
+        except ArchiveError as e:
+            click.echo('  {}\n  Execution aborted.'.format(e))
+            os.sys.exit(1)
+        for filename, size in members:
+            click.echo('  {:>12}  {}'.format(size, filename))
+        return
+
+    click.echo('\n  ####### ARCHIVE #######')
+    for zip_name, size, members, new_bytes, ingested in store.zips():
+        click.echo('  {:<60} {:>9.1f} MB {:>6} members, {:>9.1f} MB new, '
+                   'added {}'.format(
+                       zip_name, size / 1024 / 1024, members,
+                       new_bytes / 1024 / 1024,
+                       time.strftime('%Y/%m/%d %H:%M',
+                                     time.localtime(ingested))))
+    echo_archive_stats(store)
+
+
+@archive.command()
+@click.pass_context
+@click.argument('name')
+@click.option('-o', '--output', type=click.Path(dir_okay=False),
+              help='Path of the rebuilt zip. Defaults to its name in the '
+              'current dir')
+def restore(ctx, name, output):
+    """
+    Rebuilds an archived zip byte for byte
+    """
+    click.echo('\n  ####### ARCHIVE RESTORE #######')
+    output = output or name
+    try:
+        checksum = ctx.obj['ARCHIVE'].restore(name, output)
+    except ArchiveError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(1)
+    click.echo('  Done! File created:\n   ->{}\n  SHA256: {}'.format(
+        os.path.abspath(output), checksum))
+
+
+@archive.command()
+@click.pass_context
+@click.argument('name')
+@click.argument('member')
+@click.option('-o', '--output', type=click.Path(dir_okay=False),
+              help='Path of the extracted file. Defaults to the base name '
+              'of the member in the current dir')
+def extract(ctx, name, member, output):
+    """
+    Extracts a single member of an archived zip
+    """
+    output = output or os.path.basename(member.rstrip('/'))
+    try:
+        ctx.obj['ARCHIVE'].extract(name, member, output)
+    except ArchiveError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(1)
+    click.echo('  Extracted {} to {}'.format(member, os.path.abspath(output)))
+
+
+@archive.command()
+@click.pass_context
+@click.argument('name')
+def remove(ctx, name):
+    """
+    Removes a zip from the archive along with the members no other zip has
+    """
+    try:
+        removed = ctx.obj['ARCHIVE'].remove(name)
+    except ArchiveError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(1)
+    click.echo('  Removed {} and {} blobs no other zip refers to'.format(
+        name, removed))
+
+
+def filename_formatter(s):
+    valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
+    filename = ''.join(c for c in s if c in valid_chars)
+    filename = filename.replace(' ', '_')
+    return filename
+
+
+# regexp to match human readable doc name in index.html of Nuage docs
+html_title_patt = re.compile(r'<title>(.+)&mdash')
+# the title is at the top of index.html, no need to read the whole file
+TITLE_READ_SIZE = 64 * 1024
+
+
+def html_doc_dirname(content):
+    """
+    Builds a directory name out of the title of a Nuage doc index.html
+    returns: dir name or None if the title is not found
+    """
+    m = html_title_patt.search(content)
+    if not m:
+        return None
+    return filename_formatter(m.group(1).strip()) or None
+
+
+def plan_renames(dirnames, taken=()):
+    """
+    Maps doc dirs to their new names. Dirs without a new name are left
+    in place, colliding names get a numeric suffix.
+    `dirnames` is a dict {dir: new name or None},
+    `taken` are the names already present next to the dirs.
+    returns: dict {dir: new name} of the dirs to rename
+    """
+    used = set(taken) - {d for d, name in dirnames.items()
+                         if name and name != d}
+    renames = {}
+    for d in sorted(dirnames):
+        name = dirnames[d]
+        if not name or name == d:
+            continue
+        new_name, i = name, 1
+        while new_name in used:
+            i += 1
+            new_name = '{}_{}'.format(name, i)
+        used.add(new_name)
+        if new_name != d:
+            renames[d] = new_name
+    return renames
+
+
+def plan_zip_renames(path):
+    """
+    Reads the titles of the docs dirs inside a zip archive straight from
+    their index.html members.
+    returns: tuple (dict {dir: new name} of the dirs to rename,
+    dict {dir: new name or None if no title was found} of all docs dirs)
+    """
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+        top_names = {n.split('/', 1)[0] for n in names}
+        dirnames = {}
+        for d in sorted({n.split('/', 1)[0] for n in names if '/' in n}):
+            index = d + '/index.html'
+            if index not in names:
+                continue
+            with zf.open(index) as f:
+                content = f.read(TITLE_READ_SIZE).decode('utf8', 'replace')
+            dirnames[d] = html_doc_dirname(content)
+    return plan_renames(dirnames, top_names), dirnames
+
+
+def fix_zip_contents(path, dry_run=False):
+    """
+    Renames docs dirs inside a zip archive, the other members are copied
+    into a new archive as is, without being decompressed. The new archive
+    replaces the original one once complete.
+    With `dry_run` the renames are only planned.
+    returns: dict {dir: new name} of the renamed dirs
+    """
+    renames = plan_zip_renames(path)[0]
+    if not renames or dry_run:
+        return renames
+
+    def rename(name):
+        top, sep, rest = name.partition('/')
+        if not sep:
+            return name
+        return renames.get(top, top) + sep + rest
+
+    tmp_path = path + '.nokdoc.tmp'
+    try:
+        ziputil.copy_renamed(path, tmp_path, rename)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return renames
+
+
+def read_doc_dirname(index_path):
+    """
+    Reads the title off a bounded prefix of a doc index.html
+    returns: tuple (new dir name or None, seconds spent reading)
+    """
+    start = time.monotonic()
+    try:
+        with open(index_path, 'rb') as f:
+            content = f.read(TITLE_READ_SIZE).decode('utf8', 'replace')
+    except OSError:
+        return None, time.monotonic() - start
+    return html_doc_dirname(content), time.monotonic() - start
+
+
+def plan_dir_renames(dir_path, workers=8):
+    """
+    Reads titles of the docs dirs inside `dir_path` in parallel and plans
+    their renames.
+    returns: tuple (dict {dir: new name}, dict {dir: new name or None},
+                    dict {dir: seconds spent reading its title})
+    """
+    entries = os.listdir(dir_path)
+    dirs = [d for d in entries
+            if os.path.isfile(os.path.join(dir_path, d, 'index.html'))]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            read_doc_dirname,
+            [os.path.join(dir_path, d, 'index.html') for d in dirs]))
+    dirnames = {d: name for d, (name, _) in zip(dirs, results)}
+    timings = {d: elapsed for d, (_, elapsed) in zip(dirs, results)}
+    return plan_renames(dirnames, entries), dirnames, timings
+
+
+def apply_dir_renames(dir_path, renames):
+    """
+    Renames docs dirs according to a plan made by plan_dir_renames().
+    Dirs taking a name of another renamed dir are moved through
+    a temporary name first.
+    """
+    staged = {}
+    for d, new_name in renames.items():
+        src = os.path.join(dir_path, d)
+        if new_name in renames:
+            # the name is still taken by a dir yet to be renamed
+            tmp = '{}.nokdoc-tmp'.format(src)
+            os.rename(src, tmp)
+            staged[tmp] = new_name
+        else:
+            os.rename(src, os.path.join(dir_path, new_name))
+    for tmp, new_name in staged.items():
+        os.rename(tmp, os.path.join(dir_path, new_name))
+
+
+def echo_renames(renames, dirnames):
+    for d in sorted(dirnames):
+        if d in renames:
+            click.echo('    {} --> {}'.format(d, renames[d]))
+        elif not dirnames[d]:
+            click.echo('    {} (no title found, skipped)'.format(d))
+
+
+def echo_title_timings(timings, slowest=5):
+    if not timings:
+        return
+    total = sum(timings.values())
+    click.echo('\n  Read {} titles in {:.2f}s of file reads '
+               '(avg {:.1f}ms, max {:.1f}ms)'.format(
+                   len(timings), total, total / len(timings) * 1000,
+                   max(timings.values()) * 1000))
+    click.echo('  Slowest reads:')
+    for d in sorted(timings, key=timings.get, reverse=True)[:slowest]:
+        click.echo('    {:8.1f}ms  {}'.format(timings[d] * 1000, d))
+
+
+@cli.command()
+@click.pass_context
+@click.option('-p', '--path', default='.',
+              help='Path to the zip archive or to directory with unzipped Nuage docs folders')
+@click.option('-w', '--workers', default=8, type=click.IntRange(1, 64),
+              help='Number of index.html files read in parallel. '
+              'Defaults to 8')
+@click.option('--dry-run', is_flag=True,
+              help='Only report the planned renames')
+def htmlfix(ctx, path, workers, dry_run):
+    '''
+    Renames Nuage documentation directories from DOC-ID to TITLE
+    '''
+
+    click.echo('\n  ####### HTML DOC FIX #######')
+
+    if zipfile.is_zipfile(path):
+        click.echo('\n  Processing a zip archive "{}"...'.format(path))
+        try:
+            if dry_run:
+                renames, dirnames = plan_zip_renames(path)
+            else:
+                renames = fix_zip_contents(path)
+        except (zipfile.BadZipFile, OSError) as e:
+            click.echo('  Failed to rewrite the zip file: {}'.format(e))
+            os.sys.exit(1)
+        if dry_run:
+            click.echo('  Planned renames:')
+            echo_renames(renames, dirnames)
+        elif not renames:
+            click.echo('  Nothing to rename in the archive')
+        else:
+            click.echo('  Renamed {} doc dirs in the archive'
+                       '\n    --> {}'.format(len(renames),
+                                            os.path.abspath(path)))
+
+    # option2: process directory with docs
+    if os.path.isdir(path):
+        click.echo(
+            '\n  Processing a directory "{}" with docs inside...'.format(path))
+        renames, dirnames, timings = plan_dir_renames(path, workers)
+        if dry_run:
+            click.echo('  Planned renames:')
+            echo_renames(renames, dirnames)
+        else:
+            try:
+                apply_dir_renames(path, renames)
+            except OSError as e:
+                click.echo('  Failed to rename doc dirs: {}'.format(e))
+                os.sys.exit(1)
+            click.echo('  Renamed {} doc dirs in the "{}" directory...'.format(
+                len(renames), os.path.abspath(path)))
+        echo_title_timings(timings)
+
+
+@cli.command()
+@click.pass_context
+@click.argument('paths', nargs=-1, required=True,
+                type=click.Path(exists=True, file_okay=False))
+@click.option('-p', '--product', default=None,
+              help='Product of the indexed docs. Taken from the collection '
+              'dir names (nokdoc__PRODUCT__RELEASE__...) by default')
+@click.option('-r', '--release', default=None,
+              help='Release of the indexed docs. Taken from the collection '
+              'dir names by default')
+@click.option('-w', '--workers', default=8, type=click.IntRange(1, 64),
+              help='Number of files read in parallel. Defaults to 8')
+@click.option('--db', default=None, type=click.Path(dir_okay=False),
+              help='Path to the index database')
+def index(ctx, paths, product, release, workers, db):
+    """
+    Builds a full-text index over unpacked HTML collections
+    """
+    click.echo('\n  ####### INDEX #######')
+    try:
+        doc_index = DocIndex(db or ctx.obj['INDEX_PATH'])
+    except SearchError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(1)
+    for path in paths:
+        start = time.monotonic()
+        click.echo('\n  Indexing "{}"...'.format(os.path.abspath(path)))
+        stats = doc_index.update(path, product and product.lower(), release,
+                                 workers)
+        click.echo('  Indexed {} new or changed files, {} unchanged, '
+                   '{} removed in {:.1f}s'.format(
+                       stats.indexed, stats.unchanged, stats.removed,
+                       time.monotonic() - start))
+        if stats.failed:
+            click.echo('  Failed to read {} files'.format(stats.failed))
+    click.echo('\n  Index contents:')
+    for p, r, n in doc_index.stats():
+        click.echo('    {:<14} {:<14} {} files'.format(p or '-', r or '-', n))
+    doc_index.close()
+
+
+@cli.command()
+@click.pass_context
+@click.argument('query', nargs=-1, required=True)
+@click.option('-p', '--product', default=None,
+              help='Search in the docs of a given product only')
+@click.option('-r', '--release', default=None,
+              help='Search in the docs of a given release only')
+@click.option('-n', '--limit', default=20, type=click.IntRange(1),
+              help='Max number of hits shown. Defaults to 20')
+@click.option('--db', default=None, type=click.Path(dir_okay=False),
+              help='Path to the index database')
+def search(ctx, query, product, release, limit, db):
+    """
+    Searches the docs indexed with the "index" command
+    """
+    query = ' '.join(query)
+    start = time.monotonic()
+    try:
+        doc_index = DocIndex(db or ctx.obj['INDEX_PATH'])
+        hits = doc_index.search(query, product and product.lower(), release,
+                                limit)
+    except SearchError as e:
+        click.echo('  {}\n  Execution aborted.'.format(e))
+        os.sys.exit(1)
+    elapsed = time.monotonic() - start
+    doc_index.close()
+
+    click.echo('\n  ####### SEARCH #######')
+    for i, hit in enumerate(hits, 1):
+        tags = ' '.join(t for t in (hit.product.upper(), hit.release) if t)
+        click.echo('\n  {}. {}{}'.format(
+            i, click.style(hit.title, bold=True),
+            '  [{}]'.format(tags) if tags else ''))
+        click.echo('     {}'.format(hit.path))
+        snippet = hit.snippet.replace(
+            HIT_START, click.style('', bold=True, reset=False)
+        ).replace(HIT_END, click.style('', reset=True))
+        click.echo('     {}'.format(snippet))
+    click.echo('\n  {} hits for "{}" in {:.0f}ms'.format(
+        len(hits), query, elapsed * 1000))
@@ -0,0 +1,208 @@
+"""
+Per-phase timing and HTTP instrumentation of a nokdoc run.
+
+Phases are timed with the phase() context manager wherever the work is
+done. Nested phases are accounted exclusively: the time spent in an inner
+phase is not counted for the outer one. Phases of concurrent threads are
+summed, so their total might exceed the wall time of the run.
+Instrumentation is a no-op until enable() is called.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# profiler of the current run, None when profiling is disabled
+active = None
+_exhausted = object()
+
+
+class Profiler(object):
+    """
+    Collects phase timings, HTTP figures and arbitrary counters
+    """
+
+    def __init__(self, command=''):
+        self.command = command
+        self.started = time.time()
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # phase name: [calls, seconds, max seconds of a call]
+        self.phases = defaultdict(lambda: [0, 0.0, 0.0])
+        self.counters = defaultdict(int)
+        self.statuses = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._local.__dict__.setdefault('stack', [])
+        # [name, start, time spent in nested phases]
+        frame = [name, time.monotonic(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.monotonic() - frame[1]
+            if stack:
+                stack[-1][2] += elapsed
+            own = elapsed - frame[2]
+            with self._lock:
+                stats = self.phases[name]
+                stats[0] += 1
+                stats[1] += own
+                stats[2] = max(stats[2], own)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def response_hook(self, r, *args, **kwargs):
+        """
+        requests response hook counting the requests and received bytes.
+        Streamed responses are not read here, their size is taken from
+        the Content-Length header
+        """
+        if kwargs.get('stream'):
+            size = int(r.headers.get('Content-Length') or 0)
+        else:
+            size = len(r.content)
+        with self._lock:
+            self.counters['http requests'] += 1
+            self.counters['http bytes'] += size
+            self.statuses[r.status_code] += 1
+
+    def wall_time(self):
+        return time.monotonic() - self._start
+
+    def trace(self):
+        """
+        returns: dict with all the figures of the run
+        """
+        with self._lock:
+            return {'command': self.command,
+                    'started': self.started,
+                    'wall_time': self.wall_time(),
+                    'phases': {name: {'calls': calls, 'seconds': seconds,
+                                      'max_seconds': longest}
+                               for name, (calls, seconds, longest)
+                               in self.phases.items()},
+                    'counters': dict(self.counters),
+                    'http_statuses': {str(status): n for status, n
+                                      in self.statuses.items()}}
+
+    def summary(self):
+        """
+        returns: list of lines of the summary table
+        """
+        trace = self.trace()
+        lines = ['{:<28} {:>7} {:>10} {:>10}'.format(
+            'phase', 'calls', 'total, s', 'max, s')]
+        for name, stats in sorted(trace['phases'].items(),
+                                  key=lambda p: -p[1]['seconds']):
+            lines.append('{:<28} {:>7} {:>10.3f} {:>10.3f}'.format(
+                name, stats['calls'], stats['seconds'],
+                stats['max_seconds']))
+        lines.append('')
+        for name, value in sorted(trace['counters'].items()):
+            lines.append('{:<28} {:>7}'.format(name, value))
+        if trace['http_statuses']:
+            lines.append('{:<28} {}'.format('http statuses', ', '.join(
+                '{}: {}'.format(status, n) for status, n
+                in sorted(trace['http_statuses'].items()))))
+        lines.append('{:<28} {:>7.3f}'.format('wall time, s',
+                                             trace['wall_time']))
+        return lines
+
+    def prometheus(self):
+        """
+        returns: the figures in the Prometheus text exposition format
+        """
+        trace = self.trace()
+        cmd = trace['command']
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append('# HELP nokdoc_{} {}'.format(name, description))
+            lines.append('# TYPE nokdoc_{} {}'.format(name, kind))
+            for labels, value in samples:
+                labels = dict(labels, command=cmd)
+                lines.append('nokdoc_{}{{{}}} {}'.format(name, ','.join(
+                    '{}="{}"'.format(k, str(v).replace('"', '\\"'))
+                    for k, v in sorted(labels.items())), value))
+
+        metric('phase_seconds', 'gauge', 'Time spent in a phase.',
+               [({'phase': name}, stats['seconds'])
+                for name, stats in sorted(trace['phases'].items())])
+        metric('phase_calls', 'gauge', 'Number of times a phase ran.',
+               [({'phase': name}, stats['calls'])
+                for name, stats in sorted(trace['phases'].items())])
+        metric('events', 'gauge', 'Counted events of the run.',
+               [({'event': name}, value)
+                for name, value in sorted(trace['counters'].items())])
+        metric('http_responses', 'gauge', 'HTTP responses by status code.',
+               [({'code': status}, n)
+                for status, n in sorted(trace['http_statuses'].items())])
+        metric('wall_seconds', 'gauge', 'Wall time of the run.',
+               [({}, trace['wall_time'])])
+        metric('last_run_timestamp_seconds', 'gauge',
+               'Start time of the run.', [({}, trace['started'])])
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Writes the figures to `path`, in the Prometheus textfile format
+        if the file name ends with .prom, as json otherwise.
+        The file is replaced atomically for the collectors reading it
+        """
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            if path.endswith('.prom'):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.trace(), f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def enable(command=''):
+    global active
+    active = Profiler(command)
+    return active
+
+
+@contextmanager
+def phase(name):
+    """
+    Times a phase of the run if profiling is enabled
+    """
+    if active is None:
+        yield
+        return
+    with active.phase(name):
+        yield
+
+
+def count(name, n=1):
+    if active is not None:
+        active.count(name, n)
+
+
+def timed_iter(name, iterable):
+    """
+    Accounts the time spent producing the items of a lazy iterable,
+    like the docs parsed as they are rendered
+    """
+    if active is None:
+        return iterable
+
+    def timed():
+        it = iter(iterable)
+        while True:
+            with active.phase(name):
+                item = next(it, _exhausted)
+            if item is _exhausted:
+                return
+            yield item
+    return timed()
@@ -0,0 +1,241 @@
+"""
+Local full-text index over downloaded HTML documentation.
+
+HTML files of unpacked collections are stored in a SQLite FTS5 table
+along with the product and the release they belong to. Indexing is
+incremental: files with unchanged mtime and size are not read again,
+files gone from the indexed dirs are dropped from the index.
+"""
+import html
+import os
+import re
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# markers around the matched terms in the snippets
+HIT_START = '\x02'
+HIT_END = '\x03'
+
+html_exts = ('.html', '.htm')
+collection_formats = ('PDF', 'HTML', 'ZIP', 'ALL')
+
+title_patt = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+skipped_elements_patt = re.compile(r'<(script|style|title)\b.*?</\1\s*>',
+                                   re.S | re.I)
+tag_patt = re.compile(r'<[^>]+>')
+space_patt = re.compile(r'\s+')
+collection_date_patt = re.compile(r'\d{4}_\d{2}_\d{2}$')
+
+SearchHit = namedtuple('SearchHit', ['path', 'title', 'product', 'release',
+                                     'snippet', 'rank'])
+IndexStats = namedtuple('IndexStats', ['indexed', 'unchanged', 'removed',
+                                       'failed'])
+
+
+class SearchError(Exception):
+    """
+    Raised when the index can not be built or queried
+    """
+
+
+def collection_tags(name):
+    """
+    Extracts product and release out of a collection name as produced
+    by getdocs, e.g. nokdoc__7750SR__14.0.R4__HTML__2017_04_01
+    returns: tuple (product, release) or None if the name does not match
+    """
+    if name.lower().endswith('.zip'):
+        name = name[:-4]
+    parts = name.split('__')
+    if len(parts) < 2 or parts[0] != 'nokdoc' or not parts[1]:
+        return None
+    release = ''
+    if len(parts) > 2 and parts[2] not in collection_formats and \
+            not collection_date_patt.match(parts[2]):
+        release = parts[2]
+    return parts[1].lower(), release
+
+
+def path_tags(path, root):
+    """
+    Looks for the closest dir named after a collection among the parents
+    of `path` up to `root` (including `root` itself).
+    returns: tuple (product, release), empty strings if nothing matched
+    """
+    root = os.path.abspath(root)
+    d = os.path.dirname(os.path.abspath(path))
+    while True:
+        tags = collection_tags(os.path.basename(d))
+        if tags:
+            return tags
+        if d == root or os.path.dirname(d) == d:
+            return '', ''
+        d = os.path.dirname(d)
+
+
+def html_text(content):
+    """
+    returns: tuple (title, plain text) of an HTML document
+    """
+    m = title_patt.search(content)
+    title = space_patt.sub(' ', html.unescape(m.group(1))).strip() \
+        if m else ''
+    text = tag_patt.sub(' ', skipped_elements_patt.sub(' ', content))
+    return title, space_patt.sub(' ', html.unescape(text)).strip()
+
+
+def read_html(path):
+    with open(path, encoding='utf8', errors='replace') as f:
+        return html_text(f.read())
+
+
+def fts_query(query):
+    """
+    Quotes every term of a query, used when the query is not a valid
+    FTS5 expression (e.g. contains dashes like in CLI commands)
+    """
+    return ' '.join('"{}"'.format(term.replace('"', '""'))
+                    for term in query.split())
+
+
+class DocIndex(object):
+    """
+    Full-text index of HTML docs stored in a SQLite database
+    """
+
+    def __init__(self, path):
+        self.path = path
+        index_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        self._db = sqlite3.connect(path)
+        try:
+            self._db.execute('CREATE VIRTUAL TABLE IF NOT EXISTS docs '
+                             'USING fts5(title, body)')
+        except sqlite3.OperationalError as e:
+            raise SearchError('SQLite FTS5 extension is not available: '
+                              '{}'.format(e))
+        self._db.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'id INTEGER PRIMARY KEY, '
+                         'path TEXT UNIQUE, '
+                         'mtime REAL, '
+                         'size INTEGER, '
+                         'product TEXT, '
+                         'release TEXT, '
+                         'title TEXT)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS files_product_release '
+                         'ON files (product, release)')
+        self._db.commit()
+
+    def _remove(self, file_id):
+        self._db.execute('DELETE FROM docs WHERE rowid = ?', (file_id,))
+        self._db.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+    def update(self, root, product=None, release=None, workers=8):
+        """
+        Indexes new and changed HTML files found under `root`.
+        Product and release are taken from the collection dir names unless
+        given explicitly.
+        returns: IndexStats
+        """
+        root = os.path.abspath(root)
+        known = {}
+        for file_id, path, mtime, size, f_product, f_release in \
+                self._db.execute('SELECT id, path, mtime, size, product, '
+                                 'release FROM files WHERE path >= ? AND '
+                                 'path < ?', (root + os.sep,
+                                              root + chr(ord(os.sep) + 1))):
+            known[path] = (file_id, mtime, size, f_product, f_release)
+
+        changed, unchanged = [], 0
+        for dirpath, _, fnames in os.walk(root):
+            for fname in fnames:
+                if not fname.lower().endswith(html_exts):
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                tags = path_tags(path, root)
+                tags = (tags[0] if product is None else product,
+                        tags[1] if release is None else release)
+                entry = known.pop(path, None)
+                if entry and entry[1:] == (st.st_mtime, st.st_size) + tags:
+                    unchanged += 1
+                    continue
+                changed.append((path, st, tags, entry and entry[0]))
+
+        def read(item):
+            try:
+                return read_html(item[0])
+            except OSError:
+                return None
+
+        indexed = failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (path, st, tags, file_id), result in zip(
+                    changed, executor.map(read, changed)):
+                if file_id is not None:
+                    self._remove(file_id)
+                if result is None:
+                    failed += 1
+                    continue
+                title, body = result
+                cur = self._db.execute(
+                    'INSERT INTO files (path, mtime, size, product, release, '
+                    'title) VALUES (?, ?, ?, ?, ?, ?)',
+                    (path, st.st_mtime, st.st_size, tags[0], tags[1],
+                     title or os.path.basename(path)))
+                self._db.execute('INSERT INTO docs (rowid, title, body) '
+                                 'VALUES (?, ?, ?)',
+                                 (cur.lastrowid, title, body))
+                indexed += 1
+
+        # files removed from disk since the previous run
+        for file_id, _, _, _, _ in known.values():
+            self._remove(file_id)
+        self._db.commit()
+        return IndexStats(indexed, unchanged, len(known), failed)
+
+    def search(self, query, product=None, release=None, limit=20):
+        """
+        Runs a full-text query, hits are ranked by bm25 with matches in
+        the titles weighted higher than in the bodies.
+        returns: list of SearchHit
+        """
+        sql = ('SELECT files.path, files.title, files.product, '
+               'files.release, snippet(docs, 1, ?, ?, \'...\', 16), '
+               'bm25(docs, 10.0, 1.0) AS rank '
+               'FROM docs JOIN files ON files.id = docs.rowid '
+               'WHERE docs MATCH ?')
+        params = [HIT_START, HIT_END]
+        filters = []
+        if product:
+            filters.append(' AND files.product = ?')
+        if release:
+            filters.append(' AND files.release = ?')
+        tail = ''.join(filters) + ' ORDER BY rank LIMIT ?'
+        extra = [p for p in (product, release) if p] + [limit]
+        try:
+            rows = self._db.execute(sql + tail,
+                                    params + [query] + extra).fetchall()
+        except sqlite3.OperationalError:
+            try:
+                rows = self._db.execute(
+                    sql + tail, params + [fts_query(query)] + extra).fetchall()
+            except sqlite3.OperationalError as e:
+                raise SearchError('Invalid query "{}": {}'.format(query, e))
+        return [SearchHit(*row) for row in rows]
+
+    def stats(self):
+        """
+        returns: list of tuples (product, release, number of files)
+        """
+        return self._db.execute('SELECT product, release, COUNT(*) '
+                                'FROM files GROUP BY product, release '
+                                'ORDER BY product, release').fetchall()
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,177 @@
+"""
+Raw copy of zip archive members.
+
+Members are copied between archives without being decompressed and
+compressed again: their compressed data is streamed as is, only the
+headers are written anew, so members might be renamed on the way.
+Zip64 extensions are used when sizes or offsets exceed 4GB.
+"""
+import struct
+import zipfile
+
+# size of the buffer used to stream members data
+COPY_BUFFER = 1024 * 1024
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+local_header_struct = struct.Struct('<4sHHHHHLLLHH')
+central_header_struct = struct.Struct('<4sBBHHHHHLLLHHHHHLL')
+end_struct = struct.Struct('<4sHHHHLLH')
+zip64_end_struct = struct.Struct('<4sQBBHLLQQQQ')
+zip64_locator_struct = struct.Struct('<4sLQL')
+
+
+def data_offset(fp, info):
+    """
+    returns: offset of the compressed data of a member in the archive file
+    """
+    fp.seek(info.header_offset)
+    header = fp.read(local_header_struct.size)
+    fields = local_header_struct.unpack(header)
+    if fields[0] != b'PK\x03\x04':
+        raise zipfile.BadZipFile('Bad local header of {}'.format(
+            info.filename))
+    return info.header_offset + local_header_struct.size + \
+        fields[9] + fields[10]
+
+
+def dos_datetime(date_time):
+    """
+    Packs (Y, M, D, h, m, s) tuple into dos (time, date) pair
+    """
+    y, mo, d, h, mi, sec = date_time
+    return (h << 11 | mi << 5 | sec // 2,
+            (max(y, 1980) - 1980) << 9 | mo << 5 | d)
+
+
+class RawZipWriter(object):
+    """
+    Writes a zip archive out of the raw members of other archives.
+
+        with open(dst, 'wb') as fp:
+            writer = RawZipWriter(fp)
+            writer.copy(src_fp, info, new_name)
+            writer.close()
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self._entries = []
+
+    def copy(self, src_fp, info, arcname=None):
+        """
+        Copies a member described by ZipInfo `info` from the archive file
+        `src_fp` under a new name `arcname`
+        """
+        src_fp.seek(data_offset(src_fp, info))
+        self.write_raw(info, src_fp, arcname)
+
+    def write_raw(self, info, data_fp, arcname=None):
+        """
+        Writes a member described by ZipInfo `info` whose compressed data
+        is read from the current position of the file `data_fp`
+        """
+        if arcname is None:
+            arcname = info.filename
+        try:
+            name = arcname.encode('ascii')
+            flags = info.flag_bits & ~0x800
+        except UnicodeEncodeError:
+            name = arcname.encode('utf8')
+            flags = info.flag_bits | 0x800
+        # sizes go to the local header, no data descriptor follows the data
+        flags &= ~0x08
+
+        offset = self.fp.tell()
+        mtime, mdate = dos_datetime(info.date_time)
+        zip64 = info.compress_size >= ZIP64_LIMIT or \
+            info.file_size >= ZIP64_LIMIT
+        extra = b''
+        csize, usize = info.compress_size, info.file_size
+        if zip64:
+            extra = struct.pack('<HHQQ', 1, 16, info.file_size,
+                                info.compress_size)
+            csize = usize = ZIP64_LIMIT
+        version = max(info.extract_version, 45 if zip64 else 20)
+        self.fp.write(local_header_struct.pack(
+            b'PK\x03\x04', version, flags, info.compress_type, mtime, mdate,
+            info.CRC, csize, usize, len(name), len(extra)))
+        self.fp.write(name)
+        self.fp.write(extra)
+
+        remaining = info.compress_size
+        while remaining:
+            chunk = data_fp.read(min(COPY_BUFFER, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile('Truncated data of {}'.format(
+                    info.filename))
+            self.fp.write(chunk)
+            remaining -= len(chunk)
+
+        self._entries.append((info, name, flags, version, offset))
+
+    def close(self):
+        """
+        Writes the central directory, the archive is complete afterwards
+        """
+        cd_offset = self.fp.tell()
+        for info, name, flags, version, offset in self._entries:
+            mtime, mdate = dos_datetime(info.date_time)
+            zip64_fields = []
+            usize, csize, header_offset = \
+                info.file_size, info.compress_size, offset
+            if usize >= ZIP64_LIMIT:
+                zip64_fields.append(usize)
+                usize = ZIP64_LIMIT
+            if csize >= ZIP64_LIMIT:
+                zip64_fields.append(csize)
+                csize = ZIP64_LIMIT
+            if header_offset >= ZIP64_LIMIT:
+                zip64_fields.append(header_offset)
+                header_offset = ZIP64_LIMIT
+            extra = b''
+            if zip64_fields:
+                extra = struct.pack('<HH' + 'Q' * len(zip64_fields), 1,
+                                    8 * len(zip64_fields), *zip64_fields)
+                version = max(version, 45)
+            self.fp.write(central_header_struct.pack(
+                b'PK\x01\x02', max(info.create_version, version),
+                info.create_system, version, flags, info.compress_type,
+                mtime, mdate, info.CRC, csize, usize, len(name), len(extra),
+                0, 0, info.internal_attr, info.external_attr,
+                header_offset))
+            self.fp.write(name)
+            self.fp.write(extra)
+        cd_size = self.fp.tell() - cd_offset
+
+        count = len(self._entries)
+        if count >= ZIP64_COUNT_LIMIT or cd_offset >= ZIP64_LIMIT or \
+                cd_size >= ZIP64_LIMIT:
+            zip64_end_offset = self.fp.tell()
+            self.fp.write(zip64_end_struct.pack(
+                b'PK\x06\x06', zip64_end_struct.size - 12, 45, 0, 45, 0, 0,
+                count, count, cd_size, cd_offset))
+            self.fp.write(zip64_locator_struct.pack(
+                b'PK\x06\x07', 0, zip64_end_offset, 1))
+            count = min(count, 0xFFFF)
+            cd_size = min(cd_size, ZIP64_LIMIT)
+            cd_offset = min(cd_offset, ZIP64_LIMIT)
+        self.fp.write(end_struct.pack(b'PK\x05\x06', 0, 0, count, count,
+                                      cd_size, cd_offset, 0))
+
+
+def copy_renamed(src_path, dst_path, rename):
+    """
+    Copies every member of `src_path` archive into a new `dst_path` archive
+    under the name returned by `rename(name)`, data of the members is
+    never decompressed
+    """
+    with open(src_path, 'rb') as src_fp, \
+            zipfile.ZipFile(src_fp) as zf, \
+            open(dst_path, 'wb') as dst_fp:
+        writer = RawZipWriter(dst_fp)
+        for info in zf.infolist():
+            writer.copy(src_fp, info, rename(info.filename))
+        writer.close()
+
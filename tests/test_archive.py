@@ -0,0 +1,135 @@
+"""
+Ingestion, restore and extraction of zips in the deduplicating store.
+"""
+import hashlib
+import os
+import zipfile
+
+import pytest
+
+from nokdoc import archive
+from nokdoc.download import write_checksum
+
+SHARED = os.urandom(100000)
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return path
+
+
+def sha256_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = archive.ZipArchive(str(tmp_path / 'store'))
+    yield store
+    store.close()
+
+
+def test_restore_byte_for_byte(store, tmp_path):
+    path = make_zip(str(tmp_path / 'a.zip'),
+                    [('doc/index.html', b'<html/>'), ('doc/data', SHARED),
+                     ('empty', b'')])
+    store.add(path)
+    restored = str(tmp_path / 'restored.zip')
+    assert store.restore('a.zip', restored) == sha256_file(path)
+    assert open(restored, 'rb').read() == open(path, 'rb').read()
+    assert store.members('a.zip') == [('doc/index.html', 7),
+                                      ('doc/data', len(SHARED)),
+                                      ('empty', 0)]
+
+
+def test_shared_members_stored_once(store, tmp_path):
+    a = make_zip(str(tmp_path / 'a.zip'), [('data', SHARED), ('a', b'a')])
+    b = make_zip(str(tmp_path / 'b.zip'), [('copy', SHARED), ('b', b'b')])
+    assert store.add(a)[0] == 2
+    assert store.add(b)[0] == 1
+    assert store.stats()[2] == 3
+
+    for name, path in (('a.zip', a), ('b.zip', b)):
+        restored = str(tmp_path / 'restored.zip')
+        store.restore(name, restored)
+        assert open(restored, 'rb').read() == open(path, 'rb').read()
+
+
+def test_extract(store, tmp_path):
+    path = make_zip(str(tmp_path / 'a.zip'), [('a', b'a'), ('data', SHARED)])
+    store.add(path)
+    out = str(tmp_path / 'data')
+    store.extract('a.zip', 'data', out)
+    assert open(out, 'rb').read() == SHARED
+    with pytest.raises(archive.ArchiveError):
+        store.extract('a.zip', 'missing', out)
+
+
+def test_colliding_key_gets_own_blob(store, tmp_path):
+    a = make_zip(str(tmp_path / 'a.zip'), [('data', SHARED)])
+    store.add(a)
+    key = archive.member_key(zipfile.ZipFile(a).getinfo('data'))
+    # another blob that happens to share CRC32, sizes and method
+    store._db.execute('UPDATE blobs SET sha256 = ? WHERE key = ?',
+                      ('0' * 64, key))
+    store._db.commit()
+
+    b = make_zip(str(tmp_path / 'b.zip'), [('data', SHARED)])
+    assert store.add(b)[0] == 1
+    qualified = store._db.execute(
+        'SELECT blob FROM members WHERE zip_id = '
+        '(SELECT id FROM zips WHERE name = ?)', ('b.zip',)).fetchone()[0]
+    assert qualified.startswith(key + '-')
+    assert archive.parse_key(qualified) == archive.parse_key(key)
+
+    restored = str(tmp_path / 'restored.zip')
+    store.restore('b.zip', restored)
+    assert open(restored, 'rb').read() == open(b, 'rb').read()
+    out = str(tmp_path / 'data')
+    store.extract('b.zip', 'data', out)
+    assert open(out, 'rb').read() == SHARED
+
+
+def test_checksum_mismatch_rejected(store, tmp_path):
+    path = make_zip(str(tmp_path / 'a.zip'), [('data', SHARED)])
+    write_checksum(path, '0' * 64)
+    with pytest.raises(archive.ArchiveError):
+        store.add(path)
+    assert store.zips() == []
+
+    write_checksum(path, sha256_file(path))
+    store.add(path)
+    assert [z[0] for z in store.zips()] == ['a.zip']
+
+
+def test_corrupt_blob_detected(store, tmp_path):
+    path = make_zip(str(tmp_path / 'a.zip'), [('data', SHARED)])
+    store.add(path)
+    key = archive.member_key(zipfile.ZipFile(path).getinfo('data'))
+    with open(store.blob_path(key), 'r+b') as f:
+        f.write(b'\0' * 16)
+
+    restored = str(tmp_path / 'restored.zip')
+    with pytest.raises(archive.ArchiveError):
+        store.restore('a.zip', restored)
+    assert not os.path.exists(restored)
+    with pytest.raises(archive.ArchiveError):
+        store.extract('a.zip', 'data', str(tmp_path / 'data'))
+
+
+def test_replace_and_remove_prune_blobs(store, tmp_path):
+    path = make_zip(str(tmp_path / 'a.zip'), [('data', SHARED), ('a', b'a')])
+    store.add(path)
+    make_zip(path, [('data', SHARED), ('a', b'changed')])
+    store.add(path)
+    assert store.stats()[:3] == (1, os.path.getsize(path), 2)
+
+    assert store.remove('a.zip') == 2
+    assert store.stats()[2] == 0
+    assert [f for _, _, files in os.walk(store.blobs_dir)
+            for f in files] == []
+    with pytest.raises(archive.ArchiveError):
+        store.remove('a.zip')
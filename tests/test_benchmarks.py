@@ -0,0 +1,59 @@
+"""
+The benchmark suite measures the shipped parser against the legacy one
+and compares the results with a baseline.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from nokdoc.nokdoc import parseDocdata
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks')
+
+
+@pytest.fixture
+def bench_parse(monkeypatch):
+    monkeypatch.syspath_prepend(BENCHMARKS_DIR)
+    import bench_parse
+    return bench_parse
+
+
+def test_legacy_parser_parses_the_same_docs(bench_parse):
+    docdata = bench_parse.make_docdata(200)
+    bench_parse.legacy_parseDocdata(docdata, check_permissions=True)
+    legacy = bench_parse.legacy_parseDocdata(docdata)
+
+    permissions = parseDocdata(docdata, logged_in=True,
+                               check_permissions=True)
+    assert permissions == bench_parse.docs_permissions
+    docs = parseDocdata(docdata, logged_in=True, permissions=permissions)
+    # legacy docs are dicts {doc_id: doc properties}
+    assert [tuple(doc) for doc in docs] == [
+        (doc_id, d['title'], d['issue'], d['issue_date'], tuple(d['links']),
+         d['restricted'])
+        for doc in legacy for doc_id, d in doc.items()]
+
+
+def run(tmp_path, *args):
+    return subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, 'run.py'), '-k',
+         'parseDocdata', '--sizes', '100', '-n', '1', '-b',
+         str(tmp_path / 'baseline.json')] + list(args),
+        stdout=subprocess.PIPE, universal_newlines=True)
+
+
+def test_baseline(tmp_path):
+    result = run(tmp_path)
+    assert result.returncode == 0
+    assert 'the comparison is skipped' in result.stdout
+
+    assert run(tmp_path, '--save-baseline').returncode == 0
+    assert (tmp_path / 'baseline.json').is_file()
+    # a generous threshold, timings of a single run are noisy
+    result = run(tmp_path, '-t', '100')
+    assert result.returncode == 0
+    assert 'the comparison is skipped' not in result.stdout
+    assert 'parseDocdata[100]' in result.stdout
@@ -0,0 +1,76 @@
+"""
+On-disk cache of the server responses.
+"""
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from nokdoc import nokdoc
+from nokdoc.cache import ResponseCache
+
+URL = 'https://infoproducts.example.com/get_doc_list.pl'
+RESP = {'proddata': {'docdata': '<tr><td>DN1</td></tr>'}}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache' / 'responses.sqlite')
+
+
+def test_round_trip(path):
+    cache = ResponseCache(path)
+    assert cache.get(URL, {'release': '15.0'}) is None
+    cache.set(URL, {'release': '15.0'}, RESP)
+    assert cache.get(URL, {'release': '15.0'}) == RESP
+    assert cache.get(URL, {'release': '14.0'}) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # responses survive the process
+    assert ResponseCache(path).get(URL, {'release': '15.0'}) == RESP
+
+
+def test_namespaces(path):
+    ResponseCache(path, namespace='user').set(URL, None, RESP)
+    assert ResponseCache(path).get(URL, None) is None
+    assert ResponseCache(path, namespace='user').get(URL, None) == RESP
+
+
+def test_expiry_and_refresh(path):
+    cache = ResponseCache(path, ttl=60)
+    cache.set(URL, None, RESP)
+    assert ResponseCache(path, refresh=True).get(URL, None) is None
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get(URL, None) is None
+    assert cache.stats()['expired'] == 1
+
+
+def test_eviction_of_least_recently_used(path):
+    cache = ResponseCache(path)
+    for release in ('13.0', '14.0', '15.0'):
+        cache.set(URL, {'release': release}, RESP)
+        time.sleep(0.01)
+    cache.get(URL, {'release': '13.0'})
+    cache.max_size = cache.stats()['size'] - 1
+    cache.set(URL, {'release': '16.0'}, RESP)
+
+    assert cache.get(URL, {'release': '13.0'}) == RESP
+    assert cache.get(URL, {'release': '14.0'}) is None
+    assert cache.get(URL, {'release': '15.0'}) is None
+    assert cache.stats()['entries'] == 2
+    assert cache.clear() == 2
+
+
+def test_opened_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    app_dir = tmp_path / 'nokdoc'
+
+    result = CliRunner().invoke(nokdoc.cli, ['htmlfix', '-p',
+                                             str(tmp_path / 'missing')])
+    assert result.exit_code == 0, result.output
+    assert not (app_dir / 'responses.sqlite').exists()
+
+    result = CliRunner().invoke(nokdoc.cli, ['cache', 'stats'])
+    assert result.exit_code == 0, result.output
+    assert (app_dir / 'responses.sqlite').exists()
@@ -0,0 +1,71 @@
+"""
+Bounded capture of the raw server responses.
+"""
+import datetime
+import json
+
+import pytest
+
+from nokdoc import nokdoc
+from nokdoc.capture import ResponseCapture
+
+
+class Request(object):
+    method = 'GET'
+
+
+class Response(object):
+    request = Request()
+    status_code = 200
+    elapsed = datetime.timedelta(seconds=0.25)
+
+    def __init__(self, n, body=None):
+        self.url = 'https://x/get_doc_list.pl?release={}'.format(n)
+        self.content = body if body is not None else \
+            '{{"release": {}}}'.format(n).encode('utf8')
+        self.text = self.content.decode('utf8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def test_last_responses_kept(tmp_path):
+    capture = ResponseCapture(3, path=str(tmp_path / 'responses.log'))
+    for n in range(5):
+        capture.add(Response(n))
+    assert len(capture) == 3
+
+    path = capture.dump()
+    content = open(path, encoding='utf8').read()
+    assert 'release=1' not in content
+    headers = [line for line in content.splitlines()
+               if line.startswith('### ')]
+    assert [h.split()[4] for h in headers] == [
+        'https://x/get_doc_list.pl?release={}'.format(n) for n in (2, 3, 4)]
+    assert headers[0].endswith('-> 200, 14 bytes in 0.250s')
+    assert '{"release": 4}\n' in content
+
+
+def test_bodies_not_copied(tmp_path):
+    capture = ResponseCapture(2)
+    response = Response(0, body='Гайд'.encode('utf8') + b'\xff')
+    capture.add(response)
+    assert capture._responses[0].body is response.content
+
+    # undecodable bytes do not break the dump
+    path = capture.dump(str(tmp_path / 'responses.log'))
+    assert 'Гайд\ufffd' in open(path, encoding='utf8').read()
+
+
+def test_dumped_on_decode_error(tmp_path, monkeypatch):
+    path = str(tmp_path / 'responses.log')
+    monkeypatch.setattr(nokdoc, 'responses_capture',
+                        ResponseCapture(4, path=path))
+
+    assert nokdoc.get_json_resp(Response(1)) == {'release': 1}
+    with pytest.raises(nokdoc.ResponseDecodeError) as e:
+        nokdoc.get_json_resp(Response(2, body=b'<html>maintenance</html>'))
+    assert path in str(e.value)
+    content = open(path, encoding='utf8').read()
+    assert 'release=1' in content
+    assert '<html>maintenance</html>' in content
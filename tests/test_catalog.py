@@ -0,0 +1,62 @@
+"""
+Offline catalog of releases and docs.
+"""
+import pytest
+
+from nokdoc.catalog import Catalog
+
+# docs as the server lists them, sorted by title
+DOCS = [
+    ('DN1', 'Alpha guide', '1', '2017-01-02',
+     [['a.pdf', 'PDF'], ['a.html', 'HTML']], False),
+    ('DN3', 'alpha notes', '2', '2017-03-01', [['n.zip', 'ZIP']], True),
+    ('DN2', 'Beta guide', '1', '2017-02-01', [['b.pdf', 'PDF']], False),
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = Catalog(str(tmp_path / 'catalog' / 'catalog.sqlite'))
+    yield catalog
+    catalog.close()
+
+
+def test_docs_keep_server_order(catalog):
+    catalog.store('7750 SR', '15.0', DOCS, 'digest')
+    docs = list(catalog.docs('7750 SR', '15.0'))
+    assert [d[0] for d in docs] == ['DN1', 'DN3', 'DN2']
+    assert docs[1] == ('DN3', 'alpha notes', '2', '2017-03-01',
+                       (('n.zip', 'ZIP'),), True)
+    assert [d[0] for d in catalog.docs('7750 SR', '15.0',
+                                       sort='issue_date')] == \
+        ['DN3', 'DN2', 'DN1']
+
+
+def test_docs_filtered_by_link_type(catalog):
+    catalog.store('7750 SR', '15.0', DOCS, 'digest')
+    docs = list(catalog.docs('7750 SR', '15.0', link_type='PDF'))
+    assert [(d[0], d[4]) for d in docs] == [
+        ('DN1', (('a.pdf', 'PDF'),)), ('DN2', (('b.pdf', 'PDF'),))]
+
+
+def test_docs_of_all_releases_listed_once(catalog):
+    catalog.store('7750 SR', '14.0', DOCS[:2], 'digest')
+    catalog.store('7750 SR', '15.0', DOCS, 'digest')
+    assert [d[0] for d in catalog.docs('7750 SR')] == ['DN1', 'DN3', 'DN2']
+
+
+def test_only_fetched_releases_listed(catalog):
+    catalog.store('7750 SR', '14.0', DOCS, 'digest')
+    catalog.store('7750 SR', '15.0', [], None)
+    assert catalog.releases('7750 SR') == ['14.0']
+    assert catalog.digests('7750 SR') == {'14.0': 'digest', '15.0': None}
+    assert [s[:3] for s in catalog.stats()] == [('7750 SR', 1, 3)]
+
+
+def test_gone_releases_removed(catalog):
+    catalog.store('7750 SR', '14.0', DOCS, 'digest')
+    catalog.store('7750 SR', '15.0', DOCS[:1], 'digest')
+    catalog.set_releases('7750 SR', ['15.0', '16.0'])
+    assert catalog.releases('7750 SR') == ['15.0']
+    assert list(catalog.docs('7750 SR', '14.0')) == []
+    assert [d[0] for d in catalog.docs('7750 SR')] == ['DN1']
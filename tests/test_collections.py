@@ -0,0 +1,102 @@
+"""
+Polling of the collections prepared by the documentation server.
+"""
+import json
+
+import pytest
+
+from nokdoc import nokdoc
+from nokdoc.capture import ResponseCapture
+
+
+class Clock(object):
+    """
+    Stands for the time module, sleeping only advances the clock
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Response(object):
+    url = 'https://x/chk_col_done.pl'
+    status_code = 200
+
+    def __init__(self, body):
+        self.text = body
+        self.content = body.encode('utf8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class Session(object):
+    def __init__(self, bodies):
+        self.bodies = list(bodies)
+        self.requests = 0
+
+    def get(self, url, params=None):
+        self.requests += 1
+        return Response(self.bodies.pop(0) if self.bodies else
+                        '{"filesize": ""}')
+
+
+@pytest.fixture
+def clock(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(nokdoc, 'time', clock)
+    monkeypatch.setattr(nokdoc, 'responses_capture', ResponseCapture(
+        4, path=str(tmp_path / 'responses.log')))
+    return clock
+
+
+def test_size_once_prepared(clock):
+    s = Session(['{"filesize": ""}', 'junk', '{"filesize": "(0 bytes)"}',
+                 '{"filesize": "(56,950,085 bytes)"}'])
+    assert nokdoc.wait_for_collection(s, 'c.zip', 'user') == 56950085
+    assert s.requests == 4
+    # exponential backoff with a jitter
+    for delay, sleep in zip((2, 4, 8), clock.sleeps):
+        assert delay * 0.5 <= sleep <= delay * 1.5
+
+
+def test_delay_capped(clock):
+    s = Session([])
+    with pytest.raises(nokdoc.NokdocError) as e:
+        nokdoc.wait_for_collection(s, 'c.zip', 'user', timeout=900)
+    assert 'has not been prepared within 900 seconds' in str(e.value)
+    assert max(clock.sleeps) <= 90
+    assert 'responses were saved' not in str(e.value)
+
+
+def test_undecodable_responses_dumped_at_timeout(clock, tmp_path):
+    s = Session(['maintenance'] * 100)
+    with pytest.raises(nokdoc.NokdocError) as e:
+        nokdoc.wait_for_collection(s, 'c.zip', 'user', timeout=10)
+    assert str(tmp_path / 'responses.log') in str(e.value)
+    assert 'maintenance' in (tmp_path / 'responses.log').read_text()
+
+
+def test_collections_manifest(tmp_path):
+    path = tmp_path / 'collections.yml'
+    path.write_text('7750sr:\n'
+                    '  releases: [14.0, 15.0]\n'
+                    '  formats: [pdf, html]\n'
+                    'nsp:\n'
+                    '  releases:\n'
+                    '    -\n'
+                    'nuage: {}\n')
+    assert nokdoc.load_collections_manifest(str(path)) == [
+        ('7750sr', '14.0', 'pdf'), ('7750sr', '14.0', 'html'),
+        ('7750sr', '15.0', 'pdf'), ('7750sr', '15.0', 'html'),
+        ('nsp', '', None), ('nuage', '', None)]
@@ -0,0 +1,207 @@
+"""
+Resumable and rate limited downloads against a local range-capable HTTP
+server.
+"""
+import hashlib
+import http.server
+import os
+import re
+import threading
+import time
+
+import pytest
+import requests
+
+from nokdoc import download
+
+DATA = os.urandom(3 * 1024 * 1024 + 17)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves `server.data` honouring Range requests. The first `server.drops`
+    responses are cut after `server.drop_after` bytes
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.data
+        start, end = 0, len(data) - 1
+        m = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if m:
+            start = int(m.group(1))
+            if m.group(2):
+                end = min(int(m.group(2)), end)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{}'.format(
+                    len(data)))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, end, len(data)))
+        else:
+            self.send_response(200)
+        body = data[start:end + 1]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        with self.server.lock:
+            drop = self.server.drops > 0 and len(body) > self.server.drop_after
+            if drop:
+                self.server.drops -= 1
+        if drop:
+            self.wfile.write(body[:self.server.drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    srv = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    srv.data = DATA
+    srv.drops = 0
+    # past the first chunk read from the network, so some data is kept
+    srv.drop_after = download.CHUNK_SIZE + 1000
+    srv.lock = threading.Lock()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    srv.url = 'http://127.0.0.1:{}/collection.zip'.format(
+        srv.server_address[1])
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def leftovers(path):
+    return sorted(f for f in os.listdir(os.path.dirname(path))
+                  if f != os.path.basename(path))
+
+
+def interrupted_fetch(srv, path, drops, **kwargs):
+    srv.drops = drops
+    with pytest.raises(requests.exceptions.RequestException):
+        download.fetch(requests.Session(), srv.url, path, **kwargs)
+    srv.drops = 0
+
+
+def test_fetch_in_one_go(server, tmp_path):
+    path = str(tmp_path / 'c.zip')
+    received = []
+    digest = download.fetch(requests.Session(), server.url, path,
+                            size=len(DATA), progress=received.append)
+    assert digest == sha256(DATA)
+    assert open(path, 'rb').read() == DATA
+    assert sum(received) == len(DATA)
+    assert leftovers(path) == []
+
+
+def test_resume_single_connection(server, tmp_path):
+    path = str(tmp_path / 'c.zip')
+    interrupted_fetch(server, path, 1, size=len(DATA))
+    assert 0 < os.path.getsize(download.part_path(path)) < len(DATA)
+
+    digest = download.fetch(requests.Session(), server.url, path,
+                            size=len(DATA))
+    assert digest == sha256(DATA)
+    assert download.hash_file(path).hexdigest() == sha256(DATA)
+    assert leftovers(path) == []
+
+
+@pytest.mark.parametrize('connections', [2, 4])
+def test_resume_ranges(server, tmp_path, connections):
+    path = str(tmp_path / 'c.zip')
+    interrupted_fetch(server, path, connections, connections=connections)
+    assert '{}.{}'.format(os.path.basename(download.part_path(path)),
+                          connections - 1) in leftovers(path)
+
+    digest = download.fetch(requests.Session(), server.url, path,
+                            connections=connections)
+    assert digest == sha256(DATA)
+    assert download.hash_file(path).hexdigest() == sha256(DATA)
+    assert leftovers(path) == []
+
+
+def test_resume_with_other_connections(server, tmp_path):
+    path = str(tmp_path / 'c.zip')
+    interrupted_fetch(server, path, 4, connections=4)
+
+    digest = download.fetch(requests.Session(), server.url, path,
+                            connections=2)
+    assert digest == sha256(DATA)
+    assert download.hash_file(path).hexdigest() == sha256(DATA)
+    assert leftovers(path) == []
+
+
+def test_part_of_another_file(server, tmp_path):
+    path = str(tmp_path / 'c.zip')
+    interrupted_fetch(server, path, 1, size=len(DATA))
+
+    # the collection was prepared again and got smaller than the part
+    server.data = os.urandom(50000)
+    digest = download.fetch(requests.Session(), server.url, path,
+                            size=len(server.data))
+    assert digest == sha256(server.data)
+    assert open(path, 'rb').read() == server.data
+    assert leftovers(path) == []
+
+
+def test_part_longer_than_file_of_unknown_size(server, tmp_path):
+    path = str(tmp_path / 'c.zip')
+    interrupted_fetch(server, path, 1)
+
+    server.data = os.urandom(50000)
+    digest = download.fetch(requests.Session(), server.url, path)
+    assert digest == sha256(server.data)
+    assert open(path, 'rb').read() == server.data
+
+
+def test_server_without_ranges(server, tmp_path):
+    path = str(tmp_path / 'c.zip')
+    with open(download.part_path(path), 'wb') as f:
+        f.write(DATA[:1000])
+    with open(download.layout_path(path), 'w') as f:
+        f.write('{} 1\n'.format(len(DATA)))
+
+    class NoRanges(requests.Session):
+        def get(self, url, headers=None, **kwargs):
+            return super().get(url, **kwargs)
+
+    digest = download.fetch(NoRanges(), server.url, path, size=len(DATA),
+                            connections=4)
+    assert digest == sha256(DATA)
+    assert open(path, 'rb').read() == DATA
+
+
+def test_rate_limiter_shared_by_threads():
+    limiter = download.RateLimiter(1000000)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [limiter.consume(250000)
+                                                for _ in range(4)])
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 2 MB at 1 MB/s, the first second fits into the bucket
+    assert 0.9 <= time.monotonic() - start < 2
+
+
+def test_fetch_with_bandwidth_cap(server, tmp_path):
+    path = str(tmp_path / 'c.zip')
+    limiter = download.RateLimiter(2 * 1024 * 1024)
+    start = time.monotonic()
+    digest = download.fetch(requests.Session(), server.url, path,
+                            connections=2, limiter=limiter)
+    assert digest == sha256(DATA)
+    assert time.monotonic() - start >= 0.45
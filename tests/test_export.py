@@ -0,0 +1,69 @@
+"""
+Machine-readable exports of the docs lists.
+"""
+import csv
+import io
+import json
+
+import pytest
+
+from nokdoc import nokdoc
+
+DOCS = [
+    nokdoc.DocEntry('DN1', 'Guide, "basic"', '1', '2017-01-02',
+                    (('https://x/1.pdf', 'PDF'), ('https://x/1/', 'HTML'),
+                     ('https://x/1b.pdf', 'PDF')), False),
+    nokdoc.DocEntry('DN2', 'Руководство', '2', '2017-02-03', (), True),
+]
+
+RECORD = {'product': '7750sr', 'release': '15.0', 'doc_id': 'DN1',
+          'title': 'Guide, "basic"', 'issue': '1', 'issue_date': '2017-01-02',
+          'restricted': False,
+          'links': [{'url': 'https://x/1.pdf', 'type': 'PDF'},
+                    {'url': 'https://x/1/', 'type': 'HTML'},
+                    {'url': 'https://x/1b.pdf', 'type': 'PDF'}]}
+
+
+def test_json():
+    f = io.StringIO()
+    assert nokdoc.write_docs_json(iter(DOCS), f, '7750sr', '15.0') == 2
+    records = json.loads(f.getvalue())
+    assert records[0] == RECORD
+    assert records[1]['title'] == 'Руководство'
+    assert records[1]['links'] == []
+
+    f = io.StringIO()
+    assert nokdoc.write_docs_json(iter([]), f, '7750sr', '15.0') == 0
+    assert json.loads(f.getvalue()) == []
+
+
+def test_ndjson():
+    f = io.StringIO()
+    assert nokdoc.write_docs_ndjson(iter(DOCS), f, '7750sr', '15.0') == 2
+    lines = f.getvalue().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0]) == RECORD
+
+
+def test_csv():
+    f = io.StringIO(newline='')
+    assert nokdoc.write_docs_csv(iter(DOCS), f, '7750sr', '15.0') == 2
+    f.seek(0)
+    rows = list(csv.DictReader(f))
+    assert rows[0] == {'product': '7750sr', 'release': '15.0',
+                       'doc_id': 'DN1', 'title': 'Guide, "basic"',
+                       'issue': '1', 'issue_date': '2017-01-02',
+                       'restricted': 'False',
+                       'pdf': 'https://x/1.pdf https://x/1b.pdf',
+                       'html': 'https://x/1/', 'zip': ''}
+    assert rows[1]['restricted'] == 'True'
+
+
+@pytest.mark.parametrize('output_format', ['json', 'ndjson', 'csv'])
+def test_export_to_default_file(tmp_path, monkeypatch, output_format):
+    monkeypatch.chdir(tmp_path)
+    assert nokdoc.export_docs(DOCS, '7750sr', '15.0 R4',
+                              output_format=output_format, quiet=True) == 2
+    fname = 'nokdoc__7750SR__15.0_R4.' + output_format
+    assert nokdoc.docs_fname('7750sr', '15.0 R4', output_format) == fname
+    assert 'DN2' in (tmp_path / fname).read_text(encoding='utf8')
@@ -0,0 +1,133 @@
+"""
+getlinks and batchgetlinks against a fake documentation server.
+"""
+import json
+import os
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from nokdoc import nokdoc
+
+LOCK = " <img title='a login is required for access'>"
+
+
+def row(doc_id, title, lock=''):
+    return ("<tr class='doc'><td class='t'> {title} </td>"
+            "<td class='id'><nobr>{doc_id}</nobr>{lock}</td>"
+            "<td class='i'> 1 </td>"
+            "<td class='d'><nobr>2017-01-02</nobr></td>"
+            "<td class='l'><a href='https://x/{doc_id}.pdf' title='PDF'>P</a>"
+            "</td></tr>").format(doc_id=doc_id, title=title, lock=lock)
+
+
+# docs lists of the entries, nuage-vsp and nuage-vns share a doc
+DOCDATA = {
+    nokdoc.doc_id['7750sr']: row('DN1', 'Guide') + row('DN2', 'Secret', LOCK),
+    nokdoc.doc_id['nuage-vsp']: row('DN3', 'VSP guide') +
+    row('DN5', 'Release notes'),
+    nokdoc.doc_id['nuage-vns']: row('DN4', 'VNS guide') +
+    row('DN5', 'Release notes'),
+    nokdoc.doc_id['nsp']: '',
+}
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path / 'config'))
+    monkeypatch.chdir(tmp_path)
+    requests = []
+    lock = threading.Lock()
+
+    def get_json(s, url, params, cache=None):
+        with lock:
+            requests.append((url, params['entry_id'], params['release']))
+        if params['release'] == 'broken':
+            return None
+        docdata = DOCDATA[params['entry_id']]
+        return {'proddata': {'format': [['PDF']] if docdata else [[]],
+                             'release': ['15.0'],
+                             'docdata': docdata}}
+
+    monkeypatch.setattr(nokdoc, 'get_json', get_json)
+    return requests
+
+
+def test_get_docs_of_combined_product(server):
+    docs = list(nokdoc.get_docs(None, 'nuage', '5.0', logged_in=True,
+                                quiet=True))
+    assert [d.doc_id for d in docs] == ['DN3', 'DN5', 'DN4']
+    # permissions and docs lists of both entries
+    assert len(server) == 4
+
+
+def test_get_docs_errors(server):
+    with pytest.raises(nokdoc.NokdocError) as e:
+        nokdoc.get_docs(None, 'nsp', '1.0', quiet=True)
+    assert e.value.exit_code == 0
+    with pytest.raises(nokdoc.NokdocError):
+        nokdoc.get_docs(None, '7750sr', 'broken', quiet=True)
+
+
+def test_getlinks(server, tmp_path):
+    result = CliRunner().invoke(nokdoc.cli, [
+        'getlinks', '-p', '7750sr', '-r', '15.0', '--output-format', 'json'])
+    assert result.exit_code == 0, result.output
+    assert 'Secret' in result.output
+    records = json.loads(
+        (tmp_path / 'nokdoc__7750SR__15.0.json').read_text())
+    assert [r['doc_id'] for r in records] == ['DN1']
+
+
+def write_jobs(tmp_path, jobs):
+    path = tmp_path / 'jobs.yml'
+    path.write_text(jobs)
+    return str(path)
+
+
+JOBS = '''
+7750sr:
+  releases:
+    - 15.0
+    - broken
+nsp:
+  releases:
+    -
+'''
+
+
+def test_batchgetlinks(server, tmp_path):
+    jobs = write_jobs(tmp_path, JOBS)
+    result = CliRunner().invoke(nokdoc.cli, [
+        'batchgetlinks', jobs, '-o', str(tmp_path / 'out'), '-w', '3',
+        '--output-format', 'json'])
+    # a failed job does not stop the others
+    assert result.exit_code == 1
+    assert '[OK] 7750sr 15.0: 1 docs' in result.output
+    assert '[FAILED] 7750sr broken' in result.output
+    assert '[FAILED] nsp all releases' in result.output
+    assert '1 jobs succeeded, 2 jobs failed' in result.output
+    assert os.listdir(str(tmp_path / 'out' / '7750sr')) == [
+        'nokdoc__7750SR__15.0.json']
+    assert os.getcwd() == str(tmp_path)
+
+
+def test_batchgetlinks_ndjson(server, tmp_path):
+    jobs = write_jobs(tmp_path, '7750sr:\n  releases:\n    - 14.0\n'
+                                '    - 15.0\n')
+    result = CliRunner().invoke(nokdoc.cli, [
+        'batchgetlinks', jobs, '-o', str(tmp_path / 'out'),
+        '--output-format', 'ndjson'])
+    assert result.exit_code == 0, result.output
+    lines = (tmp_path / 'out' / 'nokdoc.ndjson').read_text().splitlines()
+    assert sorted(json.loads(line)['release'] for line in lines) == [
+        '14.0', '15.0']
+
+
+def test_batchgetlinks_report_requires_incremental(server, tmp_path):
+    jobs = write_jobs(tmp_path, JOBS)
+    result = CliRunner().invoke(nokdoc.cli, [
+        'batchgetlinks', jobs, '--report', str(tmp_path / 'report.json')])
+    assert result.exit_code == 2
+    assert '--report requires --incremental' in result.output
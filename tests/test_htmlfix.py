@@ -0,0 +1,80 @@
+"""
+Renames of Nuage doc dirs by htmlfix, in zip archives and directories.
+"""
+import os
+import zipfile
+
+from click.testing import CliRunner
+
+from nokdoc import nokdoc
+
+INDEXES = {
+    'DOC1': '<html><head><title>VSP User Guide &mdash; 5.0</title>',
+    'DOC2': '<html><head><title>VSP User Guide &mdash; 5.1</title>',
+    'DOC3': '<html><head></head>',
+}
+
+
+def make_zip(path):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for d, index in INDEXES.items():
+            zf.writestr(d + '/index.html', index)
+            zf.writestr(d + '/page.html', d)
+        zf.writestr('readme.txt', 'top level')
+    return path
+
+
+def make_dir(path):
+    for d, index in INDEXES.items():
+        os.makedirs(os.path.join(path, d))
+        with open(os.path.join(path, d, 'index.html'), 'w') as f:
+            f.write(index)
+    return path
+
+
+def test_plan_renames():
+    dirnames = {'DOC1': 'Guide', 'DOC2': 'Guide', 'DOC3': None,
+                'Guide_2': 'Guide_2'}
+    assert nokdoc.plan_renames(dirnames, ['Guide_2', 'readme.txt']) == {
+        'DOC1': 'Guide', 'DOC2': 'Guide_3'}
+
+
+def test_zip(tmp_path):
+    path = make_zip(str(tmp_path / 'docs.zip'))
+    result = CliRunner().invoke(nokdoc.cli, ['htmlfix', '-p', path])
+    assert result.exit_code == 0, result.output
+
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == [
+            'DOC3/index.html', 'DOC3/page.html',
+            'VSP_User_Guide/index.html', 'VSP_User_Guide/page.html',
+            'VSP_User_Guide_2/index.html', 'VSP_User_Guide_2/page.html',
+            'readme.txt']
+        assert zf.read('VSP_User_Guide_2/page.html') == b'DOC2'
+    assert os.listdir(str(tmp_path)) == ['docs.zip']
+
+
+def test_zip_dry_run(tmp_path):
+    path = make_zip(str(tmp_path / 'docs.zip'))
+    before = open(path, 'rb').read()
+    result = CliRunner().invoke(nokdoc.cli,
+                                ['htmlfix', '-p', path, '--dry-run'])
+    assert result.exit_code == 0, result.output
+    assert open(path, 'rb').read() == before
+    assert 'DOC1 --> VSP_User_Guide\n' in result.output
+    assert 'DOC2 --> VSP_User_Guide_2\n' in result.output
+    assert 'DOC3 (no title found, skipped)' in result.output
+
+
+def test_dir(tmp_path):
+    path = make_dir(str(tmp_path / 'docs'))
+    result = CliRunner().invoke(nokdoc.cli,
+                                ['htmlfix', '-p', path, '--dry-run'])
+    assert result.exit_code == 0, result.output
+    assert sorted(os.listdir(path)) == ['DOC1', 'DOC2', 'DOC3']
+    assert 'DOC3 (no title found, skipped)' in result.output
+
+    result = CliRunner().invoke(nokdoc.cli, ['htmlfix', '-p', path])
+    assert result.exit_code == 0, result.output
+    assert sorted(os.listdir(path)) == ['DOC3', 'VSP_User_Guide',
+                                        'VSP_User_Guide_2']
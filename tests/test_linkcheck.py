@@ -0,0 +1,133 @@
+"""
+Link checks against a local HTTP server.
+"""
+import http.server
+import threading
+
+import pytest
+import requests
+from click.testing import CliRunner
+
+from nokdoc import linkcheck, nokdoc
+from nokdoc.catalog import Catalog
+
+
+class LinksHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers 200 to the paths starting with /ok, 404 to the rest.
+    Paths starting with /nohead refuse HEAD requests
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self):
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path))
+        if self.command == 'HEAD' and self.path.startswith('/nohead'):
+            status = 405
+        elif self.path.startswith(('/ok', '/nohead')):
+            status = 200
+        else:
+            status = 404
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_HEAD = do_GET = reply
+
+
+@pytest.fixture
+def server():
+    srv = http.server.ThreadingHTTPServer(('127.0.0.1', 0), LinksHandler)
+    srv.requests = []
+    srv.lock = threading.Lock()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    srv.url = 'http://127.0.0.1:{}'.format(srv.server_address[1])
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_check_links(server, tmp_path):
+    urls = [server.url + path for path in ('/ok', '/missing', '/nohead')]
+    cache = linkcheck.LinkCache(str(tmp_path / 'links.sqlite'))
+    results, checked = linkcheck.check_links(requests.Session(), urls,
+                                             rate=100, cache=cache)
+    assert {url: r.status for url, r in results.items()} == dict(
+        zip(urls, (200, 404, 200)))
+    assert [url for url in urls if linkcheck.is_broken(results[url])] == \
+        [server.url + '/missing']
+    assert ('GET', '/nohead') in server.requests
+    assert len(checked) == 3
+
+    # fresh results are not checked again
+    server.requests.clear()
+    results, checked = linkcheck.check_links(requests.Session(), urls,
+                                             rate=100, cache=cache)
+    cache.close()
+    assert len(results) == 3
+    assert checked == []
+    assert server.requests == []
+
+
+def test_unreachable_link_not_cached(tmp_path):
+    url = 'http://127.0.0.1:1/doc.pdf'
+    cache = linkcheck.LinkCache(str(tmp_path / 'links.sqlite'))
+    results, _ = linkcheck.check_links(requests.Session(), [url],
+                                       cache=cache, timeout=1)
+    assert results[url].status is None and results[url].error
+    assert cache.get_many([url]) == {}
+    cache.close()
+
+
+def test_latency_stats():
+    results = [linkcheck.LinkResult('http://a/{}'.format(i), 200, i, None, 0)
+               for i in range(1, 11)]
+    results.append(linkcheck.LinkResult('http://b/', 200, 0.5, None, 0))
+    stats = linkcheck.latency_stats(results)
+    assert stats['a'] == (10, 6, 10, 10)
+    assert stats['b'] == (1, 0.5, 0.5, 0.5)
+    assert stats[''][0] == 11
+
+
+def make_docs(url):
+    # the server filters docs by format, not the links of a doc
+    return [
+        nokdoc.DocEntry('DN1', 'Guide', '1', '2017-01-02',
+                        ((url + '/ok/guide.pdf', 'PDF'),
+                         (url + '/broken/guide.html', 'HTML')), False),
+        nokdoc.DocEntry('DN2', 'Notes', '1', '2017-02-01',
+                        ((url + '/ok/notes.pdf', 'PDF'),), False),
+    ]
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    return tmp_path / 'nokdoc'
+
+
+@pytest.mark.parametrize('offline', [False, True])
+def test_checklinks_by_format(server, app_dir, monkeypatch, offline):
+    docs = make_docs(server.url)
+    if offline:
+        catalog = Catalog(str(app_dir / 'catalog.sqlite'))
+        catalog.store('7750sr', '15.0', docs, 'digest')
+        catalog.close()
+    else:
+        monkeypatch.setattr(nokdoc, 'get_docs', lambda *a, **kw: docs)
+    args = ['checklinks', '-p', '7750sr', '-r', '15.0', '--rate', '100']
+    if offline:
+        args.append('--offline')
+
+    result = CliRunner().invoke(nokdoc.cli, args + ['-f', 'pdf'])
+    assert result.exit_code == 0, result.output
+    assert sorted(path for _, path in server.requests) == [
+        '/ok/guide.pdf', '/ok/notes.pdf']
+
+    result = CliRunner().invoke(nokdoc.cli, args)
+    assert result.exit_code == 1
+    assert '/broken/guide.html' in result.output
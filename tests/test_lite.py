@@ -0,0 +1,59 @@
+"""
+Lightweight HTML page with the docs index filtered client side.
+"""
+import io
+import json
+import os
+
+from nokdoc import nokdoc
+
+DOCS = [
+    nokdoc.DocEntry('3HE12345AAAA', 'Router Configuration Guide, router',
+                    '2', '2017-01-02', (('https://x/1.pdf', 'PDF'),
+                                        ('https://x/1/', 'HTML')), False),
+    nokdoc.DocEntry('3HE54321AAAA', 'Release notes', '1', '2017-02-03',
+                    (), True),
+]
+
+
+def load_index(content):
+    prefix, suffix = 'window.nokdocIndex = ', ';\n'
+    assert content.startswith(prefix) and content.endswith(suffix)
+    return json.loads(content[len(prefix):-len(suffix)])
+
+
+def test_doc_tokens():
+    assert nokdoc.doc_tokens(DOCS[0]) == (
+        'router configuration guide 3he12345aaaa 2017-01-02 pdf html')
+
+
+def test_index():
+    f = io.StringIO()
+    assert nokdoc.write_docs_index(iter(DOCS), f, '7750sr', '15.0') == 2
+    index = load_index(f.getvalue())
+    assert index['product'] == '7750sr' and index['release'] == '15.0'
+    docs = [dict(zip(index['fields'], doc)) for doc in index['docs']]
+    assert docs[0] == {'doc_id': '3HE12345AAAA',
+                       'title': 'Router Configuration Guide, router',
+                       'issue': '2', 'issue_date': '2017-01-02',
+                       'restricted': 0,
+                       'links': [['PDF', 'https://x/1.pdf'],
+                                 ['HTML', 'https://x/1/']],
+                       'tokens': nokdoc.doc_tokens(DOCS[0])}
+    assert docs[1]['restricted'] == 1
+
+
+def test_page(tmp_path):
+    path = str(tmp_path / 'docs.html')
+    # pages left by a paged render into the same file
+    open(nokdoc.page_fname(path, 1), 'w').close()
+    assert nokdoc.create_doc_html_lite(iter(DOCS), '7750sr', '15.0',
+                                       path=path, quiet=True) == 2
+    assert sorted(os.listdir(str(tmp_path))) == ['docs.html',
+                                                 'docs.index.js']
+    page = open(path).read()
+    assert 'src="docs.index.js"' in page
+    # docs are loaded from the index only
+    assert '3HE12345AAAA' not in page
+    with open(nokdoc.index_fname(path)) as f:
+        assert len(load_index(f.read())['docs']) == 2
@@ -0,0 +1,114 @@
+"""
+Content-addressed store of the mirrored documents.
+"""
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+import requests
+
+from nokdoc.mirror import DocStore
+
+FILES = {'/15.0/guide.pdf': b'guide' * 1000,
+         '/14.0/guide.pdf': b'guide' * 1000,
+         '/15.0/notes.pdf': b'notes' * 1000}
+
+
+class FilesHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    srv = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FilesHandler)
+    srv.files = dict(FILES)
+    srv.requests = []
+    srv.lock = threading.Lock()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    srv.url = 'http://127.0.0.1:{}'.format(srv.server_address[1])
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocStore(str(tmp_path / 'mirror'))
+    yield store
+    store.close()
+
+
+def test_identical_files_stored_once(server, store):
+    s = requests.Session()
+    digests = {}
+    for path in sorted(FILES):
+        digest, size = store.fetch(s, server.url + path, version='1')
+        assert digest == hashlib.sha256(FILES[path]).hexdigest()
+        assert size == len(FILES[path])
+        digests[path] = digest
+    assert store.stats() == (2, len(FILES['/15.0/guide.pdf']) +
+                             len(FILES['/15.0/notes.pdf']))
+    assert os.listdir(store.tmp_dir) == []
+
+    # known versions are not downloaded again
+    server.requests.clear()
+    assert store.fetch(s, server.url + '/15.0/guide.pdf', version='1') == \
+        (digests['/15.0/guide.pdf'], 0)
+    assert server.requests == []
+
+    # a new version is
+    server.files['/15.0/guide.pdf'] = b'reissued'
+    digest, size = store.fetch(s, server.url + '/15.0/guide.pdf',
+                               version='2')
+    assert digest == hashlib.sha256(b'reissued').hexdigest()
+    assert store.lookup(server.url + '/15.0/guide.pdf', '1') == \
+        digests['/15.0/guide.pdf']
+
+
+def test_missing_object_fetched_again(server, store):
+    s = requests.Session()
+    url = server.url + '/15.0/notes.pdf'
+    digest, _ = store.fetch(s, url)
+    os.remove(store.object_path(digest))
+    assert store.lookup(url) is None
+    assert store.fetch(s, url) == (digest, len(FILES['/15.0/notes.pdf']))
+
+
+def test_link(server, store, tmp_path):
+    digest, _ = store.fetch(requests.Session(),
+                            server.url + '/15.0/guide.pdf')
+    views = [str(tmp_path / release / 'guide.pdf')
+             for release in ('15.0', '14.0')]
+    for path in views:
+        store.link(digest, path)
+        store.link(digest, path)
+        assert open(path, 'rb').read() == FILES['/15.0/guide.pdf']
+    assert os.path.samefile(*views)
+    assert os.listdir(str(tmp_path / '15.0')) == ['guide.pdf']
+
+    # a view made by an older version of the doc is replaced
+    other, _ = store.fetch(requests.Session(),
+                           server.url + '/15.0/notes.pdf')
+    store.link(other, views[0])
+    assert open(views[0], 'rb').read() == FILES['/15.0/notes.pdf']
+    assert open(views[1], 'rb').read() == FILES['/15.0/guide.pdf']
@@ -0,0 +1,87 @@
+"""
+Parsing of the docs lists sent by the documentation server.
+"""
+import json
+
+import pytest
+
+from nokdoc import nokdoc
+
+LOCK = " <img title='a login is required for access'>"
+
+
+def row(n, title, lock='', links=None):
+    if links is None:
+        links = ("<a href='https://x/{n}.pdf' title='PDF doc'>P</a> "
+                 "<a href='https://x/{n}.zip' title='Zip Collection'>Z</a> "
+                 "<a href='https://x/{n}/' title='HTML doc'>H</a> "
+                 "<a href='https://x/{n}.txt' title='Text'>T</a>").format(n=n)
+    return ("<tr class='doc'><td class='t'> {title} </td>"
+            "<td class='id'><nobr>3HE{n:06d}AAA</nobr>{lock}</td>"
+            "<td class='i'> {n} </td>"
+            "<td class='d'><nobr>2017-01-0{n}</nobr></td>"
+            "<td class='l'>{links}</td></tr>").format(
+                n=n, title=title, lock=lock, links=links)
+
+
+# combined products list some docs in several sections
+DOCDATA = ('<table><tr><th>header</th></tr>' + row(1, 'Guide') +
+           row(2, 'Secret guide', LOCK) + row(3, 'Notes', links='') +
+           row(1, 'Guide') + '</table>')
+
+
+def test_guest_docs():
+    restricted = []
+    docs = nokdoc.parseDocdata(DOCDATA, restricted=restricted)
+    assert [d.doc_id for d in docs] == ['3HE000001AAA', '3HE000003AAA']
+    assert docs[0] == nokdoc.DocEntry(
+        '3HE000001AAA', 'Guide', '1', '2017-01-01',
+        (('https://x/1.pdf', 'PDF'), ('https://x/1.zip', 'ZIP'),
+         ('https://x/1/', 'HTML')), True)
+    assert docs[1].links == ()
+    assert restricted == ['Secret guide']
+
+
+def test_logged_in_docs_with_permissions():
+    permissions = nokdoc.parseDocdata(DOCDATA, logged_in=True,
+                                      check_permissions=True)
+    assert permissions == {'3HE000001AAA': False, '3HE000002AAA': True,
+                           '3HE000003AAA': False}
+    docs = nokdoc.parseDocdata(DOCDATA, logged_in=True,
+                               permissions=permissions)
+    assert [(d.doc_id, d.restricted) for d in docs] == [
+        ('3HE000001AAA', False), ('3HE000002AAA', True),
+        ('3HE000003AAA', False)]
+
+
+def test_chunks_deduplicated_across_entries():
+    other = '<table>' + row(4, 'Other') + row(3, 'Notes') + '</table>'
+    docs = list(nokdoc.iter_docs([DOCDATA, other], logged_in=True))
+    assert [d.doc_id for d in docs] == ['3HE000001AAA', '3HE000002AAA',
+                                        '3HE000003AAA', '3HE000004AAA']
+
+
+class Response(object):
+    url = 'https://x/get_doc_list.pl'
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode('utf8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def test_json_after_junk():
+    # raw line breaks inside the strings are not valid json either
+    body = 'Content-type: text/html\r\n\r\n<!-- junk -->\n' \
+           '{"proddata": {"docdata": "<tr>\r\n</tr>"}}'
+    assert nokdoc.get_json_resp(Response(body)) == {
+        'proddata': {'docdata': '<tr></tr>'}}
+
+
+def test_not_json():
+    with pytest.raises(nokdoc.ResponseDecodeError):
+        nokdoc.get_json_resp(Response('<html>maintenance</html>'),
+                             dump=False)
@@ -0,0 +1,87 @@
+"""
+Phase timings and figures of a profiled run.
+"""
+import json
+import time
+
+import pytest
+
+from nokdoc import profiling
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(profiling, 'active', None)
+    return profiling.enable('getlinks')
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(profiling, 'active', None)
+    with profiling.phase('request'):
+        profiling.count('cache hits')
+    items = [1, 2]
+    assert profiling.timed_iter('parse', items) is items
+
+
+def test_nested_phases_accounted_exclusively(profiler):
+    with profiling.phase('render'):
+        time.sleep(0.02)
+        for _ in range(2):
+            with profiling.phase('parse'):
+                time.sleep(0.03)
+    trace = profiler.trace()
+    assert trace['phases']['parse']['calls'] == 2
+    parse, render = (trace['phases'][name]['seconds']
+                     for name in ('parse', 'render'))
+    assert parse >= 0.06
+    # the render phase would take 0.08s if it included the nested ones
+    assert 0.02 <= render < parse
+
+
+def test_timed_iter(profiler):
+    def docs():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+
+    with profiling.phase('render'):
+        assert list(profiling.timed_iter('parse', docs())) == [0, 1, 2]
+    phases = profiler.trace()['phases']
+    # the final next() call is timed too
+    assert phases['parse']['calls'] == 4
+    assert phases['parse']['seconds'] >= 0.03
+    assert phases['render']['seconds'] < phases['parse']['seconds']
+
+
+class Response(object):
+    status_code = 200
+    headers = {'Content-Length': '100'}
+    content = b'x' * 10
+
+
+def test_counters_and_dumps(profiler, tmp_path):
+    profiling.count('cache hits', 3)
+    profiler.response_hook(Response())
+    profiler.response_hook(Response(), stream=True)
+    with profiling.phase('request'):
+        pass
+
+    trace = profiler.trace()
+    assert trace['counters'] == {'cache hits': 3, 'http requests': 2,
+                                 'http bytes': 110}
+    assert trace['http_statuses'] == {'200': 2}
+    assert any(line.startswith('request ') for line in profiler.summary())
+
+    path = str(tmp_path / 'profile.json')
+    profiler.dump(path)
+    assert json.load(open(path))['command'] == 'getlinks'
+
+    path = str(tmp_path / 'profile.prom')
+    profiler.dump(path)
+    prom = open(path).read()
+    assert '# TYPE nokdoc_phase_seconds gauge' in prom
+    assert 'nokdoc_events{command="getlinks",event="cache hits"} 3' in prom
+    assert 'nokdoc_http_responses{code="200",command="getlinks"} 2' in prom
+    # no temporary files are left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['profile.json',
+                                                          'profile.prom']
@@ -0,0 +1,89 @@
+"""
+Concurrent docs list queries over a pooled session.
+"""
+import http.server
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+
+from nokdoc import nokdoc
+
+
+class ListsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Replies to /perm and /docs with the entry and the list name as the
+    docdata, the lists of the first entry are the slowest
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        entry_id = parse_qs(url.query)['entry_id'][0]
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+        if entry_id == '1':
+            # time.sleep is patched by the tests
+            threading.Event().wait(0.1)
+        if entry_id == 'missing':
+            body = b'no such entry'
+            self.send_response(404)
+        else:
+            body = json.dumps({'proddata': {
+                'format': ['PDF'], 'release': ['15.0'],
+                'docdata': '{}{}'.format(url.path, entry_id)}}).encode()
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    srv = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ListsHandler)
+    srv.connections = set()
+    srv.lock = threading.Lock()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:{}'.format(srv.server_address[1])
+    monkeypatch.setattr(nokdoc, 'get_doc_permissions_url', url + '/perm')
+    monkeypatch.setattr(nokdoc, 'get_doc_url', url + '/docs')
+    # failed requests are retried after a pause
+    monkeypatch.setattr(nokdoc.time, 'sleep', lambda seconds: None)
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def docdata(responses):
+    return [r['proddata']['docdata'] for r in responses]
+
+
+def test_lists_in_entries_order(server):
+    s = requests.Session()
+    nokdoc.size_session_pool(s, 4)
+    responses, perm_responses = nokdoc.get_doc_lists(
+        s, ['1', '2', '3'], {'release': '15.0'}, concurrency=4)
+    assert docdata(responses) == ['/docs1', '/docs2', '/docs3']
+    assert docdata(perm_responses) == ['/perm1', '/perm2', '/perm3']
+
+
+def test_connections_reused(server):
+    s = requests.Session()
+    nokdoc.size_session_pool(s, 2)
+    for _ in range(3):
+        nokdoc.get_doc_lists(s, ['2', '3'], {}, concurrency=2)
+    assert len(server.connections) <= 2
+
+
+def test_failed_entry_skipped(server):
+    s = requests.Session()
+    responses, perm_responses = nokdoc.get_doc_lists(
+        s, ['missing', '2'], {}, concurrency=2)
+    assert docdata(responses) == ['/docs2']
+    assert docdata(perm_responses) == ['/perm2']
@@ -0,0 +1,54 @@
+"""
+Release lists fetched once per product.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nokdoc import nokdoc
+
+RELEASES = {'1-0000000000662': ['4.0', '5.0', '5.1'],
+            '1-0000000004080': ['5.1', '4.0', '3.2']}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(nokdoc, 'releases_memo', {})
+    monkeypatch.setattr(nokdoc, 'releases_locks', {})
+    calls = []
+    lock = threading.Lock()
+
+    def get_json(s, url, params, cache=None):
+        with lock:
+            calls.append(params['entry_id'])
+        time.sleep(0.05)
+        releases = RELEASES.get(params['entry_id'])
+        return releases and {'proddata': {'release': releases}}
+
+    monkeypatch.setattr(nokdoc, 'get_json', get_json)
+    return calls
+
+
+def test_fetched_once_by_parallel_workers(server):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        rels = list(executor.map(
+            lambda i: nokdoc.get_product_rels(None, 'nuage-vsp'), range(8)))
+    assert rels == [RELEASES['1-0000000000662']] * 8
+    assert server == ['1-0000000000662']
+
+
+def test_common_releases(server):
+    assert nokdoc.get_product_rels(None, 'nuage') == ['4.0', '5.1']
+    assert sorted(server) == sorted(RELEASES)
+    nokdoc.get_product_rels(None, 'nuage-vns')
+    assert len(server) == 2
+
+
+def test_failure_not_memoized(server):
+    with pytest.raises(nokdoc.NokdocError):
+        nokdoc.get_product_rels(None, 'nsp')
+    with pytest.raises(nokdoc.NokdocError):
+        nokdoc.get_product_rels(None, 'nsp')
+    assert server == ['1-0000000004100'] * 2
@@ -0,0 +1,89 @@
+"""
+Docs parsed lazily out of the responses as they are rendered.
+"""
+import pytest
+
+from nokdoc import nokdoc
+
+
+def row(n):
+    return ("<tr class='doc'><td class='t'> Guide {n} </td>"
+            "<td class='id'><nobr>DN{n}</nobr></td>"
+            "<td class='i'> 1 </td>"
+            "<td class='d'><nobr>2017-01-02</nobr></td>"
+            "<td class='l'><a href='https://x/{n}.pdf' title='PDF'>P</a>"
+            "</td></tr>").format(n=n)
+
+
+DOCDATA = ''.join(row(n) for n in range(1, 51))
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    def get_json(s, url, params, cache=None):
+        return {'proddata': {'format': [['PDF']], 'release': ['15.0'],
+                             'docdata': DOCDATA}}
+
+    monkeypatch.setattr(nokdoc, 'get_json', get_json)
+    parsed = []
+    parse_td = nokdoc.parse_td
+
+    def counting_parse_td(raw_td, permissions=None):
+        doc = parse_td(raw_td, permissions)
+        parsed.append(doc.doc_id)
+        return doc
+
+    monkeypatch.setattr(nokdoc, 'parse_td', counting_parse_td)
+    return parsed
+
+
+def test_docs_parsed_on_demand(parsed):
+    docs = nokdoc.get_docs(None, '7750sr', '15.0', quiet=True)
+    # only the first doc is parsed to tell if there are any
+    assert parsed == ['DN1']
+    assert next(docs).doc_id == 'DN1'
+    assert next(docs).doc_id == 'DN2'
+    assert parsed == ['DN1', 'DN2']
+
+
+def test_docs_rendered_in_one_pass(parsed, tmp_path):
+    path = str(tmp_path / 'docs.html')
+    docs = nokdoc.get_docs(None, '7750sr', '15.0', quiet=True)
+    assert nokdoc.create_doc_html(docs, '7750sr', '15.0', path=path,
+                                  quiet=True) == 50
+    # every doc is parsed once, while being rendered
+    assert parsed == ['DN{}'.format(n) for n in range(1, 51)]
+    content = open(path).read()
+    assert 'https://x/1.pdf' in content and 'https://x/50.pdf' in content
+
+
+@pytest.fixture
+def template_env(monkeypatch, tmp_path):
+    monkeypatch.setattr(nokdoc, 'template_env', None)
+    monkeypatch.setattr(nokdoc, 'template_cache_dir',
+                        str(tmp_path / 'templates'))
+    return tmp_path / 'templates'
+
+
+def test_shared_template_environment(template_env):
+    template = nokdoc.get_template('nokdoc_docset.html')
+    env = nokdoc.template_env
+    assert nokdoc.get_template('nokdoc_docset.html') is template
+    assert nokdoc.get_template('nokdoc_docset_index.html').environment \
+        is env
+    # compiled templates are kept for the next runs
+    assert list(template_env.iterdir())
+
+
+def test_paged_render(template_env, tmp_path):
+    path = str(tmp_path / 'docs.html')
+    docs = (nokdoc.DocEntry('DN{}'.format(n), 'Guide {}'.format(n), '1',
+                            '2017-01-02', (), False) for n in range(1, 6))
+    assert nokdoc.create_doc_html(docs, '7750sr', '15.0', path=path,
+                                  quiet=True, page_size=2) == 5
+    index = open(path).read()
+    for page in (1, 2, 3):
+        assert 'docs-{}.html'.format(page) in index
+    last = open(nokdoc.page_fname(path, 3)).read()
+    assert 'Guide 5' in last and 'Guide 4' not in last
+    assert 'docs-2.html' in last and 'docs-4.html' not in last
@@ -0,0 +1,97 @@
+"""
+Full-text index over unpacked HTML collections.
+"""
+import os
+
+import pytest
+
+from nokdoc import search
+
+PAGES = {
+    'nokdoc__7750SR__15.0.R4__HTML__2017_04_01/guide/bgp.html':
+        '<html><head><title>BGP &amp; routing</title>'
+        '<style>.bgp {}</style></head>'
+        '<body><p>Configure <b>BGP</b> peers.</p></body></html>',
+    'nokdoc__7750SR__15.0.R4__HTML__2017_04_01/guide/mpls.htm':
+        '<title>MPLS</title><p>LDP and RSVP-TE, also used with BGP.</p>',
+    'nokdoc__7750SR__14.0__HTML/ospf.html':
+        '<title>OSPF</title><script>var bgp;</script><p>Areas</p>',
+    'other/isis.html': '<title>IS-IS</title><p>Levels</p>',
+    'nokdoc__7750SR__15.0.R4__HTML__2017_04_01/guide/notes.txt': 'BGP',
+}
+
+
+@pytest.fixture
+def docs(tmp_path):
+    root = tmp_path / 'docs'
+    for name, content in PAGES.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return str(root)
+
+
+@pytest.fixture
+def index(tmp_path):
+    try:
+        index = search.DocIndex(str(tmp_path / 'search.sqlite'))
+    except search.SearchError as e:
+        pytest.skip(str(e))
+    yield index
+    index.close()
+
+
+def test_collection_tags():
+    assert search.collection_tags(
+        'nokdoc__7750SR__14.0.R4__HTML__2017_04_01') == ('7750sr', '14.0.R4')
+    assert search.collection_tags('nokdoc__NUAGE__ZIP__2017_04_01.zip') == \
+        ('nuage', '')
+    assert search.collection_tags('nokdoc__NSP__2017_04_01') == ('nsp', '')
+    assert search.collection_tags('docs') is None
+
+
+def test_html_text():
+    assert search.html_text(PAGES['nokdoc__7750SR__15.0.R4__HTML__'
+                                  '2017_04_01/guide/bgp.html']) == \
+        ('BGP & routing', 'Configure BGP peers.')
+
+
+def test_search(docs, index):
+    assert index.update(docs) == search.IndexStats(4, 0, 0, 0)
+    assert index.stats() == [('', '', 1), ('7750sr', '14.0', 1),
+                             ('7750sr', '15.0.R4', 2)]
+
+    hits = index.search('bgp')
+    # matches in titles rank higher, scripts and styles are not indexed
+    assert [os.path.basename(h.path) for h in hits] == ['bgp.html',
+                                                        'mpls.htm']
+    assert hits[0].title == 'BGP & routing'
+    assert hits[0].product == '7750sr' and hits[0].release == '15.0.R4'
+    assert search.HIT_START + 'BGP' + search.HIT_END in hits[0].snippet
+
+    assert index.search('bgp', release='14.0') == []
+    assert [h.title for h in index.search('areas', product='7750sr')] == \
+        ['OSPF']
+    # not a valid FTS5 expression, the terms are quoted
+    assert [h.title for h in index.search('RSVP-TE')] == ['MPLS']
+
+
+def test_incremental_update(docs, index):
+    index.update(docs)
+    bgp = os.path.join(docs, 'nokdoc__7750SR__15.0.R4__HTML__2017_04_01',
+                       'guide', 'bgp.html')
+    with open(bgp, 'w') as f:
+        f.write('<title>BGP</title><p>Route reflectors</p>')
+    os.remove(os.path.join(docs, 'other', 'isis.html'))
+
+    assert index.update(docs) == search.IndexStats(1, 2, 1, 0)
+    assert [h.title for h in index.search('reflectors')] == ['BGP']
+    assert index.search('levels') == []
+    assert index.search('configure') == []
+
+
+def test_explicit_tags(docs, index):
+    index.update(os.path.join(docs, 'other'), product='nsp', release='1.0')
+    assert index.stats() == [('nsp', '1.0', 1)]
+    assert index.update(docs) == search.IndexStats(4, 0, 0, 0)
+    assert ('', '', 1) in index.stats()
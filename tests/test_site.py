@@ -0,0 +1,88 @@
+"""
+Static site rendered out of the offline catalog.
+"""
+import json
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from nokdoc import nokdoc
+from nokdoc.catalog import Catalog
+
+
+def make_docs(n, issue='1'):
+    return [('DN{}'.format(i), 'Guide {}'.format(i), issue, '2017-01-02',
+             [['https://x/{}.pdf'.format(i), 'PDF']], False)
+            for i in range(1, n + 1)]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path / 'config'))
+    catalog = Catalog(str(tmp_path / 'config' / 'nokdoc' / 'catalog.sqlite'))
+    catalog.store('7750sr', '14.0', make_docs(2), 'digest')
+    catalog.store('7750sr', '15.0', make_docs(3), 'digest')
+    catalog.store('nsp', '1.0', make_docs(1), 'digest')
+    yield catalog
+    catalog.close()
+
+
+def build(tmp_path, jobs):
+    path = tmp_path / 'jobs.yml'
+    path.write_text(jobs)
+    out = tmp_path / 'site'
+    result = CliRunner().invoke(nokdoc.cli, [
+        'site', str(path), '-o', str(out), '--offline'])
+    return result, out
+
+
+JOBS = '7750sr:\n  releases: [14.0, 15.0]\nnsp:\n  releases: [1.0]\n'
+
+
+def pages(out):
+    return sorted(os.path.relpath(os.path.join(d, f), str(out))
+                  for d, _, files in os.walk(str(out)) for f in files
+                  if f != nokdoc.SITE_MANIFEST)
+
+
+def test_site(app, tmp_path):
+    result, out = build(tmp_path, JOBS)
+    assert result.exit_code == 0, result.output
+    assert '6 pages rendered, 0 unchanged' in result.output
+    assert pages(out) == [
+        '7750sr/index.html', '7750sr/nokdoc__7750SR__14.0.html',
+        '7750sr/nokdoc__7750SR__15.0.html', 'index.html',
+        'nsp/index.html', 'nsp/nokdoc__NSP__1.0.html']
+    index = (out / '7750sr' / 'index.html').read_text()
+    # releases are listed newest first
+    assert index.index('15.0') < index.index('14.0')
+
+    result, out = build(tmp_path, JOBS)
+    assert '0 pages rendered, 6 unchanged' in result.output
+
+
+def test_changed_and_gone_releases(app, tmp_path):
+    build(tmp_path, JOBS)
+    app.store('7750sr', '15.0', make_docs(3, issue='2'), 'digest2')
+    result, out = build(tmp_path, JOBS)
+    assert '[UPDATED] 7750sr 15.0' in result.output
+    # landing pages list the numbers of docs only, they are not rendered
+    assert '1 pages rendered, 5 unchanged' in result.output
+
+    result, out = build(tmp_path, '7750sr:\n  releases: [15.0]\n')
+    assert result.exit_code == 0, result.output
+    assert '2 pages rendered, 1 unchanged, 3 removed' in result.output
+    assert pages(out) == ['7750sr/index.html',
+                          '7750sr/nokdoc__7750SR__15.0.html', 'index.html']
+    manifest = json.loads((out / nokdoc.SITE_MANIFEST).read_text())
+    assert sorted(manifest) == pages(out)
+
+
+def test_failed_release_keeps_page(app, tmp_path):
+    build(tmp_path, JOBS)
+    app.set_releases('nsp', [])
+    result, out = build(tmp_path, JOBS)
+    assert result.exit_code == 1
+    assert '[FAILED] nsp 1.0' in result.output
+    assert 'nsp/nokdoc__NSP__1.0.html' in pages(out)
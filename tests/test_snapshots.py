@@ -0,0 +1,101 @@
+"""
+Incremental rendering of the docs files driven by snapshots.
+"""
+import os
+
+import pytest
+
+from nokdoc import nokdoc
+
+
+def make_docs(n, issue='1'):
+    return [nokdoc.DocEntry('DN{}'.format(i), 'Guide {}'.format(i), issue,
+                            '2017-01-02', (('https://x/{}.pdf'.format(i),
+                                            'PDF'),), False)
+            for i in range(1, n + 1)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'docs.html')
+
+
+def update(path, docs, **kwargs):
+    return nokdoc.update_docs_file(docs, '7750sr', '15.0', path=path,
+                                   quiet=True, **kwargs)[1]
+
+
+def touch_old(path):
+    os.utime(path, (0, 0))
+
+
+def rewritten(path):
+    return os.path.getmtime(path) != 0
+
+
+def test_unchanged_docs_not_rendered_again(path):
+    diff = update(path, make_docs(3))
+    assert diff.changed
+    assert [d['doc_id'] for d in diff.added] == ['DN1', 'DN2', 'DN3']
+    assert os.path.isfile(nokdoc.snapshot_path(path))
+
+    touch_old(path)
+    diff = update(path, make_docs(3))
+    assert not diff.changed
+    assert not rewritten(path)
+
+    # a missing file is rendered whatever the snapshot says
+    os.remove(path)
+    assert not update(path, make_docs(3)).changed
+    assert os.path.isfile(path)
+
+
+def test_diff(path):
+    update(path, make_docs(3))
+    docs = make_docs(4, issue='2')[1:]
+    diff = update(path, docs)
+    assert diff.changed
+    assert [d['doc_id'] for d in diff.added] == ['DN4']
+    assert [d['doc_id'] for d in diff.removed] == ['DN1']
+    assert [d['doc_id'] for d in diff.reissued] == ['DN2', 'DN3']
+
+
+def test_doc_order_changes_file(path):
+    docs = make_docs(3)
+    update(path, docs)
+    diff = update(path, docs[::-1])
+    assert diff.changed
+    assert diff.added == diff.removed == diff.reissued == []
+
+
+def test_output_changes_file(path, monkeypatch):
+    docs = make_docs(5)
+    update(path, docs)
+
+    for kwargs in ({'page_size': 2}, {'output_format': 'html-lite'},
+                   {'output_format': 'html'}):
+        touch_old(path)
+        assert update(path, docs, **kwargs).changed
+        assert rewritten(path)
+
+    touch_old(path)
+    monkeypatch.setattr(nokdoc, 'template_digest', lambda: 'changed')
+    assert update(path, docs).changed
+    assert rewritten(path)
+
+
+def test_pages(path):
+    update(path, make_docs(5), page_size=2)
+    assert [os.path.isfile(nokdoc.page_fname(path, page))
+            for page in (1, 2, 3, 4)] == [True, True, True, False]
+
+    update(path, make_docs(3), page_size=2)
+    assert [os.path.isfile(nokdoc.page_fname(path, page))
+            for page in (1, 2, 3)] == [True, True, False]
+
+    # pages and the lightweight index are left by other outputs only
+    update(path, make_docs(3), output_format='html-lite')
+    assert not os.path.isfile(nokdoc.page_fname(path, 1))
+    assert os.path.isfile(nokdoc.index_fname(path))
+    update(path, make_docs(3))
+    assert not os.path.isfile(nokdoc.index_fname(path))
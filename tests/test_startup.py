@@ -0,0 +1,42 @@
+"""
+CLI startup cost: heavy dependencies are imported by the commands using
+them and nothing is written on import.
+"""
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ('requests', 'jinja2', 'tqdm', 'yaml', 'certifi')
+
+# prints the heavy modules imported by the code run after the
+# interpreter startup, site hooks might import some of them on their own
+SCRIPT = '''
+import sys
+preloaded = set(sys.modules)
+from nokdoc import nokdoc
+{}
+print(' '.join(m for m in {!r}
+               if m in sys.modules and m not in preloaded))
+'''
+
+
+def imported_modules(code, cwd):
+    out = subprocess.run(
+        [sys.executable, '-c', SCRIPT.format(code, HEAVY_MODULES)],
+        cwd=str(cwd), env=dict(os.environ, XDG_CONFIG_HOME=str(cwd)),
+        stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    return out.splitlines()[-1].split() if out.strip() else []
+
+
+def test_import_is_light(tmp_path):
+    assert imported_modules('', tmp_path) == []
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_help_is_light(tmp_path):
+    code = ('try:\n'
+            '    nokdoc.cli(["getlinks", "--help"])\n'
+            'except SystemExit:\n'
+            '    pass')
+    assert imported_modules(code, tmp_path) == []
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,78 @@
+"""
+Raw copy of zip members.
+"""
+import io
+import os
+import zipfile
+
+from nokdoc import ziputil
+
+DATA = os.urandom(50000)
+
+
+def make_zip(path):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('DOC1/index.html', b'<html/>' * 100)
+        zf.writestr('DOC1/data.bin', DATA)
+        zf.writestr(zipfile.ZipInfo('DOC2/stored.txt', (2017, 5, 6, 7, 8, 10)),
+                    b'stored', zipfile.ZIP_STORED)
+        zf.writestr('readme.txt', b'top level')
+    return path
+
+
+def test_copy_renamed(tmp_path):
+    src = make_zip(str(tmp_path / 'src.zip'))
+    dst = str(tmp_path / 'dst.zip')
+    ziputil.copy_renamed(src, dst, lambda name: name.replace(
+        'DOC1/', 'Guide/'))
+
+    with zipfile.ZipFile(src) as src_zf, zipfile.ZipFile(dst) as dst_zf:
+        assert dst_zf.testzip() is None
+        assert dst_zf.namelist() == ['Guide/index.html', 'Guide/data.bin',
+                                     'DOC2/stored.txt', 'readme.txt']
+        for src_info, dst_info in zip(src_zf.infolist(), dst_zf.infolist()):
+            assert dst_zf.read(dst_info) == src_zf.read(src_info)
+            assert (dst_info.CRC, dst_info.compress_type,
+                    dst_info.compress_size, dst_info.date_time) == \
+                (src_info.CRC, src_info.compress_type,
+                 src_info.compress_size, src_info.date_time)
+
+
+def test_unicode_names(tmp_path):
+    src = make_zip(str(tmp_path / 'src.zip'))
+    dst = str(tmp_path / 'dst.zip')
+    ziputil.copy_renamed(src, dst, lambda name: name.replace(
+        'DOC1/', 'Руководство/'))
+
+    with zipfile.ZipFile(dst) as zf:
+        assert zf.read('Руководство/data.bin') == DATA
+        assert zf.getinfo('Руководство/data.bin').flag_bits & 0x800
+        assert not zf.getinfo('readme.txt').flag_bits & 0x800
+
+
+def test_members_with_data_descriptors(tmp_path):
+    # members written to an unseekable stream are followed by data
+    # descriptors, the copies carry the sizes in their local headers
+    class Unseekable(io.RawIOBase):
+        def __init__(self, f):
+            self.f = f
+
+        def writable(self):
+            return True
+
+        def write(self, b):
+            return self.f.write(b)
+
+    src = str(tmp_path / 'src.zip')
+    with open(src, 'wb') as f:
+        with zipfile.ZipFile(Unseekable(f), 'w', zipfile.ZIP_DEFLATED) as zf:
+            with zf.open('DOC1/data.bin', 'w') as member:
+                member.write(DATA)
+    with zipfile.ZipFile(src) as zf:
+        assert zf.getinfo('DOC1/data.bin').flag_bits & 0x08
+
+    dst = str(tmp_path / 'dst.zip')
+    ziputil.copy_renamed(src, dst, lambda name: 'renamed.bin')
+    with zipfile.ZipFile(dst) as zf:
+        assert not zf.getinfo('renamed.bin').flag_bits & 0x08
+        assert zf.read('renamed.bin') == DATA